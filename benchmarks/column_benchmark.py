@@ -0,0 +1,74 @@
+"""Time the operations of a board column on a generated column of many cards, e.g.:
+
+    python benchmarks/column_benchmark.py --cards 5000
+"""
+import random
+import timeit
+
+import click
+
+from github_automation.common.constants import DEFAULT_PRIORITY_LIST
+from github_automation.core.project.project import ItemCard, ProjectColumn
+from github_automation.core.project_item.issue import Issue
+
+
+def generate_issues(cards, seed):
+    issues = [Issue(id=f'issue{number}', title=f'issue {number}', number=number,
+                    labels=[DEFAULT_PRIORITY_LIST[number % len(DEFAULT_PRIORITY_LIST)]],
+                    priority_list=DEFAULT_PRIORITY_LIST)
+              for number in range(cards)]
+    random.Random(seed).shuffle(issues)
+    return issues
+
+
+def sort_column(issues):
+    """Sort a column of the cards of the issues in a random order"""
+    column = ProjectColumn(id='column', name='Queue', cards=[ItemCard(id=f'card{issue.number}', item=issue)
+                                                             for issue in issues])
+    return column.get_sort_moves()
+
+
+def add_and_remove_cards(issues):
+    """Add the cards of the issues to an empty column, which stays sorted, and remove every other card"""
+    column = ProjectColumn(id='column', name='Queue', cards=[])
+    for issue in issues:
+        column.insert_card(f'card{issue.number}', issue)
+
+    for issue in issues[::2]:
+        column.remove_card(f'card{issue.number}')
+
+
+def add_cards_to_unsorted_column(issues, new_issues):
+    """Add the cards of the new issues to a column of the cards of the issues in a random order"""
+    column = ProjectColumn(id='column', name='Queue', cards=[ItemCard(id=f'card{issue.number}', item=issue)
+                                                             for issue in issues])
+    for issue in new_issues:
+        column.insert_card(f'card{issue.number}', issue)
+
+
+def report(name, timings, cards):
+    best = min(timings)
+    click.echo(f'{name}: {best * 1000:.1f} ms for {cards} cards (best of {len(timings)})')
+
+
+@click.command(context_settings=dict(max_content_width=100))
+@click.help_option('-h', '--help')
+@click.option('--cards', type=int, default=5000, show_default=True, help='The number of cards of the column')
+@click.option('--repeat', type=int, default=5, show_default=True, help='The number of times every operation is timed')
+@click.option('--seed', type=int, default=0, show_default=True)
+def main(cards, repeat, seed):
+    """Time the operations of a board column, the best time of every operation is reported."""
+    issues = generate_issues(cards, seed)
+    report('sort', timeit.repeat(lambda: sort_column(issues), number=1, repeat=repeat), cards)
+    report('add and remove (sorted column)',
+           timeit.repeat(lambda: add_and_remove_cards(issues), number=1, repeat=repeat), cards)
+
+    # a tenth of the cards are added to a column of the rest of them
+    new_issues, column_issues = issues[:cards // 10], issues[cards // 10:]
+    report('add a tenth (unsorted column)',
+           timeit.repeat(lambda: add_cards_to_unsorted_column(column_issues, new_issues), number=1, repeat=repeat),
+           cards)
+
+
+if __name__ == '__main__':
+    main()
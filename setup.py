@@ -21,9 +21,14 @@ setup(
         'python-dateutil',
         'gql==3.0.0a5'
     ],
+    extras_require={
+        'async': ['aiohttp'],
+        'vectorized': ['numpy']
+    },
     packages=find_packages("src"),
     package_dir={"": "src"},
     include_package_data=True,
+    package_data={'github_automation.management': ['github_schema.graphql']},
     keywords=[
         "GitHub",
         "Project",
@@ -1,15 +1,39 @@
 from __future__ import absolute_import
 
+import asyncio
+import io
+import logging
+import os
 import sys
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import redirect_stderr, redirect_stdout
 
 from pkg_resources import get_distribution
 
 import click
 from github_automation.common.constants import (MANAGE_COMMAND_NAME,
+                                                RECORD_PATH_ENV_VARIABLE,
+                                                REFRESH_SCHEMA_COMMAND_NAME,
                                                 WEBHOOK_MANAGER_COMMAND_NAME)
 from github_automation.management.configuration import Configuration
 from github_automation.management.event_manager import EventManager
-from github_automation.management.project_manager import ProjectManager
+from github_automation.management.github_client import (AsyncGraphQLClient, GraphQLClient, RateLimiter,
+                                                        RateLimitExceeded, RetryPolicy, get_shared_client)
+from github_automation.management.project_manager import ProjectManager, get_shared_repository_items
+from github_automation.management.queries import QUERIES
+
+
+def parse_cache_ttls(ctx, param, value):
+    cache_ttls = {}
+    for cache_ttl in value:
+        operation, _, seconds = cache_ttl.partition('=')
+        if operation not in QUERIES or not seconds.isdigit():
+            raise click.BadParameter(f'{cache_ttl} is not in the format OPERATION=SECONDS of a known query operation')
+
+        cache_ttls[operation] = int(seconds)
+
+    return cache_ttls
 
 
 @click.group(invoke_without_command=True, no_args_is_help=True, context_settings=dict(max_content_width=100), )
@@ -44,17 +68,179 @@ def main(version):
 @click.option(
     "--log-path", help="Path to store all levels of logs", type=click.Path(exists=True, resolve_path=True)
 )
+@click.option(
+    "--pool-size", help="The number of connections to GitHub which are kept alive and shared by all the boards",
+    type=click.IntRange(1), default=GraphQLClient.DEFAULT_POOL_SIZE, show_default=True
+)
+@click.option(
+    "--use-async", is_flag=True, help="Send up to pool-size requests to GitHub concurrently, requires aiohttp"
+)
+@click.option(
+    "--batch-size", help="The maximal number of card changes which are sent to GitHub in a single request, "
+                         "not used with --use-async",
+    type=click.IntRange(1), default=GraphQLClient.DEFAULT_BATCH_SIZE, show_default=True
+)
+@click.option(
+    "--workers", help="The number of processes to manage the boards in, the boards of a repository are managed by the "
+                      "same process",
+    type=click.IntRange(1), default=1, show_default=True
+)
+@click.option(
+    "--prefetch-pages", is_flag=True, help="Fetch the next page of issues, pull requests or cards while the current "
+                                           "page is parsed"
+)
+@click.option(
+    "--max-rate-limit-wait", help="The maximal number of seconds to wait for the GitHub rate limit to reset, "
+                                  "the run stops if the rate limit resets later than that",
+    type=click.IntRange(0), default=RateLimiter.DEFAULT_MAX_WAIT, show_default=True
+)
+@click.option(
+    "--max-retries", help="The maximal number of times a request which failed on a transient error is sent again",
+    type=click.IntRange(0), default=RetryPolicy.DEFAULT_MAX_RETRIES, show_default=True
+)
+@click.option(
+    "--cache-path", help="Path of an SQLite file to cache the responses of GitHub in between runs, defaults to the "
+                         "GITHUB_AUTOMATION_CACHE_PATH environment variable, responses are not cached if neither is set"
+)
+@click.option(
+    "--cache-ttl", help="The number of seconds to cache the responses of a query for, in the format "
+                        "OPERATION=SECONDS (e.g. project_layout=3600), can be used multiple times",
+    multiple=True, callback=parse_cache_ttls
+)
+@click.option(
+    "--record-path", help="Path of a cassette file to record the requests to GitHub and their results in, defaults to "
+                          "the GITHUB_AUTOMATION_RECORD_PATH environment variable"
+)
+@click.option(
+    "--replay-path", help="Path of a recorded cassette file to serve the results from instead of sending the requests "
+                          "to GitHub, defaults to the GITHUB_AUTOMATION_REPLAY_PATH environment variable"
+)
+@click.option(
+    "--replay-latency", help="The number of seconds every replayed request takes, defaults to the "
+                             "GITHUB_AUTOMATION_REPLAY_LATENCY environment variable or 0",
+    type=click.FloatRange(0)
+)
 def manage(**kwargs):
     """Manage a GitHub project board"""
-    for conf_path in kwargs['conf'].split(','):
+    client_args = {'max_rate_limit_wait': kwargs['max_rate_limit_wait'], 'max_retries': kwargs['max_retries'],
+                   'cache_path': kwargs['cache_path'], 'cache_ttls': kwargs['cache_ttl'],
+                   'record_path': kwargs['record_path'], 'replay_path': kwargs['replay_path'],
+                   'replay_latency': kwargs['replay_latency']}
+    conf_paths = kwargs['conf'].split(',')
+    if kwargs['workers'] > 1:
+        if kwargs['record_path'] or os.getenv(RECORD_PATH_ENV_VARIABLE):
+            raise click.UsageError('Requests can not be recorded by more than one worker')
+
+        return manage_in_workers(group_by_repository(load_configurations(conf_paths, kwargs)), kwargs, client_args)
+
+    return manage_boards(load_configurations(conf_paths, kwargs), kwargs, client_args)
+
+
+def load_configurations(conf_paths, kwargs):
+    configurations = []
+    for conf_path in conf_paths:
         configuration = Configuration(conf_file_path=conf_path,
                                       verbose=kwargs['verbose'],
                                       quiet=kwargs['quiet'],
                                       log_path=kwargs['log_path'])
         configuration.load_properties()
-        configuration.logger.info(f'Starting going over the board {conf_path}')
-        manager = ProjectManager(configuration=configuration)
-        manager.manage()
+        configurations.append((conf_path, configuration))
+
+    return configurations
+
+
+def group_by_repository(configurations):
+    """Group the conf paths by the repository of their boards, so the boards of a repository share its items"""
+    repository_conf_paths = defaultdict(list)
+    for conf_path, configuration in configurations:
+        repository_conf_paths[(configuration.project_owner, configuration.repository_name)].append(conf_path)
+
+    return list(repository_conf_paths.values())
+
+
+def manage_boards(configurations, kwargs, client_args):
+    """Manage the boards of the configurations one after the other, returns the exit code"""
+    try:
+        if kwargs['use_async']:
+            return asyncio.run(manage_async(configurations, kwargs['pool_size'], kwargs['prefetch_pages'],
+                                            **client_args))
+
+        client = get_shared_client(pool_size=kwargs['pool_size'], batch_size=kwargs['batch_size'], **client_args)
+        shared_items = get_shared_repository_items(client, [configuration for _, configuration in configurations],
+                                                   kwargs['prefetch_pages'])
+        try:
+            for conf_path, configuration in configurations:
+                configuration.logger.info(f'Starting going over the board {conf_path}')
+                manager = ProjectManager(configuration=configuration, client=client,
+                                         prefetch_pages=kwargs['prefetch_pages'],
+                                         repository_items=shared_items.get(configuration))
+                manager.manage()
+        finally:
+            report_retries(client)
+            client.close()
+    except RateLimitExceeded as ex:
+        print(f'{ex}, the rest of the changes will be made in the next run')
+        return 1
+
+    return 0
+
+
+def manage_in_workers(conf_path_groups, kwargs, client_args):
+    """Manage every group of boards in a pool of worker processes, returns the highest exit code of the groups
+
+    The output of every group is printed at once when it is done, so the logs of the boards are not interleaved.
+    """
+    client_args = dict(client_args, rate_limit_shares=min(kwargs['workers'], len(conf_path_groups)))
+    exit_code = 0
+    with ProcessPoolExecutor(max_workers=kwargs['workers']) as executor:
+        futures = {executor.submit(manage_boards_in_worker, conf_paths, kwargs, client_args): conf_paths
+                   for conf_paths in conf_path_groups}
+        for future in as_completed(futures):
+            try:
+                group_exit_code, output = future.result()
+            except Exception as ex:
+                print(f'Failed going over the boards {",".join(futures[future])} - {ex}')
+                group_exit_code, output = 1, ''
+
+            sys.stdout.write(output)
+            sys.stdout.flush()
+            exit_code = max(exit_code, group_exit_code)
+
+    return exit_code
+
+
+def manage_boards_in_worker(conf_paths, kwargs, client_args):
+    """Manage the boards in a worker process, returns the exit code and the output of the boards"""
+    # the handlers of the boards which the worker managed before write to their output
+    logging.getLogger('github-automation').handlers.clear()
+    output = io.StringIO()
+    with redirect_stdout(output), redirect_stderr(output):
+        exit_code = manage_boards(load_configurations(conf_paths, kwargs), kwargs, client_args)
+
+    return exit_code, output.getvalue()
+
+
+async def manage_async(configurations, pool_size, prefetch_pages=False, **client_args):
+    async with AsyncGraphQLClient(pool_size=pool_size, **client_args) as client:
+        shared_items = get_shared_repository_items(client, [configuration for _, configuration in configurations],
+                                                   prefetch_pages)
+        try:
+            for conf_path, configuration in configurations:
+                configuration.logger.info(f'Starting going over the board {conf_path}')
+                manager = ProjectManager(configuration=configuration, client=client, load=False,
+                                         prefetch_pages=prefetch_pages,
+                                         repository_items=shared_items.get(configuration))
+                await manager.load_async()
+                await manager.manage_async()
+        finally:
+            report_retries(client)
+
+
+def report_retries(client):
+    metrics = client.retry_policy.metrics
+    if metrics:
+        print('Requests to GitHub which were retried - ' +
+              ', '.join(f'{name}: {count}' for name, count in sorted(metrics.items())))
 
 
 @main.command(name=f"{WEBHOOK_MANAGER_COMMAND_NAME}",
@@ -78,10 +264,98 @@ def manage(**kwargs):
 @click.option(
     "--log-path", help="Path to store all levels of logs", type=click.Path(exists=True, resolve_path=True)
 )
+@click.option(
+    "--pool-size", help="The number of connections to GitHub which are kept alive and shared by all the boards",
+    type=click.IntRange(1), default=GraphQLClient.DEFAULT_POOL_SIZE, show_default=True
+)
+@click.option(
+    "--use-async", is_flag=True, help="Send up to pool-size requests to GitHub concurrently, requires aiohttp"
+)
+@click.option(
+    "--batch-size", help="The maximal number of card changes which are sent to GitHub in a single request, "
+                         "not used with --use-async",
+    type=click.IntRange(1), default=GraphQLClient.DEFAULT_BATCH_SIZE, show_default=True
+)
+@click.option(
+    "--max-rate-limit-wait", help="The maximal number of seconds to wait for the GitHub rate limit to reset, "
+                                  "the run stops if the rate limit resets later than that",
+    type=click.IntRange(0), default=RateLimiter.DEFAULT_MAX_WAIT, show_default=True
+)
+@click.option(
+    "--max-retries", help="The maximal number of times a request which failed on a transient error is sent again",
+    type=click.IntRange(0), default=RetryPolicy.DEFAULT_MAX_RETRIES, show_default=True
+)
+@click.option(
+    "--cache-path", help="Path of an SQLite file to cache the responses of GitHub in between runs, defaults to the "
+                         "GITHUB_AUTOMATION_CACHE_PATH environment variable, responses are not cached if neither is set"
+)
+@click.option(
+    "--cache-ttl", help="The number of seconds to cache the responses of a query for, in the format "
+                        "OPERATION=SECONDS (e.g. project_layout=3600), can be used multiple times",
+    multiple=True, callback=parse_cache_ttls
+)
+@click.option(
+    "--record-path", help="Path of a cassette file to record the requests to GitHub and their results in, defaults to "
+                          "the GITHUB_AUTOMATION_RECORD_PATH environment variable"
+)
+@click.option(
+    "--replay-path", help="Path of a recorded cassette file to serve the results from instead of sending the requests "
+                          "to GitHub, defaults to the GITHUB_AUTOMATION_REPLAY_PATH environment variable"
+)
+@click.option(
+    "--replay-latency", help="The number of seconds every replayed request takes, defaults to the "
+                             "GITHUB_AUTOMATION_REPLAY_LATENCY environment variable or 0",
+    type=click.FloatRange(0)
+)
 def event_manager(**kwargs):
     """Manage a GitHub project board using events and GitHub actions."""
-    manager = EventManager(**kwargs)
-    return manager.run()
+    pool_size = kwargs.pop('pool_size')
+    batch_size = kwargs.pop('batch_size')
+    client_args = {'max_rate_limit_wait': kwargs.pop('max_rate_limit_wait'), 'max_retries': kwargs.pop('max_retries'),
+                   'cache_path': kwargs.pop('cache_path'), 'cache_ttls': kwargs.pop('cache_ttl'),
+                   'record_path': kwargs.pop('record_path'), 'replay_path': kwargs.pop('replay_path'),
+                   'replay_latency': kwargs.pop('replay_latency')}
+    try:
+        if kwargs.pop('use_async'):
+            return asyncio.run(event_manager_async(pool_size, client_args, **kwargs))
+
+        client = get_shared_client(pool_size=pool_size, batch_size=batch_size, **client_args)
+        manager = EventManager(client=client, **kwargs)
+        try:
+            return manager.run()
+        finally:
+            report_retries(client)
+            client.close()
+    except RateLimitExceeded as ex:
+        print(f'{ex}, the event was not fully handled')
+        return 1
+
+
+async def event_manager_async(pool_size, client_args=None, **kwargs):
+    async with AsyncGraphQLClient(pool_size=pool_size, **(client_args or {})) as client:
+        manager = EventManager(client=client, **kwargs)
+        try:
+            return await manager.run_async()
+        finally:
+            report_retries(client)
+
+
+@main.command(name=f"{REFRESH_SCHEMA_COMMAND_NAME}",
+              short_help="Refresh the cached GitHub GraphQL schema")
+@click.help_option(
+    '-h', '--help'
+)
+@click.option(
+    "--schema-path", help="Path to store the schema in, defaults to the GITHUB_AUTOMATION_SCHEMA_PATH environment "
+                          "variable or ~/.cache/github-automation/github_schema.graphql"
+)
+def refresh_schema(**kwargs):
+    """Fetch the GitHub GraphQL schema using introspection and cache it for validating the queries."""
+    # the queries are not validated against the cached schema, as it is the one which may be broken
+    with GraphQLClient(validate=False) as client:
+        schema_path = client.refresh_schema(kwargs['schema_path'])
+
+    print(f'The GitHub schema was stored in {schema_path}')
 
 
 @main.result_callback()
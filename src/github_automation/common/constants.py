@@ -6,5 +6,25 @@ OR = '||'
 
 MANAGE_COMMAND_NAME = 'manage'
 WEBHOOK_MANAGER_COMMAND_NAME = 'webhook-manage'
+REFRESH_SCHEMA_COMMAND_NAME = 'refresh-schema'
+
+# GitHub API
+BASE_URL_ENV_VARIABLE = 'GITHUB_AUTOMATION_BASE_URL'
+SEARCH_RESULTS_LIMIT = 1000  # the GitHub search returns up to this many results of a query
+
+# The milestone filters of the issues which have any milestone or no milestone, instead of a milestone number
+ANY_MILESTONE = '*'
+NO_MILESTONE = 'none'
+
+# GraphQL schema
+SCHEMA_PATH_ENV_VARIABLE = 'GITHUB_AUTOMATION_SCHEMA_PATH'
+
+# Response cache
+CACHE_PATH_ENV_VARIABLE = 'GITHUB_AUTOMATION_CACHE_PATH'
+
+# Recording and replaying requests
+RECORD_PATH_ENV_VARIABLE = 'GITHUB_AUTOMATION_RECORD_PATH'
+REPLAY_PATH_ENV_VARIABLE = 'GITHUB_AUTOMATION_REPLAY_PATH'
+REPLAY_LATENCY_ENV_VARIABLE = 'GITHUB_AUTOMATION_REPLAY_LATENCY'
 
 DEFAULT_PRIORITY_LIST = ['Critical', 'High', 'Medium', 'Low']
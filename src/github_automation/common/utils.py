@@ -1,50 +1,233 @@
-from github_automation.common.constants import OR
+import asyncio
+import threading
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import chain, repeat
+from operator import attrgetter, is_not
 
+from github_automation.common.constants import ANY_MILESTONE, NO_MILESTONE, OR
 
-def get_first_column_items(client, config):
-    response = client.get_first_column_items(owner=config.project_owner,
-                                             name=config.repository_name,
-                                             project_number=config.project_number,
-                                             is_org_project=config.is_org_project)
-    project = get_project_from_response(response, config.is_org_project)
-    project_cards = get_project_cards(project)
-    cards_page_info = project_cards.get('pageInfo', {})
-    while cards_page_info.get('hasNextPage'):
-        new_response = client.get_first_column_items(owner=config.project_owner,
-                                                     name=config.repository_name,
-                                                     project_number=config.project_number,
-                                                     start_cards_cursor=cards_page_info['endCursor'],
-                                                     is_org_project=config.is_org_project)
-        project = get_project_from_response(new_response, config.is_org_project)
-        new_cards = get_project_cards(project)
-        project_cards['edges'].extend(new_cards['edges'])
-        cards_page_info = new_cards['pageInfo']
-
-    return response
-
-
-def get_column_items_with_prev_column(client, config, prev_cursor):
-    response = client.get_column_items(owner=config.project_owner,
+
+def get_column_page(client, config, prev_cursor=None, start_cards_cursor=''):
+    """Get a page of the cards of the column after the given column cursor, or of the first column if none was given,
+    starting after the given card cursor or with the first page"""
+    page_args = {'start_cards_cursor': start_cards_cursor} if start_cards_cursor else {}
+    if prev_cursor:
+        return client.get_column_items(owner=config.project_owner,
                                        name=config.repository_name,
                                        project_number=config.project_number,
                                        prev_column_id=prev_cursor,
-                                       is_org_project=config.is_org_project)
+                                       is_org_project=config.is_org_project,
+                                       fields=config.get_query_fields(),
+                                       **page_args)
+
+    return client.get_first_column_items(owner=config.project_owner,
+                                         name=config.repository_name,
+                                         project_number=config.project_number,
+                                         is_org_project=config.is_org_project,
+                                         fields=config.get_query_fields(),
+                                         **page_args)
+
+
+def get_board_columns(response, config):
+    """Get the project of a board items response, and the columns to load with the cursors of the columns before them
+
+    The columns to load are the first and the configured ones.
+    """
     project = get_project_from_response(response, config.is_org_project)
-    project_cards = get_project_cards(project)
-    cards_page_info = project_cards.get('pageInfo', {})
-    while cards_page_info.get('hasNextPage'):
-        new_response = client.get_column_items(owner=config.project_owner,
-                                               name=config.repository_name,
-                                               project_number=config.project_number,
-                                               prev_column_id=prev_cursor,
-                                               start_cards_cursor=cards_page_info['endCursor'],
-                                               is_org_project=config.is_org_project)
-        project = get_project_from_response(new_response, config.is_org_project)
-        new_cards = get_project_cards(project)
-        project_cards['edges'].extend(new_cards['edges'])
-        cards_page_info = new_cards['pageInfo']
-
-    return response
+    column_edges = project.get('columns', {}).get('edges', [])
+    board_columns = []
+    for index, column_edge in enumerate(column_edges):
+        if index == 0 or column_edge['node']['name'] in config.column_names:
+            prev_cursor = column_edges[index - 1]['cursor'] if index != 0 else None
+            board_columns.append((prev_cursor, column_edge['node']))
+
+    return project, board_columns
+
+
+def get_layout_columns(response, config, column_names):
+    """Get the project of a project layout response, and the cursors of the columns before the given columns, the
+    first column has no cursor before it"""
+    project = get_project_from_response(response, config.is_org_project)
+    column_edges = project.get('columns', {}).get('edges', [])
+    return project, [column_edges[index - 1]['cursor'] if index != 0 else None
+                     for index, column_edge in enumerate(column_edges) if column_edge['node']['name'] in column_names]
+
+
+def iter_pages(get_page, get_connection, after=None, prefetch=False):
+    """Iterate over the pages of a paginated connection, starting with the page after the given cursor
+
+    get_page gets the response of the page after the given cursor, and get_connection gets the connection from it.
+    Without prefetch the pages are fetched one request at a time once they are asked for. With prefetch the request
+    of the next page is sent on a worker thread as soon as its cursor is known, the request of the first page is sent
+    right away, so the requests are in flight while the previous pages are parsed.
+    """
+    if not prefetch:
+        return _iter_pages(get_page, get_connection, after)
+
+    executor = ThreadPoolExecutor(max_workers=1)
+    return _iter_prefetched_pages(executor, executor.submit(get_page, after), get_page, get_connection)
+
+
+def _iter_pages(get_page, get_connection, after):
+    while True:
+        connection = get_connection(get_page(after))
+        yield connection
+        page_info = connection.get('pageInfo', {})
+        if not page_info.get('hasNextPage'):
+            return
+
+        after = page_info.get('endCursor')
+
+
+def _iter_prefetched_pages(executor, next_page, get_page, get_connection):
+    try:
+        while True:
+            connection = get_connection(next_page.result())
+            page_info = connection.get('pageInfo', {})
+            has_next_page = page_info.get('hasNextPage')
+            if has_next_page:
+                next_page = executor.submit(get_page, page_info.get('endCursor'))
+
+            yield connection
+            if not has_next_page:
+                return
+    finally:
+        executor.shutdown(wait=False)
+
+
+async def iter_pages_async(get_page, get_connection, after=None, prefetch=False):
+    """Same as iter_pages for an async client, where the next page is prefetched by a task"""
+    next_page = None
+    try:
+        while True:
+            response = await next_page if next_page is not None else await get_page(after)
+            connection = get_connection(response)
+            page_info = connection.get('pageInfo', {})
+            has_next_page = page_info.get('hasNextPage')
+            after = page_info.get('endCursor')
+            next_page = None
+            if has_next_page and prefetch:
+                next_page = asyncio.ensure_future(get_page(after))
+                await asyncio.sleep(0)  # lets the task send the request before the page is parsed
+
+            yield connection
+            if not has_next_page:
+                return
+    finally:
+        if next_page is not None:
+            next_page.cancel()
+
+
+def get_search_connection(response):
+    return response.get('search', {})
+
+
+def get_column_cards(response, config):
+    return get_project_cards(get_project_from_response(response, config.is_org_project))
+
+
+def get_column_node(response, config):
+    """Get the column of a response of a single column query, with the first page of its cards"""
+    return get_project_from_response(response, config.is_org_project)['columns']['nodes'][0]
+
+
+def iter_column_card_pages(client, config, column, prev_cursor, prefetch=False):
+    """Iterate over the pages of the cards of a board column, starting with the page which came with the board
+
+    The first page is taken out of the column, so it can be dropped once it is parsed like the next pages.
+    """
+    cards = column.pop('cards', {})
+    if not cards.get('pageInfo', {}).get('hasNextPage'):
+        return iter([cards])
+
+    next_pages = iter_pages(lambda after: get_column_page(client, config, prev_cursor, after),
+                            lambda response: get_column_cards(response, config),
+                            after=cards['pageInfo']['endCursor'], prefetch=prefetch)
+    return chain([cards], next_pages)
+
+
+async def iter_column_card_pages_async(client, config, column, prev_cursor, prefetch=False):
+    cards = column.pop('cards', {})
+    yield cards
+    if cards.get('pageInfo', {}).get('hasNextPage'):
+        async for next_cards in iter_pages_async(
+                lambda after: get_column_page(client, config, prev_cursor, after),
+                lambda response: get_column_cards(response, config),
+                after=cards['pageInfo']['endCursor'], prefetch=prefetch):
+            yield next_cards
+
+
+class LabelInterner(object):
+    """Maps every label name to a bit of its own, so a set of labels is a bitmask"""
+
+    def __init__(self):
+        self.bits = {}
+        self.lock = threading.Lock()  # the items are parsed on several threads
+
+    def get_bit(self, label):
+        bit = self.bits.get(label)
+        if bit is None:
+            with self.lock:
+                bit = self.bits.setdefault(label, 1 << len(self.bits))
+
+        return bit
+
+    def get_mask(self, labels):
+        mask = 0
+        for label in labels:
+            mask |= self.get_bit(label)
+
+        return mask
+
+
+LABEL_INTERNER = LabelInterner()
+
+
+class LabelFilter(object):
+    """The label filters of a configuration compiled into bitmasks, matches the same items as is_matching_project_item
+
+    The item matches if it has any of the filter labels, all the must have labels - where a must have label with ||
+    is matched by any of its parts, and none of the cant have labels.
+    """
+
+    def __init__(self, must_have_labels, cant_have_labels, filter_labels, interner=LABEL_INTERNER):
+        self.interner = interner
+        self.filter_mask = interner.get_mask(filter_labels)
+        self.must_have_mask = interner.get_mask(label for label in must_have_labels if OR not in label)
+        self.must_have_any_masks = [interner.get_mask(label.split(OR)) for label in must_have_labels if OR in label]
+        self.cant_have_mask = interner.get_mask(cant_have_labels)
+
+    def is_matching(self, label_mask):
+        if not label_mask & self.filter_mask or label_mask & self.cant_have_mask:
+            return False
+
+        if (label_mask & self.must_have_mask) != self.must_have_mask:
+            return False
+
+        return all(label_mask & must_have_any_mask for must_have_any_mask in self.must_have_any_masks)
+
+    def match_masks(self, label_masks):
+        """Get whether every one of the label masks matches, over all of them at once with NumPy if it is installed
+        (github-automation[vectorized]) and there are up to 64 labels, otherwise one by one"""
+        try:
+            # NumPy is only required for matching many items at once
+            import numpy
+        except ImportError:
+            numpy = None
+
+        if numpy is None or len(self.interner.bits) > 64:
+            return [self.is_matching(label_mask) for label_mask in label_masks]
+
+        label_masks = numpy.array(label_masks, dtype=numpy.uint64)
+        matches = (((label_masks & numpy.uint64(self.filter_mask)) != 0) &
+                   ((label_masks & numpy.uint64(self.cant_have_mask)) == 0) &
+                   ((label_masks & numpy.uint64(self.must_have_mask)) == numpy.uint64(self.must_have_mask)))
+        for must_have_any_mask in self.must_have_any_masks:
+            matches &= (label_masks & numpy.uint64(must_have_any_mask)) != 0
+
+        return matches.tolist()
 
 
 def is_matching_project_item(item_labels, must_have_labels, cant_have_labels, filter_labels):
@@ -67,6 +250,217 @@ def is_matching_project_item(item_labels, must_have_labels, cant_have_labels, fi
     return True
 
 
+def compile_condition(condition_value):
+    """Compile the value of a column rule into a function which checks if an item field matches it
+
+    A list matches if the field contains all of its options, where an option with || is matched by any of its parts,
+    a boolean matches if the field is as truthy as it, and any other value matches if the field equals it.
+    """
+    if isinstance(condition_value, list):
+        option_groups = [option.split(OR) for option in condition_value]
+        return lambda field: all(any(option in field for option in options) for options in option_groups)
+
+    if isinstance(condition_value, bool):
+        return lambda field: condition_value is bool(field)
+
+    return lambda field: not (condition_value != field or condition_value not in field)
+
+
+MISSING_FIELD = object()
+
+
+class ColumnRuleTable(object):
+    """The distinct conditions of the rules of all the columns, by item type, and the conditions of every column
+
+    A condition is a rule with its value, a column matches an item if the item matches all the conditions of the
+    column of its type and there is at least one of them. A condition fails if its field is missing from the item.
+    The table is a snapshot of the rules it was built from, get it with Configuration.get_column_rule_table() which
+    builds it again once the rules change.
+    """
+
+    def __init__(self, column_to_rules):
+        self.conditions = {'issue': [], 'pull_request': []}
+        self.column_conditions = {}
+        condition_indexes = {}
+        for column_name, column_rules in column_to_rules.items():
+            self.column_conditions[column_name] = {item_type: [] for item_type in self.conditions}
+            for rule, condition_value in column_rules.items():
+                item_type, _, field = rule.partition('.')
+                if item_type not in self.conditions:
+                    continue
+
+                key = (rule, type(condition_value),
+                       tuple(condition_value) if isinstance(condition_value, list) else condition_value)
+                if key not in condition_indexes:
+                    condition_indexes[key] = len(self.conditions[item_type])
+                    self.conditions[item_type].append((field, attrgetter(field), compile_condition(condition_value),
+                                                       condition_value))
+
+                self.column_conditions[column_name][item_type].append(condition_indexes[key])
+
+    def iter_matches(self, item, item_type, column_names):
+        """Yield whether the item matches every one of the columns in turn
+
+        Every distinct condition is checked at most once for the item, when the first column which has it is tested.
+        """
+        conditions = self.conditions[item_type]
+        results = [None] * len(conditions)
+        for column_name in column_names:
+            condition_indexes = self.column_conditions[column_name][item_type]
+            is_matching = bool(condition_indexes)
+            for index in condition_indexes:
+                if results[index] is None:
+                    results[index] = self.check_condition(conditions[index], item)
+
+                if not results[index]:
+                    is_matching = False
+                    break
+
+            yield column_name, is_matching
+
+    @staticmethod
+    def check_condition(condition, item):
+        _, get_field, is_matching_field, _ = condition
+        try:
+            field = get_field(item)
+        except AttributeError:
+            return False
+
+        return is_matching_field(field)
+
+    def get_first_match(self, item, item_type, column_names):
+        for column_name, is_matching in self.iter_matches(item, item_type, column_names):
+            if is_matching:
+                return column_name
+
+        return ''
+
+    def match_columns(self, items, item_type, column_names):
+        """Get the first matching column of every one of the items, or '' if none of the columns matches it
+
+        With NumPy installed (github-automation[vectorized]) the columns are tested over all the items at once. The
+        fields of the items are read once, the boolean conditions are checked over whole arrays, and the rest of the
+        conditions only for the items which may still match the column. Otherwise the items are matched one by one.
+        """
+        try:
+            # NumPy is only required for matching many items at once
+            import numpy
+        except ImportError:
+            return [self.get_first_match(item, item_type, column_names) for item in items]
+
+        conditions = self.conditions[item_type]
+        field_values = {}
+        condition_results = {}
+        unmatched = numpy.ones(len(items), dtype=bool)
+        first_matches = numpy.full(len(items), -1)
+        for column_index, column_name in enumerate(column_names):
+            condition_indexes = self.column_conditions[column_name][item_type]
+            if not condition_indexes:
+                continue
+
+            candidates = unmatched.copy()
+            # the boolean conditions are checked first, as they narrow down the items to check the rest for
+            for index in sorted(condition_indexes, key=lambda index: not isinstance(conditions[index][3], bool)):
+                field, _, is_matching_field, condition_value = conditions[index]
+                values, present, truthy = self.get_field_values(items, field, field_values, numpy)
+                if isinstance(condition_value, bool):
+                    candidates &= present & (truthy == condition_value)
+                else:
+                    checked, results = condition_results.setdefault(
+                        index, (numpy.zeros(len(items), dtype=bool), numpy.zeros(len(items), dtype=bool)))
+                    to_check = numpy.flatnonzero(candidates & present & ~checked).tolist()
+                    results[to_check] = list(map(is_matching_field, map(values.__getitem__, to_check)))
+                    checked[to_check] = True
+                    candidates &= results
+
+            first_matches[candidates] = column_index
+            unmatched &= ~candidates
+
+        return [column_names[first_match] if first_match >= 0 else '' for first_match in first_matches.tolist()]
+
+    @staticmethod
+    def get_field_values(items, field, field_values, numpy):
+        """Get the values of the field of the items, whether the items have it and whether the values are truthy
+
+        The values are kept in field_values, so every field is read once, and the fields of a nested field are read
+        from the values of its parent field.
+        """
+        if field not in field_values:
+            parent_field, _, name = field.rpartition('.')
+            parents = (ColumnRuleTable.get_field_values(items, parent_field, field_values, numpy)[0]
+                       if parent_field else items)
+            values = list(map(getattr, parents, repeat(name), repeat(MISSING_FIELD)))
+            present = numpy.fromiter(map(partial(is_not, MISSING_FIELD), values), dtype=bool, count=len(values))
+            truthy = numpy.fromiter(map(bool, values), dtype=bool, count=len(values)) & present
+            field_values[field] = values, present, truthy
+
+        return field_values[field]
+
+
+def get_longest_increasing_subsequence(values):
+    """Get the indexes of a longest strictly increasing subsequence of the values, in O(n log n)"""
+    tail_values = []  # the smallest last value of the increasing subsequences of every length
+    tail_indexes = []
+    previous_indexes = [None] * len(values)
+    for index, value in enumerate(values):
+        length = bisect_left(tail_values, value)
+        previous_indexes[index] = tail_indexes[length - 1] if length else None
+        if length == len(tail_values):
+            tail_values.append(value)
+            tail_indexes.append(index)
+        else:
+            tail_values[length] = value
+            tail_indexes[length] = index
+
+    subsequence = []
+    index = tail_indexes[-1] if tail_indexes else None
+    while index is not None:
+        subsequence.append(index)
+        index = previous_indexes[index]
+
+    return subsequence[::-1]
+
+
+def get_label_qualifier(labels):
+    # the labels of a single qualifier are matched with an OR condition, and the qualifiers with an AND condition
+    return 'label:' + ','.join(f'"{label}"' for label in labels)
+
+
+def get_search_query(config, item_type, milestone_title=None):
+    """Compile the label and milestone filters of the configuration into a GitHub search of the open items
+
+    item_type is either issue or pr. The milestone only filters the issues, the search matches it by its title so the
+    milestone number of filter_milestone is resolved to milestone_title by the caller.
+    """
+    qualifiers = [f'repo:{config.project_owner}/{config.repository_name}', f'is:{item_type}', 'is:open']
+    if config.filter_labels:
+        qualifiers.append(get_label_qualifier(config.filter_labels))
+
+    for label in config.must_have_labels:
+        qualifiers.append(get_label_qualifier(label.split(OR)))
+
+    for label in config.cant_have_labels:
+        qualifiers.append('-' + get_label_qualifier([label]))
+
+    if item_type == 'issue':
+        if config.filter_milestone == ANY_MILESTONE:
+            qualifiers.append('-no:milestone')
+        elif config.filter_milestone == NO_MILESTONE:
+            qualifiers.append('no:milestone')
+        elif config.filter_milestone:
+            qualifiers.append(f'milestone:"{milestone_title}"')
+
+    return ' '.join(qualifiers)
+
+
+def get_milestone_title(response, milestone_number):
+    milestone = response.get('repository', {}).get('milestone')
+    if not milestone:
+        raise ValueError(f'The milestone {milestone_number} of filter_milestone was not found in the repository')
+
+    return milestone['title']
+
+
 def get_labels(label_edges):
     label_names = []
     for edge in label_edges:
@@ -1,14 +1,20 @@
 from __future__ import absolute_import
 
-from copy import deepcopy
+import asyncio
+from bisect import bisect_left
+from collections import defaultdict
+from itertools import compress, count, islice, repeat
+from operator import and_, le, lt
 from typing import Dict, List, Union
 
-from github_automation.common.constants import OR
-from github_automation.common.utils import is_matching_project_item
+from github_automation.common.utils import (get_board_columns, get_column_node, get_column_page,
+                                            get_layout_columns, get_longest_increasing_subsequence,
+                                            iter_column_card_pages, iter_column_card_pages_async)
 from github_automation.core.project_item.issue import Issue, parse_issue
 from github_automation.core.project_item.pull_request import PullRequest, parse_pull_request
 from github_automation.management.configuration import Configuration
-from github_automation.management.github_client import GraphQLClient
+from github_automation.management.github_client import (AsyncGraphQLClient, GraphQLClient, RateLimitExceeded,
+                                                        get_mutation_batcher)
 
 
 def parse_issue_card(card_edge: dict, config: Configuration):
@@ -52,8 +58,12 @@ class ItemCard(object):
 
 
 def _extract_card_node_data(column_node: dict, config: Configuration):
+    return _extract_cards(column_node['cards'], config)
+
+
+def _extract_cards(cards_connection: dict, config: Configuration):
     cards = []
-    for card in column_node['cards']['edges']:
+    for card in cards_connection.get('edges', []):
         card_content = card.get('node', {}).get('content')
         if not card_content:
             continue
@@ -78,103 +88,174 @@ class ProjectColumn(object):
         self.cards = cards
         self.config = config
 
+    @property
+    def cards(self):
+        """The cards in their order in the column, they should only be changed through the methods of the column"""
+        return self._cards
+
+    @cards.setter
+    def cards(self, cards: List[ItemCard]):
+        # the sort keys of the cards are kept by their positions, so a card is placed by a binary search over them
+        # while the column is sorted, and the cards are indexed by their ids and the ids of their items. The cards and
+        # their sort keys are plain lists, so inserting or removing a card still shifts the cards after it - a memory
+        # move which is cheap next to the requests of the cards.
+        self._cards = cards
+        self.sort_keys = [card.item.sort_key for card in cards]
+        self.is_sorted = all(map(le, self.sort_keys, islice(self.sort_keys, 1, None)))
+        self.cards_by_id = {card.id: card for card in cards}
+        self.cards_by_item_id = {card.item_id: card for card in cards}
+
     def get_all_item_ids(self):
-        return {card.item_id for card in self.cards}
+        return self.cards_by_item_id.keys()
+
+    def get_insert_position(self, sort_key):
+        """Get the position of a card with the sort key, by a binary search while the column is sorted
+
+        The cards of an unsorted column are not moved, so the card is placed between the first two cards it fits,
+        which takes a scan of the sort keys (in C, without a Python step per card) - a column is unsorted until it is
+        sorted once, so adding cards to a column which is never sorted costs a scan of the column per card.
+        """
+        if not self.cards or sort_key < self.sort_keys[0]:
+            return 0
+
+        if self.is_sorted:
+            return bisect_left(self.sort_keys, sort_key)
+
+        fits_after = map(lt, self.sort_keys, repeat(sort_key))
+        fits_before = map(lt, repeat(sort_key), islice(self.sort_keys, 1, None))
+        return next(compress(count(1), map(and_, fits_after, fits_before)), len(self.cards))  # the lowest if none
+
+    def get_card_position(self, card: ItemCard):
+        if self.is_sorted:
+            position = bisect_left(self.sort_keys, card.item.sort_key)
+            while position < len(self.cards) and self.sort_keys[position] == card.item.sort_key:
+                if self.cards[position] is card:
+                    return position
+
+                position += 1
+
+        # the card was not found by its sort key if the priority of its item was changed after it was placed
+        return next(position for position, column_card in enumerate(self.cards) if column_card is card)
+
+    def insert_card(self, card_id: str, new_item: Union[Issue, PullRequest]):
+        """Insert a card in its sorted position, returns the id of the card above it or None if it is the first"""
+        position = self.get_insert_position(new_item.sort_key)
+        card = ItemCard(id=card_id, item=new_item)
+        self.cards.insert(position, card)
+        self.sort_keys.insert(position, new_item.sort_key)
+        self.cards_by_id[card.id] = card
+        self.cards_by_item_id[card.item_id] = card
+        return self.cards[position - 1].id if position else None
+
+    def move_card(self, client, card_id, after_card_id=None, **kwargs):
+        """Place the card after the given card in the column, or at the top of it if no card was given"""
+        if after_card_id:
+            return client.move_to_specific_place_in_column(card_id=card_id,
+                                                           column_id=self.id,
+                                                           after_card_id=after_card_id,
+                                                           **kwargs)
+
+        return client.add_to_column(card_id=card_id,
+                                    column_id=self.id,
+                                    **kwargs)
 
     def add_card(self, card_id: str, new_item: Union[Issue, PullRequest], client: GraphQLClient):
-        insert_after_position = len(self.cards) - 1  # In case it should be the lowest issue
-        if not self.cards or new_item > self.cards[0].item:
-            self.cards.insert(0, ItemCard(id=card_id, item=new_item))
-            try:
-                client.add_to_column(card_id=card_id,
-                                     column_id=self.id)
-            except Exception as ex:
-                exception_msg = str(ex)
+        after_card_id = self.insert_card(card_id, new_item)
+        with get_mutation_batcher(client) as batcher:
+            def on_error(exception_msg):
                 if 'The card must not be archived' in exception_msg:
                     try:
                         self.config.logger.info(f"Un-archiving the card of {new_item.title}")
-                        client.un_archive_card(card_id)
-                        client.add_to_column(card_id=card_id,
-                                             column_id=self.id)
+                        batcher.client.un_archive_card(card_id)
+                        self.move_card(batcher.client, card_id, after_card_id)
                         return
+                    except RateLimitExceeded:
+                        raise
                     except Exception as ex:
                         exception_msg += '\n' + str(ex)
 
-                self.config.logger.warning(f'The {str(new_item)} {new_item.title} was not added due to {exception_msg}')
+                self.config.logger.warning(f'The {str(new_item)} {new_item.title} was not added due to '
+                                           f'{exception_msg}')
 
-            return
+            self.move_card(batcher, card_id, after_card_id, on_error=on_error)
 
-        for i in range(len(self.cards) - 1):
-            if self.cards[i].item > new_item > self.cards[i + 1].item:
-                insert_after_position = i
-                break
-
-        self.cards.insert(insert_after_position + 1,
-                          ItemCard(id=card_id, item=new_item))
+    async def add_card_async(self, card_id: str, new_item: Union[Issue, PullRequest], client: AsyncGraphQLClient):
+        after_card_id = self.insert_card(card_id, new_item)
         try:
-            client.move_to_specific_place_in_column(card_id=card_id,
-                                                    column_id=self.id,
-                                                    after_card_id=self.cards[insert_after_position].id)
+            await self.move_card(client, card_id, after_card_id)
+        except RateLimitExceeded:
+            raise
         except Exception as ex:
             exception_msg = str(ex)
             if 'The card must not be archived' in exception_msg:
                 try:
                     self.config.logger.info(f"Un-archiving the card of {new_item.title}")
-                    client.un_archive_card(card_id)
-                    client.move_to_specific_place_in_column(card_id=card_id,
-                                                            column_id=self.id,
-                                                            after_card_id=self.cards[insert_after_position].id)
+                    await client.un_archive_card(card_id)
+                    await self.move_card(client, card_id, after_card_id)
                     return
+                except RateLimitExceeded:
+                    raise
                 except Exception as ex:
                     exception_msg += '\n' + str(ex)
 
             self.config.logger.warning(f'The {str(new_item)} {new_item.title} was not added due to {exception_msg}')
 
     def get_card_id(self, item_id):
-        for card in self.cards:
-            if card.item_id == item_id:
-                return card.id
+        card = self.cards_by_item_id.get(item_id)
+        return card.id if card else None
 
     def remove_card(self, card_id):
-        for index, card in enumerate(self.cards):
-            if card_id == card.id:
-                del self.cards[index]
-                break
-
-    def move_card_in_list(self, card_id, new_index):
-        old_index = -1
-        old_card = None
-        for index, card in enumerate(self.cards):
-            if card.id == card_id and index != new_index:
-                old_card = deepcopy(card)
-                old_index = index
-                break
-
-        del self.cards[old_index]
-        self.cards.insert(new_index, deepcopy(old_card))
+        card = self.cards_by_id.pop(card_id, None)
+        if card is None:
+            return
+
+        position = self.get_card_position(card)
+        del self.cards[position]
+        del self.sort_keys[position]
+        if self.cards_by_item_id.get(card.item_id) is card:
+            del self.cards_by_item_id[card.item_id]
+
+    def get_sort_moves(self):
+        """Sort the cards, returns the moves which sort the column as (card, id of the card above it, index) tuples
+
+        The cards of a longest run of cards which are already in their sorted order relative to each other stay in
+        place, so only the rest of the cards are moved - the fewest moves which sort the column. The moves are ordered
+        from the top of the column, so every card is placed after a card which is already in its place.
+        """
+        sorted_indexes = sorted(range(len(self.cards)), key=self.sort_keys.__getitem__)
+        sorted_positions = [0] * len(self.cards)
+        for position, index in enumerate(sorted_indexes):
+            sorted_positions[index] = position
+
+        positions_in_place = {sorted_positions[index]
+                              for index in get_longest_increasing_subsequence(sorted_positions)}
+        sorted_cards = [self.cards[index] for index in sorted_indexes]  # the same cards, only their order changes
+        moves = [(card, sorted_cards[position - 1].id if position else None, position)
+                 for position, card in enumerate(sorted_cards) if position not in positions_in_place]
+
+        self.cards = sorted_cards
+        return moves
 
     def sort_cards(self, client, config):
-        sorted_cards = deepcopy(sorted(self.cards, key=lambda card: card.item, reverse=True))
-        for index, card in enumerate(sorted_cards):
-            if card.id != self.cards[index].id:
-                self.move_card_in_list(card.id, index)
+        with get_mutation_batcher(client) as batcher:
+            for card, after_card_id, index in self.get_sort_moves():
                 config.logger.info(f"Moving {str(card.item)} '{card.item_title}' in column "
                                    f"'{self.name}' to position: {index}")
-                if index == 0:
-                    try:
-                        client.add_to_column(card_id=card.id,
-                                             column_id=self.id)
-                    except Exception as ex:
-                        config.logger.warning(f'The item {card.item_title} was not moved due to {str(ex)}')
-                else:
-                    try:
-                        client.move_to_specific_place_in_column(card_id=card.id,
-                                                                column_id=self.id,
-                                                                after_card_id=sorted_cards[index-1].id)
-                    except Exception as ex:
-                        config.logger.warning(f'The item {card.item_title} was not moved due to {str(ex)}')
-
-        self.cards = sorted_cards
+                self.move_card(batcher, card.id, after_card_id,
+                               on_error=lambda error, card=card: config.logger.warning(
+                                   f'The item {card.item_title} was not moved due to {error}'))
+
+    async def sort_cards_async(self, client, config):
+        # The moves are sent one after the other as each of them places a card after the previously moved one
+        for card, after_card_id, index in self.get_sort_moves():
+            config.logger.info(f"Moving {str(card.item)} '{card.item_title}' in column "
+                               f"'{self.name}' to position: {index}")
+            try:
+                await self.move_card(client, card.id, after_card_id)
+            except RateLimitExceeded:
+                raise
+            except Exception as ex:
+                config.logger.warning(f'The item {card.item_title} was not moved due to {str(ex)}')
 
 
 def _extract_columns(git_hub_column_nodes, config):
@@ -196,6 +277,81 @@ def parse_project(git_hub_project, config):
     }
 
 
+def _get_board_items(client, config: Configuration):
+    return client.get_board_items(owner=config.project_owner,
+                                  name=config.repository_name,
+                                  project_number=config.project_number,
+                                  is_org_project=config.is_org_project,
+                                  fields=config.get_query_fields())
+
+
+def _get_project_layout(client, config: Configuration):
+    return client.get_project_layout(owner=config.project_owner,
+                                     repository_name=config.repository_name,
+                                     project_number=config.project_number,
+                                     is_org_project=config.is_org_project)
+
+
+def _create_project(github_project: dict, columns: Dict[str, 'ProjectColumn'], config: Configuration):
+    return Project(name=github_project.get("name", 'Not Found'), number=github_project.get("number", -1),
+                   columns=columns, config=config)
+
+
+def _load_column(client, config: Configuration, prev_cursor, column_node, prefetch):
+    cards = []
+    for cards_page in iter_column_card_pages(client, config, column_node, prev_cursor, prefetch):
+        cards.extend(_extract_cards(cards_page, config))
+
+    return ProjectColumn(id=column_node['id'], name=column_node['name'], cards=cards, config=config)
+
+
+async def _load_column_async(client, config: Configuration, prev_cursor, column_node, prefetch):
+    cards = []
+    async for cards_page in iter_column_card_pages_async(client, config, column_node, prev_cursor, prefetch):
+        cards.extend(_extract_cards(cards_page, config))
+
+    return ProjectColumn(id=column_node['id'], name=column_node['name'], cards=cards, config=config)
+
+
+def load_project(client, config: Configuration, column_names: List[str] = None, prefetch: bool = False):
+    """Load the board of the configuration with the cards of its columns to load (see get_board_columns)
+
+    The layout and the first page of the cards of every column are fetched in a single request, so only the columns
+    with more than a page of cards need more requests. Every page of cards is parsed once it is fetched, with prefetch
+    the next page of the column is fetched while it is parsed.
+    When column_names are given only these columns are loaded, they are found in the project layout (which is cached
+    for long, see ResponseCache) and only their own cards are fetched.
+    """
+    if column_names is not None:
+        github_project, prev_cursors = get_layout_columns(_get_project_layout(client, config), config, column_names)
+        board_columns = [(prev_cursor, get_column_node(get_column_page(client, config, prev_cursor), config))
+                         for prev_cursor in prev_cursors]
+    else:
+        github_project, board_columns = get_board_columns(_get_board_items(client, config), config)
+
+    columns = [_load_column(client, config, prev_cursor, column_node, prefetch)
+               for prev_cursor, column_node in board_columns]
+    return _create_project(github_project, {column.name: column for column in columns}, config)
+
+
+async def load_project_async(client, config: Configuration, column_names: List[str] = None,
+                             prefetch: bool = False):
+    """Same as load_project, where the columns are loaded concurrently"""
+    if column_names is not None:
+        github_project, prev_cursors = get_layout_columns(await _get_project_layout(client, config), config,
+                                                          column_names)
+        column_pages = await asyncio.gather(*[get_column_page(client, config, prev_cursor)
+                                              for prev_cursor in prev_cursors])
+        board_columns = [(prev_cursor, get_column_node(column_page, config))
+                         for prev_cursor, column_page in zip(prev_cursors, column_pages)]
+    else:
+        github_project, board_columns = get_board_columns(await _get_board_items(client, config), config)
+
+    columns = await asyncio.gather(*[_load_column_async(client, config, prev_cursor, column_node, prefetch)
+                                     for prev_cursor, column_node in board_columns])
+    return _create_project(github_project, {column.name: column for column in columns}, config)
+
+
 class Project(object):
     def __init__(self, name: str, columns: Dict[str, ProjectColumn], config: Configuration, number: int = None):
         self.name = name
@@ -206,59 +362,35 @@ class Project(object):
 
     @staticmethod
     def get_matching_column(item, config: Configuration):
-        is_issue = isinstance(item, Issue)  # assumes if not issue -> pull_request
-        column_name = ''
-        for tested_column_name in config.column_rule_desc_order:
-            conditions = config.column_to_rules[tested_column_name]
-
-            # filter and rename conditions to match current item type
-            relevant_conditions = {}
-            for condition, condition_value in conditions.items():
-                if is_issue and condition.startswith('issue.'):
-                    relevant_conditions[condition.replace('issue', 'item', 1)] = condition_value
-                elif not is_issue and condition.startswith('pull_request.'):
-                    relevant_conditions[condition.replace('pull_request', 'item', 1)] = condition_value
-
-            # if no relevant conditions - not true
-            is_true = len(relevant_conditions) > 0
-
-            if is_true:
-                for condition, condition_value in relevant_conditions.items():
-                    try:
-                        # TODO: consider replacing this with a solution that doesn't use eval()
-                        condition_results = eval(condition)
-                    except AttributeError:
-                        is_true = False
-                        break
-
-                    if isinstance(condition_value, list):  # todo: add the option to have not condition
-                        for option in condition_value:
-                            if OR in option:
-                                options = option.split(OR)
-                                if not any([True if option in condition_results else False for option in options]):
-                                    is_true = False
-                                    break
-
-                            elif option not in condition_results:
-                                is_true = False
-                                break
-
-                    elif isinstance(condition_value, bool):
-                        if condition_value is not bool(condition_results):
-                            is_true = False
-                            break
-
-                    elif condition_value != condition_results or condition_value not in condition_results:
-                        is_true = False
-                        break
-
-                if is_true:
-                    column_name = tested_column_name
-                    break
+        item_type = 'issue' if isinstance(item, Issue) else 'pull_request'  # assumes if not issue -> pull_request
+        column_matches = config.get_column_rule_table().iter_matches(item, item_type, config.column_rule_desc_order)
+        for tested_column_name, is_matching in column_matches:
+            if is_matching:
+                return tested_column_name
 
             config.logger.debug(f'{item.title} did not match the filters of the column - \'{tested_column_name}\'')
 
-        return column_name
+        return ''
+
+    @staticmethod
+    def get_matching_columns(items, config: Configuration):
+        """Get the matching columns of the items, the columns of all the items of a type are matched at once (see
+        ColumnRuleTable.match_columns)"""
+        item_type_indexes = defaultdict(list)
+        for index, item in enumerate(items):
+            item_type_indexes['issue' if isinstance(item, Issue) else 'pull_request'].append(index)
+
+        matching_columns = [''] * len(items)
+        for item_type, indexes in item_type_indexes.items():
+            column_names = config.get_column_rule_table().match_columns([items[index] for index in indexes],
+                                                                        item_type, config.column_rule_desc_order)
+            for index, column_name in zip(indexes, column_names):
+                if not column_name:
+                    config.logger.debug(f'{items[index].title} did not match the filters of any column')
+
+                matching_columns[index] = column_name
+
+        return matching_columns
 
     def get_all_item_ids(self):
         all_items = set()
@@ -277,32 +409,89 @@ class Project(object):
         return all_matching_items - items_in_project_keys
 
     def add_items(self, client, items, items_to_add, config: Configuration):
-        for item_id in items_to_add:
-            column_name = self.get_matching_column(items[item_id], config)
-            self.add_item(client, items[item_id], column_name, config)
+        # The cards are first created together, and then placed in their columns in the order they were added
+        cards_to_place = []
+        items_to_add = list(items_to_add)
+        matching_columns = self.get_matching_columns([items[item_id] for item_id in items_to_add], config)
+        with get_mutation_batcher(client) as batcher:
+            for item_id, column_name in zip(items_to_add, matching_columns):
+                self.add_item_card(batcher, items[item_id], column_name, config,
+                                   lambda card_id, item=items[item_id], column_name=column_name:
+                                   cards_to_place.append((card_id, item, column_name)))
+
+        with get_mutation_batcher(client) as batcher:
+            for card_id, item, column_name in cards_to_place:
+                self.columns[column_name].add_card(card_id=card_id,
+                                                   new_item=item,
+                                                   client=batcher)
+
+    async def add_items_async(self, client, items, items_to_add, config: Configuration):
+        # Items of the same column are added one after the other as their positions depend on each other
+        column_to_items = defaultdict(list)
+        items_to_add = [items[item_id] for item_id in items_to_add]
+        for item, column_name in zip(items_to_add, self.get_matching_columns(items_to_add, config)):
+            column_to_items[column_name].append(item)
+
+        async def add_column_items(column_name, column_items):
+            for item in column_items:
+                await self.add_item_async(client, item, column_name, config)
+
+        await asyncio.gather(*[add_column_items(column_name, column_items)
+                               for column_name, column_items in column_to_items.items()])
 
-    def add_item(self, client, item, column_name, config):
+    @staticmethod
+    def can_add_item(item, column_name, config):
         item_type = str(item)
         if column_name not in config.column_names:
             config.logger.warning(f"Did not found a matching column for your {item_type}, "
                                   f"please check your configuration file. The {item_type} was {item.title}")
+            return False
+
+        config.logger.info(f"Adding {item_type} '{item.title}' to column '{column_name}'")
+        return True
+
+    def add_item_card(self, client, item, column_name, config, on_card_added):
+        """Create the card of the item if it is not in the project yet, on_card_added is called with its card id"""
+        if not self.can_add_item(item, column_name, config):
+            return
+
+        column_id = self.columns[column_name].id if column_name else ''
+        if config.project_number not in item.get_associated_project():
+            with get_mutation_batcher(client) as batcher:
+                batcher.add_items_to_project(
+                    item.id, column_id,
+                    on_success=lambda response: on_card_added(response['addProjectCard']['cardEdge']['node']['id']),
+                    on_error=lambda error: config.logger.warning(
+                        f'The {str(item)} {item.title} was not added due to {error}'))
+        else:
+            on_card_added(item.get_card_id_from_project(config.project_number))
+
+    def add_item(self, client, item, column_name, config):
+        self.add_item_card(client, item, column_name, config,
+                           lambda card_id: self.columns[column_name].add_card(card_id=card_id,
+                                                                              new_item=item,
+                                                                              client=client))
+
+    async def add_item_async(self, client, item, column_name, config):
+        if not self.can_add_item(item, column_name, config):
             return
 
         column_id = self.columns[column_name].id if column_name else ''
-        config.logger.info(f"Adding {item_type} '{item.title}' to column '{column_name}'")
         if config.project_number not in item.get_associated_project():
             try:
-                response = client.add_items_to_project(item.id, column_id)
+                response = await client.add_items_to_project(item.id, column_id)
                 card_id = response['addProjectCard']['cardEdge']['node']['id']
+            except RateLimitExceeded:
+                raise
             except Exception as ex:
-                config.logger.warning(f'The {item_type} {item.title} was not added due to {str(ex)}')
+                config.logger.warning(f'The {str(item)} {item.title} was not added due to {str(ex)}')
                 return
         else:
             card_id = item.get_card_id_from_project(config.project_number)
 
-        self.columns[column_name].add_card(card_id=card_id,
-                                           new_item=item,
-                                           client=client)
+        await self.columns[column_name].add_card_async(card_id=card_id,
+                                                       new_item=item,
+                                                       client=client)
 
     def is_in_column(self, column_name, item_id):
         if item_id in self.columns[column_name].get_all_item_ids():
@@ -318,53 +507,116 @@ class Project(object):
 
         return None, None
 
-    def move_items(self, client, config: Configuration, all_items):
+    def get_items_to_move(self, config: Configuration, all_items):
+        """Get the (item, column before, card id, column after) of the items which are not in their matching column"""
         # todo: add explanation that we are relying on the github automation to move closed issues to the Done queue
-        for item in all_items.values():
+        items_to_move = []
+        items = list(all_items.values())
+        for item, column_name_after in zip(items, self.get_matching_columns(items, config)):
             column_name_before, card_id = self.get_current_location(item.id)
-            column_name_after = self.get_matching_column(item, config)
             column_id = self.columns[column_name_after].id if column_name_after else ''
             if not column_id or column_name_before == column_name_after or item.state == 'closed':
                 continue
 
-            self.move_item(client, item, column_name_after, config)
+            items_to_move.append((item, column_name_before, card_id, column_name_after))
+
+        return items_to_move
+
+    def move_items(self, client, config: Configuration, all_items):
+        with get_mutation_batcher(client) as batcher:
+            for item, column_name_before, card_id, column_name_after in self.get_items_to_move(config, all_items):
+                self.move_item(batcher, item, column_name_after, config)
+                self.columns[column_name_before].remove_card(card_id)
+
+    async def move_items_async(self, client, config: Configuration, all_items):
+        # Items moved to the same column are moved one after the other as their positions depend on each other.
+        # The cards are taken out of their columns before any of them is placed, so no card is placed after a card
+        # which is being moved to another column at the same time
+        column_to_items = defaultdict(list)
+        for item, column_name_before, card_id, column_name_after in self.get_items_to_move(config, all_items):
             self.columns[column_name_before].remove_card(card_id)
+            column_to_items[column_name_after].append(item)
 
-    def move_item(self, client, item, column_name, config: Configuration):
+        async def move_column_items(column_name, items):
+            for item in items:
+                await self.move_item_async(client, item, column_name, config)
+
+        await asyncio.gather(*[move_column_items(column_name, items)
+                               for column_name, items in column_to_items.items()])
+
+    @staticmethod
+    def get_card_id_to_move(item, column_name, config: Configuration):
         item_type = str(item)
         if item.state == 'closed':
             config.logger.debug(f'skipping {item.title} because the {item_type} is closed')
-            return
+            return None
 
         card_id = [_id for _id, value in item.card_id_project.items()
                    if value['project_number'] == config.project_number][0]
 
         config.logger.info(f"Moving card {item.title} to '{column_name}'")
+        return card_id
+
+    def move_item(self, client, item, column_name, config: Configuration):
+        card_id = self.get_card_id_to_move(item, column_name, config)
+        if card_id is None:
+            return
+
         self.columns[column_name].add_card(card_id=card_id,
                                            new_item=item,
                                            client=client)
 
-    def remove_items(self, client, config: Configuration):
+    async def move_item_async(self, client, item, column_name, config: Configuration):
+        card_id = self.get_card_id_to_move(item, column_name, config)
+        if card_id is None:
+            return
+
+        await self.columns[column_name].add_card_async(card_id=card_id,
+                                                       new_item=item,
+                                                       client=client)
+
+    def pop_cards_to_remove(self, config: Configuration):
+        """Remove the cards of the items which do not match the filters from the columns and return them"""
+        cards_to_remove = []
+        label_filter = config.get_label_filter()
         for column in self.columns.values():
             if column.name in config.get_closed_columns():  # skip closed columns
                 continue
 
-            indexes_to_delete = []
-            for index, card in enumerate(column.cards):
-                if not is_matching_project_item(card.item.labels, config.must_have_labels,
-                                                config.cant_have_labels, config.filter_labels):
-                    indexes_to_delete.append(index)
-                    self.remove_item(client, card.item_title, card.id, config, card.item)
+            cards_to_keep = []
+            matches = label_filter.match_masks([card.item.label_mask for card in column.cards])
+            for card, is_matching in zip(column.cards, matches):
+                (cards_to_keep if is_matching else cards_to_remove).append(card)
+
+            column.cards = cards_to_keep
+
+        return cards_to_remove
+
+    def remove_items(self, client, config: Configuration):
+        with get_mutation_batcher(client) as batcher:
+            for card in self.pop_cards_to_remove(config):
+                self.remove_item(batcher, card.item_title, card.id, config, card.item)
 
-            for index_to_delete in sorted(indexes_to_delete, reverse=True):  # Removing from bottom to top
-                del column.cards[index_to_delete]
+    async def remove_items_async(self, client, config: Configuration):
+        await asyncio.gather(*[self.remove_item_async(client, card.item_title, card.id, config, card.item)
+                               for card in self.pop_cards_to_remove(config)])
 
     @staticmethod
     def remove_item(client, issue_title, card_id, config, item=None):
+        item_type = 'issue' if item is None else (str(item))
+        config.logger.info(f'Removing {item_type} {issue_title} from project')
+        with get_mutation_batcher(client) as batcher:
+            batcher.delete_project_card(card_id, on_error=lambda error: config.logger.warning(
+                f'The {item_type} {issue_title} was not removed due to {error}'))
+
+    @staticmethod
+    async def remove_item_async(client, issue_title, card_id, config, item=None):
         item_type = 'issue' if item is None else (str(item))
         config.logger.info(f'Removing {item_type} {issue_title} from project')
         try:
-            client.delete_project_card(card_id)
+            await client.delete_project_card(card_id)
+        except RateLimitExceeded:
+            raise
         except Exception as ex:
             config.logger.warning(f'The {item_type} {issue_title} was not removed due to {str(ex)}')
 
@@ -374,3 +626,7 @@ class Project(object):
                 continue
 
             column.sort_cards(client, config)
+
+    async def sort_items_in_columns_async(self, client, config):
+        await asyncio.gather(*[column.sort_cards_async(client, config) for column in self.columns.values()
+                               if column.name not in config.get_closed_columns()])
@@ -2,6 +2,7 @@ from __future__ import absolute_import
 
 from github_automation.common.constants import (DEFAULT_PRIORITY_LIST,
                                                 SAME_LEVEL_PRIORITY_IDENTIFIER)
+from github_automation.common.utils import LABEL_INTERNER
 
 
 def extract_assignees(assignee_edges):
@@ -28,7 +29,9 @@ def extract_project_cards(project_cards):
 
 
 def is_review_requested(pull_request_node):
-    if pull_request_node['reviewRequests']['totalCount'] or pull_request_node['reviews']['totalCount']:
+    # the review fields are only fetched when a column rule uses them
+    if (pull_request_node.get('reviewRequests', {}).get('totalCount') or
+            pull_request_node.get('reviews', {}).get('totalCount')):
         return True
 
     else:
@@ -36,11 +39,11 @@ def is_review_requested(pull_request_node):
 
 
 def is_review_completed(pull_request_node):
-    return pull_request_node["reviewDecision"] == "APPROVED"
+    return pull_request_node.get("reviewDecision") == "APPROVED"
 
 
 def is_review_requested_changes(pull_request_node):
-    return pull_request_node["reviewDecision"] == "CHANGES_REQUESTED"
+    return pull_request_node.get("reviewDecision") == "CHANGES_REQUESTED"
 
 
 class BaseProjectItem(object):
@@ -54,6 +57,7 @@ class BaseProjectItem(object):
         self.assignees = assignees if assignees else []
 
         self.labels = labels if labels else []
+        self.label_mask = LABEL_INTERNER.get_mask(self.labels)
 
         self.priority_rank = None
         self.set_priority(priority_list)
@@ -65,6 +69,7 @@ class BaseProjectItem(object):
 
     def add_label(self, label):
         self.labels.append(label)
+        self.label_mask |= LABEL_INTERNER.get_bit(label)
 
     def get_associated_project(self):
         return [project.get('project_number') for project in self.card_id_project.values() if project]
@@ -90,6 +95,9 @@ class BaseProjectItem(object):
         else:
             self.priority_rank = 0
 
+        # the items are ordered by their sort keys from the top of a column - by priority and then the oldest first
+        self.sort_key = (-self.priority_rank, self.number)
+
     def __gt__(self, other):
         if self.priority_rank > other.priority_rank:
             return True
@@ -31,8 +31,9 @@ def parse_pull_request_for_issue(pull_request_node):
         "id": pull_request_node['source']['id'],
         "title": pull_request_node['source']['title'],
         "number": pull_request_node['source']['number'],
-        "assignees": _extract_assignees_from_nodes(pull_request_node['source']['assignees']['nodes']),
-        "labels": _get_labels_from_nodes(pull_request_node['source']['labels']['nodes']),
+        "assignees": _extract_assignees_from_nodes(
+            pull_request_node['source'].get('assignees', {}).get('nodes', [])),
+        "labels": _get_labels_from_nodes(pull_request_node['source'].get('labels', {}).get('nodes', [])),
         "review_requested": is_review_requested(pull_request_node['source']),
         "review_completed": is_review_completed(pull_request_node['source']),
         "review_requested_changes": is_review_requested_changes(pull_request_node['source']),
@@ -0,0 +1,4 @@
+from github_automation.fake_github.server import main
+
+if __name__ == '__main__':
+    main()
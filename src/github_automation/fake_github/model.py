@@ -0,0 +1,480 @@
+import random
+import re
+from base64 import b64decode, b64encode
+from datetime import datetime
+from itertools import count
+
+from graphql import GraphQLError
+
+MAX_PAGE_SIZE = 100
+ALL_ARCHIVED_STATES = ['ARCHIVED', 'NOT_ARCHIVED']
+SEARCH_QUALIFIER_PATTERN = re.compile(r'(-?)(\w+):((?:"[^"]*"|[^\s,"]+)(?:,(?:"[^"]*"|[^\s,"]+))*)')
+SEARCH_VALUE_PATTERN = re.compile(r'"([^"]*)"|([^\s,"]+)')
+
+
+def encode_cursor(node):
+    return b64encode(f'cursor:{node.id}'.encode('utf-8')).decode('utf-8')
+
+
+def decode_cursor(cursor, items):
+    try:
+        node_id = b64decode(cursor.encode('utf-8')).decode('utf-8').split(':', 1)[1]
+    except (ValueError, IndexError):
+        raise GraphQLError(f'`{cursor}` does not appear to be a valid cursor.')
+
+    for index, item in enumerate(items):
+        if item.id == node_id:
+            return index
+
+    raise GraphQLError(f'`{cursor}` does not appear to be a valid cursor.')
+
+
+def paginate(items, first=None, after=None, last=None, before=None):
+    """Get a GitHub connection of a page of the items, the cursors are based on the node ids like the ones of GitHub"""
+    for name, page_size in (('first', first), ('last', last)):
+        if page_size is not None and page_size > MAX_PAGE_SIZE:
+            raise GraphQLError(f'Requesting {page_size} records on the connection exceeds the `{name}` limit of '
+                               f'{MAX_PAGE_SIZE} records.')
+
+    start = decode_cursor(after, items) + 1 if after else 0
+    end = decode_cursor(before, items) if before else len(items)
+    page_start, page_end = start, end
+    if first is not None:
+        page_end = min(page_end, page_start + first)
+    if last is not None:
+        page_start = max(page_start, page_end - last)
+
+    page = items[page_start:page_end]
+    edges = [{'cursor': encode_cursor(item), 'node': item} for item in page]
+    return {
+        'edges': edges,
+        'nodes': page,
+        'totalCount': len(items),
+        'pageInfo': {
+            'hasNextPage': page_end < end,
+            'hasPreviousPage': page_start > start,
+            'startCursor': edges[0]['cursor'] if edges else None,
+            'endCursor': edges[-1]['cursor'] if edges else None,
+        }
+    }
+
+
+def filter_archived(cards, archivedStates):
+    states = archivedStates if archivedStates is not None else ALL_ARCHIVED_STATES
+    return [card for card in cards if ('ARCHIVED' if card.isArchived else 'NOT_ARCHIVED') in states]
+
+
+def parse_search_query(query):
+    """Get the qualifiers of a GitHub search query as (is negated, name, values) tuples, free text is ignored"""
+    return [(negation == '-', name, [quoted or plain for quoted, plain in SEARCH_VALUE_PATTERN.findall(values)])
+            for negation, name, values in SEARCH_QUALIFIER_PATTERN.findall(query)]
+
+
+class Node(object):
+    _ids = count(1)
+
+    def __init__(self):
+        self.id = b64encode(f'{type(self).__name__}:{next(self._ids)}'.encode('utf-8')).decode('utf-8')
+
+
+class User(Node):
+    def __init__(self, login):
+        super().__init__()
+        self.login = login
+        self.name = login
+
+
+class Label(Node):
+    def __init__(self, name, color='ededed'):
+        super().__init__()
+        self.name = name
+        self.color = color
+
+
+class Milestone(Node):
+    _database_ids = count(1001)  # apart from the numbers, as the milestone filter of the issues takes database ids
+
+    def __init__(self, number, title):
+        super().__init__()
+        self.databaseId = next(self._database_ids)
+        self.number = number
+        self.title = title
+
+
+class CrossReferencedEvent(Node):
+    def __init__(self, source, target, will_close_target=True):
+        super().__init__()
+        self.source = source
+        self.target = target
+        self.willCloseTarget = will_close_target
+        self.isCrossRepository = False
+
+
+class PullRequestReview(Node):
+    pass
+
+
+class ReviewRequest(Node):
+    pass
+
+
+class ProjectItem(Node):
+    """The common fields of issues and pull requests"""
+
+    def __init__(self, number, title, labels=(), assignees=(), state='OPEN'):
+        super().__init__()
+        self.number = number
+        self.title = title
+        self.state = state
+        self.label_list = list(labels)
+        self.assignee_list = list(assignees)
+        self.card_list = []
+
+    def labels(self, info, **kwargs):
+        return paginate(self.label_list, **kwargs)
+
+    def assignees(self, info, **kwargs):
+        return paginate(self.assignee_list, **kwargs)
+
+    def projectCards(self, info, archivedStates=None, **kwargs):
+        return paginate(filter_archived(self.card_list, archivedStates), **kwargs)
+
+
+class Issue(ProjectItem):
+    def __init__(self, number, title, labels=(), assignees=(), state='OPEN', milestone=None):
+        super().__init__(number, title, labels, assignees, state)
+        self.milestone = milestone
+        self.cross_references = []
+
+    def timelineItems(self, info, itemTypes=None, since=None, skip=None, **kwargs):
+        items = self.cross_references if not itemTypes or 'CROSS_REFERENCED_EVENT' in itemTypes else []
+        connection = paginate(items[skip or 0:], **kwargs)
+        connection['filteredCount'] = len(items)
+        return connection
+
+
+class PullRequest(ProjectItem):
+    def __init__(self, number, title, labels=(), assignees=(), state='OPEN', is_draft=False, review_decision=None,
+                 reviews=0, review_requests=0):
+        super().__init__(number, title, labels, assignees, state)
+        self.isDraft = is_draft
+        self.merged = state == 'MERGED'
+        self.mergedAt = datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ') if self.merged else None
+        self.reviewDecision = review_decision
+        self.review_list = [PullRequestReview() for _ in range(reviews)]
+        self.review_request_list = [ReviewRequest() for _ in range(review_requests)]
+
+    def reviews(self, info, author=None, **kwargs):
+        return paginate(self.review_list, **kwargs)
+
+    def reviewRequests(self, info, **kwargs):
+        return paginate(self.review_request_list, **kwargs)
+
+
+class ProjectCard(Node):
+    def __init__(self, column, content=None, note=None):
+        super().__init__()
+        self.column = column
+        self.project = column.project
+        self.content = content
+        self.note = note
+        self.isArchived = False
+        self.state = 'CONTENT_ONLY' if content is not None else 'NOTE_ONLY'
+
+
+class ProjectColumn(Node):
+    def __init__(self, project, name):
+        super().__init__()
+        self.project = project
+        self.name = name
+        self.card_list = []
+
+    def cards(self, info, archivedStates=None, **kwargs):
+        return paginate(filter_archived(self.card_list, archivedStates), **kwargs)
+
+
+class Project(Node):
+    def __init__(self, number, name, body=None):
+        super().__init__()
+        self.number = number
+        self.name = name
+        self.body = body
+        self.column_list = []
+
+    def columns(self, info, **kwargs):
+        return paginate(self.column_list, **kwargs)
+
+
+class ProjectOwner(Node):
+    def __init__(self):
+        super().__init__()
+        self.projects = {}
+
+    def project(self, info, number):
+        return self.projects.get(number)
+
+
+class Organization(ProjectOwner):
+    def __init__(self, login):
+        super().__init__()
+        self.login = login
+
+
+class Repository(ProjectOwner):
+    def __init__(self, owner, name):
+        super().__init__()
+        self.owner = owner
+        self.name = name
+        self.issue_list = []
+        self.pull_request_list = []
+        self.milestone_list = []
+
+    def issue(self, info, number):
+        return next((issue for issue in self.issue_list if issue.number == number), None)
+
+    def pullRequest(self, info, number):
+        return next((pull_request for pull_request in self.pull_request_list if pull_request.number == number), None)
+
+    def milestone(self, info, number):
+        return next((milestone for milestone in self.milestone_list if milestone.number == number), None)
+
+    def issues(self, info, states=None, labels=None, filterBy=None, **kwargs):
+        filter_by = filterBy or {}
+        states = states or filter_by.get('states')
+        labels = labels or filter_by.get('labels')
+        issues = [issue for issue in self.issue_list
+                  if (not states or issue.state in states) and
+                  (not labels or any(label.name in labels for label in issue.label_list)) and
+                  self.is_milestone_matching(issue, filter_by.get('milestone'), 'databaseId') and
+                  self.is_milestone_matching(issue, filter_by.get('milestoneNumber'), 'number')]
+        return paginate(issues, **kwargs)
+
+    def pullRequests(self, info, states=None, labels=None, baseRefName=None, headRefName=None, **kwargs):
+        pull_requests = [pull_request for pull_request in self.pull_request_list
+                         if (not states or pull_request.state in states) and
+                         (not labels or any(label.name in labels for label in pull_request.label_list))]
+        return paginate(pull_requests, **kwargs)
+
+    @staticmethod
+    def is_milestone_matching(issue, milestone, key):
+        """The milestone filter matches the milestone by its database id, and the milestoneNumber one by its number"""
+        if milestone is None:
+            return True
+        if milestone == '*':
+            return issue.milestone is not None
+        if milestone == 'none':
+            return issue.milestone is None
+
+        return issue.milestone is not None and str(getattr(issue.milestone, key)) == milestone
+
+
+class FakeGitHub(object):
+    """In memory state of the subset of the GitHub GraphQL API used by github-automation
+
+    It is the root value of the queries and the mutations, so its methods resolve the fields of both root types.
+    """
+
+    def __init__(self):
+        self.repositories = {}
+        self.organizations = {}
+        self.nodes = {}
+        self.viewer_user = User('github-automation')
+
+    def add_node(self, node):
+        self.nodes[node.id] = node
+        return node
+
+    def get_node(self, node_id, node_type=Node):
+        node = self.nodes.get(node_id)
+        if not isinstance(node, node_type):
+            raise GraphQLError(f"Could not resolve to a node with the global id of '{node_id}'")
+
+        return node
+
+    def add_repository(self, owner, name):
+        if (owner, name) not in self.repositories:
+            self.repositories[(owner, name)] = self.add_node(Repository(owner, name))
+
+        return self.repositories[(owner, name)]
+
+    def add_organization(self, login):
+        if login not in self.organizations:
+            self.organizations[login] = self.add_node(Organization(login))
+
+        return self.organizations[login]
+
+    def add_project(self, owner, number, name, column_names):
+        project = self.add_node(Project(number, name))
+        owner.projects[number] = project
+        for column_name in column_names:
+            project.column_list.append(self.add_node(ProjectColumn(project, column_name)))
+
+        return project
+
+    def add_issue(self, repository, title, **kwargs):
+        issue = self.add_node(Issue(self.get_next_number(repository), title, **kwargs))
+        repository.issue_list.append(issue)
+        return issue
+
+    def add_pull_request(self, repository, title, closes=(), **kwargs):
+        pull_request = self.add_node(PullRequest(self.get_next_number(repository), title, **kwargs))
+        repository.pull_request_list.append(pull_request)
+        for issue in closes:
+            issue.cross_references.append(self.add_node(CrossReferencedEvent(pull_request, issue)))
+
+        return pull_request
+
+    @staticmethod
+    def get_next_number(repository):
+        return len(repository.issue_list) + len(repository.pull_request_list) + 1
+
+    def add_card(self, column, content=None, note=None, after_card=None):
+        card = self.add_node(ProjectCard(column, content, note))
+        if content is not None:
+            content.card_list.append(card)
+
+        self.place_card(card, column, after_card)
+        return card
+
+    @staticmethod
+    def place_card(card, column, after_card=None):
+        if card.column is not None and card in card.column.card_list:
+            card.column.card_list.remove(card)
+
+        card.column = column
+        index = column.card_list.index(after_card) + 1 if after_card is not None else 0
+        column.card_list.insert(index, card)
+
+    # Query fields
+    def repository(self, info, owner, name):
+        return self.repositories.get((owner, name))
+
+    def organization(self, info, login):
+        return self.organizations.get(login)
+
+    def node(self, info, id):
+        return self.nodes.get(id)
+
+    def viewer(self, info):
+        return self.viewer_user
+
+    def search(self, info, query, type, **kwargs):
+        """Search the issues and pull requests by the repo, is, label, milestone and no qualifiers"""
+        qualifiers = parse_search_query(query)
+        repository_keys = [tuple(value.split('/', 1)) for _, name, values in qualifiers if name == 'repo'
+                           for value in values]
+        items = []
+        if type == 'ISSUE':
+            for key, repository in self.repositories.items():
+                if not repository_keys or key in repository_keys:
+                    items.extend(repository.issue_list + repository.pull_request_list)
+
+        for is_negated, name, values in qualifiers:
+            if name != 'repo':
+                items = [item for item in items if self.is_search_qualifier_matching(item, name, values) != is_negated]
+
+        connection = paginate(items, **kwargs)
+        connection['issueCount'] = len(items)
+        return connection
+
+    @staticmethod
+    def is_search_qualifier_matching(item, name, values):
+        if name == 'is':
+            return all({'issue': isinstance(item, Issue), 'pr': isinstance(item, PullRequest),
+                        'open': item.state == 'OPEN', 'closed': item.state != 'OPEN'}[value] for value in values)
+        if name == 'label':  # the labels are matched case insensitively like GitHub does
+            return any(label.name.lower() == value.lower() for label in item.label_list for value in values)
+        if name == 'milestone':
+            milestone = getattr(item, 'milestone', None)
+            return milestone is not None and any(milestone.title == value for value in values)
+        if name == 'no' and values == ['milestone']:
+            return getattr(item, 'milestone', None) is None
+
+        raise GraphQLError(f'The search qualifier {name} is not supported')
+
+    def rateLimit(self, info, dryRun=False):
+        return info.context.get('rate_limit') if info.context else None
+
+    # Mutation fields
+    def addProjectCard(self, info, input):
+        column = self.get_node(input['projectColumnId'], ProjectColumn)
+        content = self.get_node(input['contentId'], ProjectItem) if input.get('contentId') else None
+        if content is not None and any(card.project is column.project for card in content.card_list):
+            raise GraphQLError('Project already has the associated issue')
+
+        card = self.add_card(column, content, input.get('note'))
+        return {'cardEdge': {'cursor': encode_cursor(card), 'node': card}, 'projectColumn': column,
+                'clientMutationId': input.get('clientMutationId')}
+
+    def moveProjectCard(self, info, input):
+        card = self.get_node(input['cardId'], ProjectCard)
+        column = self.get_node(input['columnId'], ProjectColumn)
+        after_card = self.get_node(input['afterCardId'], ProjectCard) if input.get('afterCardId') else None
+        if column.project is not card.project or (after_card is not None and after_card.column is not column):
+            raise GraphQLError('The card can not be moved to the given position')
+
+        self.place_card(card, column, after_card)
+        return {'cardEdge': {'cursor': encode_cursor(card), 'node': card},
+                'clientMutationId': input.get('clientMutationId')}
+
+    def deleteProjectCard(self, info, input):
+        card = self.get_node(input['cardId'], ProjectCard)
+        card.column.card_list.remove(card)
+        if card.content is not None:
+            card.content.card_list.remove(card)
+
+        del self.nodes[card.id]
+        return {'deletedCardId': card.id, 'column': card.column, 'clientMutationId': input.get('clientMutationId')}
+
+    def updateProjectCard(self, info, input):
+        card = self.get_node(input['projectCardId'], ProjectCard)
+        if input.get('isArchived') is not None:
+            card.isArchived = input['isArchived']
+        if input.get('note') is not None:
+            card.note = input['note']
+
+        return {'projectCard': card, 'clientMutationId': input.get('clientMutationId')}
+
+
+def generate_board(github=None, owner='owner', repository_name='repository', project_number=1,
+                   column_names=('Queue', 'In progress', 'Review in progress', 'Done'), issues=100, pull_requests=20,
+                   cards=None, labels=('bug', 'feature', 'Critical', 'High', 'Medium', 'Low'), assignees=5,
+                   milestones=3, is_org_project=False, seed=0):
+    """Seed a fake GitHub with a repository of random issues and pull requests and a project board
+
+    Every pull request closes one of the issues, and the first `cards` issues (all of them by default) have a card
+    in a random column of the board. Returns the FakeGitHub and the project.
+    """
+    github = github or FakeGitHub()
+    generator = random.Random(seed)
+    repository = github.add_repository(owner, repository_name)
+    project_owner = github.add_organization(owner) if is_org_project else repository
+    project = github.add_project(project_owner, project_number, f'Board {project_number}', column_names)
+
+    label_list = [github.add_node(Label(name)) for name in labels]
+    user_list = [github.add_node(User(f'user{index}')) for index in range(assignees)]
+    milestone_list = [github.add_node(Milestone(number, f'Milestone {number}')) for number in range(1, milestones + 1)]
+    repository.milestone_list.extend(milestone_list)
+
+    issue_list = []
+    for index in range(issues):
+        issue_list.append(github.add_issue(
+            repository, f'Issue {index}',
+            labels=generator.sample(label_list, generator.randint(0, min(3, len(label_list)))),
+            assignees=generator.sample(user_list, generator.randint(0, min(2, len(user_list)))),
+            milestone=generator.choice(milestone_list + [None]) if milestone_list else None))
+
+    for index in range(pull_requests):
+        github.add_pull_request(
+            repository, f'Pull request {index}',
+            closes=[generator.choice(issue_list)] if issue_list else [],
+            labels=generator.sample(label_list, generator.randint(0, min(2, len(label_list)))),
+            assignees=generator.sample(user_list, generator.randint(0, min(1, len(user_list)))),
+            is_draft=generator.random() < 0.2,
+            review_decision=generator.choice([None, 'APPROVED', 'CHANGES_REQUESTED', 'REVIEW_REQUIRED']),
+            reviews=generator.randint(0, 2), review_requests=generator.randint(0, 2))
+
+    for issue in issue_list[:len(issue_list) if cards is None else cards]:
+        github.add_card(generator.choice(project.column_list), issue)
+
+    return github, project
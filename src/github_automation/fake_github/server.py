@@ -0,0 +1,205 @@
+import json
+import math
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import click
+from graphql import GraphQLInterfaceType, GraphQLUnionType, build_ast_schema, graphql_sync, parse
+
+from github_automation.fake_github.model import FakeGitHub, generate_board
+from github_automation.management.github_client import BUNDLED_SCHEMA_PATH
+
+
+def load_fake_schema():
+    """Build the bundled GitHub schema with type resolvers which match the types by the model class names"""
+    with open(BUNDLED_SCHEMA_PATH, 'r') as schema_file:
+        schema = build_ast_schema(parse(schema_file.read()))
+
+    for graphql_type in schema.type_map.values():
+        if isinstance(graphql_type, (GraphQLInterfaceType, GraphQLUnionType)):
+            graphql_type.resolve_type = lambda value, info, abstract_type: type(value).__name__
+
+    return schema
+
+
+class RateLimit(object):
+    """The rate limit budget of the fake GitHub, reset every window seconds"""
+
+    def __init__(self, limit=5000, window=3600, clock=time.time):
+        self.limit = limit
+        self.window = window
+        self.clock = clock
+        self.remaining = limit
+        self.reset_at = math.ceil(clock() + window)  # GitHub reports the reset time in whole seconds
+
+    def spend(self, cost):
+        """Spend the cost of a request, returns the rate limit of the request or None if there is not enough budget"""
+        now = self.clock()
+        if now >= self.reset_at:
+            self.remaining = self.limit
+            self.reset_at = math.ceil(now + self.window)
+
+        if self.remaining < cost:
+            return None
+
+        self.remaining -= cost
+        return {'cost': cost, 'limit': self.limit, 'remaining': self.remaining, 'used': self.limit - self.remaining,
+                'nodeCount': 0,
+                'resetAt': datetime.fromtimestamp(self.reset_at, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')}
+
+
+class FakeGitHubServer(object):
+    """Serves a FakeGitHub over HTTP in a background thread, point a client at it by passing its url as the base url
+
+    Every request takes latency seconds and costs query_cost points of the rate limit. A random error_rate of the
+    requests fail with error_status, and a random secondary_rate_limit_rate of them with a secondary rate limit
+    response which asks to retry after retry_after seconds.
+    """
+
+    def __init__(self, github=None, host='127.0.0.1', port=0, latency=0, rate_limit=None, query_cost=1, error_rate=0,
+                 error_status=502, secondary_rate_limit_rate=0, retry_after=1, seed=None):
+        self.github = github or FakeGitHub()
+        self.schema = load_fake_schema()
+        self.latency = latency
+        self.rate_limit = rate_limit or RateLimit()
+        self.query_cost = query_cost
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.secondary_rate_limit_rate = secondary_rate_limit_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.request_count = 0
+        self.http_server = ThreadingHTTPServer((host, port), self.get_handler_class())
+        self.http_server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.http_server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self.thread = threading.Thread(target=self.http_server.serve_forever, kwargs={'poll_interval': 0.05},
+                                       daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.http_server.shutdown()
+        self.http_server.server_close()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def handle(self, body):
+        """Handle the body of a GraphQL request, returns the status, the headers and the body of the response"""
+        if self.latency:
+            time.sleep(self.latency)
+
+        with self.lock:
+            self.request_count += 1
+            error_roll = self.random.random()
+            if error_roll < self.error_rate:
+                return self.error_status, {'Content-Type': 'text/html'}, b'<html><body>Server Error</body></html>'
+            if error_roll < self.error_rate + self.secondary_rate_limit_rate:
+                message = 'You have exceeded a secondary rate limit. Please wait a few minutes before you try again.'
+                return 403, {'Retry-After': str(self.retry_after)}, self.to_json({'message': message})
+
+            request = json.loads(body)
+            rate_limit = self.rate_limit.spend(self.query_cost)
+            if rate_limit is None:
+                return 200, {}, self.to_json({'errors': [{'type': 'RATE_LIMITED',
+                                                          'message': 'API rate limit exceeded for user ID 1.'}]})
+
+            result = graphql_sync(self.schema, request['query'], root_value=self.github,
+                                  context_value={'rate_limit': rate_limit},
+                                  variable_values=request.get('variables'),
+                                  operation_name=request.get('operationName'))
+
+        response = {'data': result.data}
+        if result.errors:
+            response['errors'] = [error.formatted for error in result.errors]
+
+        return 200, {'X-RateLimit-Remaining': str(rate_limit['remaining'])}, self.to_json(response)
+
+    @staticmethod
+    def to_json(value):
+        return json.dumps(value).encode('utf-8')
+
+    def get_handler_class(self):
+        server = self
+
+        class FakeGitHubRequestHandler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keeps the connections alive like GitHub does
+            disable_nagle_algorithm = True  # the headers and the body are written separately
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                status, headers, response = server.handle(body)
+                self.send_response(status)
+                headers.setdefault('Content-Type', 'application/json')
+                for name, value in headers.items():
+                    self.send_header(name, value)
+
+                self.send_header('Content-Length', str(len(response)))
+                self.end_headers()
+                self.wfile.write(response)
+
+            def log_message(self, *args):
+                pass
+
+        return FakeGitHubRequestHandler
+
+
+@click.command(context_settings=dict(max_content_width=100))
+@click.help_option('-h', '--help')
+@click.option('--host', default='127.0.0.1', show_default=True)
+@click.option('--port', type=int, default=8000, show_default=True)
+@click.option('--owner', default='owner', show_default=True, help='The owner of the repository and the project')
+@click.option('--repository-name', default='repository', show_default=True)
+@click.option('--project-number', type=int, default=1, show_default=True)
+@click.option('--org-project', is_flag=True, help='Create the project under the organization of the owner')
+@click.option('--column-names', default='Queue,In progress,Review in progress,Done', show_default=True,
+              help='The column names of the project in CSV format')
+@click.option('--issues', type=int, default=100, show_default=True, help='The number of issues to generate')
+@click.option('--pull-requests', type=int, default=20, show_default=True,
+              help='The number of pull requests to generate')
+@click.option('--cards', type=int, help='The number of issues which have a card on the board, defaults to all of them')
+@click.option('--latency', type=float, default=0, show_default=True, help='The number of seconds every request takes')
+@click.option('--rate-limit', type=int, default=5000, show_default=True,
+              help='The rate limit budget of every rate limit window')
+@click.option('--rate-limit-window', type=int, default=3600, show_default=True,
+              help='The number of seconds until the rate limit budget resets')
+@click.option('--error-rate', type=float, default=0, show_default=True,
+              help='The fraction of the requests which fail with a server error')
+@click.option('--secondary-rate-limit-rate', type=float, default=0, show_default=True,
+              help='The fraction of the requests which fail on the secondary rate limit')
+@click.option('--seed', type=int, default=0, show_default=True)
+def main(**kwargs):
+    """Serve a fake GitHub GraphQL API with a generated project board, for load testing github-automation.
+
+    Point github-automation at it by setting GITHUB_AUTOMATION_BASE_URL to the url it prints."""
+    github, _ = generate_board(owner=kwargs['owner'], repository_name=kwargs['repository_name'],
+                               project_number=kwargs['project_number'],
+                               column_names=kwargs['column_names'].split(','), issues=kwargs['issues'],
+                               pull_requests=kwargs['pull_requests'], cards=kwargs['cards'],
+                               is_org_project=kwargs['org_project'], seed=kwargs['seed'])
+    server = FakeGitHubServer(github, host=kwargs['host'], port=kwargs['port'], latency=kwargs['latency'],
+                              rate_limit=RateLimit(kwargs['rate_limit'], kwargs['rate_limit_window']),
+                              error_rate=kwargs['error_rate'],
+                              secondary_rate_limit_rate=kwargs['secondary_rate_limit_rate'], seed=kwargs['seed'])
+    print(f'Serving a fake GitHub GraphQL API on {server.url}/graphql')
+    try:
+        server.http_server.serve_forever()
+    except KeyboardInterrupt:
+        server.http_server.server_close()
@@ -0,0 +1,177 @@
+import asyncio
+import json
+import os
+import time
+from collections import defaultdict
+from copy import deepcopy
+
+from gql.transport.async_transport import AsyncTransport
+from gql.transport.transport import Transport
+from graphql import ExecutionResult, print_ast
+
+from github_automation.common.constants import (RECORD_PATH_ENV_VARIABLE, REPLAY_LATENCY_ENV_VARIABLE,
+                                                REPLAY_PATH_ENV_VARIABLE)
+
+CASSETTE_VERSION = 1
+
+
+class Cassette(object):
+    """The requests sent to the GitHub GraphQL API and their results, stored in a JSON file
+
+    A request is replayed by its query and variables, when the same request was recorded more than once the results
+    are replayed in the order they were recorded, and the last one is repeated once they run out.
+    """
+
+    def __init__(self, path, interactions=None):
+        self.path = path
+        self.interactions = interactions or []
+        self.replays = defaultdict(list)
+        for interaction in self.interactions:
+            self.replays[self.get_request_key(interaction['query'], interaction['variables'])].append(interaction)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r') as cassette_file:
+            cassette = json.load(cassette_file)
+
+        if cassette.get('version') != CASSETTE_VERSION:
+            raise ValueError(f'The cassette {path} is of version {cassette.get("version")}, '
+                             f'only version {CASSETTE_VERSION} is supported')
+
+        return cls(path, cassette['interactions'])
+
+    def save(self):
+        cassette_dir = os.path.dirname(self.path)
+        if cassette_dir:
+            os.makedirs(cassette_dir, exist_ok=True)
+
+        with open(self.path, 'w') as cassette_file:
+            json.dump({'version': CASSETTE_VERSION, 'interactions': self.interactions}, cassette_file, indent=2)
+
+    @staticmethod
+    def get_request_key(query, variable_values):
+        return query, json.dumps(variable_values or {}, sort_keys=True)
+
+    def record(self, document, variable_values, result):
+        # the result is copied as the client changes it once it is returned
+        self.interactions.append({'query': print_ast(document), 'variables': deepcopy(variable_values or {}),
+                                  'result': {'data': deepcopy(result.data), 'errors': deepcopy(result.errors)}})
+
+    def replay(self, document, variable_values):
+        query = print_ast(document)
+        interactions = self.replays.get(self.get_request_key(query, variable_values))
+        if not interactions:
+            raise ValueError(f'The cassette {self.path} has no recorded result for the variables {variable_values} '
+                             f'of the query:\n{query}')
+
+        interaction = interactions.pop(0) if len(interactions) > 1 else interactions[0]
+        return ExecutionResult(data=deepcopy(interaction['result']['data']),
+                               errors=deepcopy(interaction['result']['errors']))
+
+
+class RecordingTransport(Transport):
+    """Sends the requests using the given transport and records their results, the cassette is saved on close"""
+
+    def __init__(self, transport, cassette):
+        self.transport = transport
+        self.cassette = cassette
+
+    def connect(self):
+        self.transport.connect()
+
+    def execute(self, document, variable_values=None, *args, **kwargs):
+        result = self.transport.execute(document, variable_values, *args, **kwargs)
+        self.cassette.record(document, variable_values, result)
+        return result
+
+    def close(self):
+        self.transport.close()
+        self.cassette.save()
+
+
+class ReplayTransport(Transport):
+    """Serves the recorded results of a cassette instead of sending the requests, after the given latency"""
+
+    def __init__(self, cassette, latency=0):
+        self.cassette = cassette
+        self.latency = latency
+
+    def connect(self):
+        pass
+
+    def execute(self, document, variable_values=None, *args, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+
+        return self.cassette.replay(document, variable_values)
+
+    def close(self):
+        pass
+
+
+class AsyncRecordingTransport(AsyncTransport):
+    def __init__(self, transport, cassette):
+        self.transport = transport
+        self.cassette = cassette
+
+    async def connect(self):
+        await self.transport.connect()
+
+    async def execute(self, document, variable_values=None, *args, **kwargs):
+        result = await self.transport.execute(document, variable_values, *args, **kwargs)
+        self.cassette.record(document, variable_values, result)
+        return result
+
+    async def close(self):
+        await self.transport.close()
+        self.cassette.save()
+
+    def subscribe(self, *args, **kwargs):
+        raise NotImplementedError('Subscriptions are not recorded')
+
+
+class AsyncReplayTransport(AsyncTransport):
+    def __init__(self, cassette, latency=0):
+        self.cassette = cassette
+        self.latency = latency
+
+    async def connect(self):
+        pass
+
+    async def execute(self, document, variable_values=None, *args, **kwargs):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        return self.cassette.replay(document, variable_values)
+
+    async def close(self):
+        pass
+
+    def subscribe(self, *args, **kwargs):
+        raise NotImplementedError('Subscriptions are not replayed')
+
+
+def wrap_transport(transport, record_path=None, replay_path=None, replay_latency=None):
+    """Get a transport which records the requests of the given one to a cassette, or one which replays a cassette
+
+    The paths and the latency (in seconds) default to the ones set in the environment, the transport is returned as
+    is when neither recording nor replaying.
+    """
+    record_path = record_path or os.getenv(RECORD_PATH_ENV_VARIABLE)
+    replay_path = replay_path or os.getenv(REPLAY_PATH_ENV_VARIABLE)
+    if record_path and replay_path:
+        raise ValueError('Requests can not be recorded while replaying a cassette')
+
+    is_async = isinstance(transport, AsyncTransport)
+    if replay_path:
+        if replay_latency is None:
+            replay_latency = float(os.getenv(REPLAY_LATENCY_ENV_VARIABLE, 0))
+
+        replay_transport = AsyncReplayTransport if is_async else ReplayTransport
+        return replay_transport(Cassette.load(replay_path), replay_latency)
+
+    if record_path:
+        recording_transport = AsyncRecordingTransport if is_async else RecordingTransport
+        return recording_transport(transport, Cassette(record_path))
+
+    return transport
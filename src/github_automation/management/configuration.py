@@ -1,6 +1,10 @@
 import logging
 import os
 from configparser import ConfigParser
+from copy import deepcopy
+
+from github_automation.common.constants import ANY_MILESTONE, NO_MILESTONE
+from github_automation.common.utils import ColumnRuleTable, LabelFilter
 
 
 class Configuration(object):
@@ -40,6 +44,10 @@ class Configuration(object):
         'General',
         'Actions'
     ]
+    FETCH_MODES = [
+        'list',
+        'search'
+    ]
     OPTIONAL_ACTIONS = [
         'remove',
         'add',
@@ -70,6 +78,7 @@ class Configuration(object):
         self.column_names = []
         self.column_rule_desc_order = []
         self.is_org_project = False
+        self.fetch_mode = 'list'
 
         # Actions
         self.remove = False
@@ -79,6 +88,8 @@ class Configuration(object):
 
         # Conditional
         self.column_to_rules = {}
+        self.column_rule_table = None
+        self.label_filter = None
 
         self.logger = self.logging_setup(verbose, quiet, log_path, conf_file_path)
 
@@ -104,6 +115,17 @@ class Configuration(object):
 
             self.custom_set_attr(key, self.config['General'][key])
 
+        if self.fetch_mode not in self.FETCH_MODES:
+            raise ValueError(f'Provided illegal fetch_mode - {self.fetch_mode}, the possible options are: '
+                             f'{", ".join(self.FETCH_MODES)}')
+
+        # the milestone is sent as a string to GitHub, and is given by its number in both fetch modes
+        self.filter_milestone = str(self.filter_milestone)
+        if self.filter_milestone and not (self.filter_milestone.isdigit() or
+                                          self.filter_milestone in (ANY_MILESTONE, NO_MILESTONE)):
+            raise ValueError(f'Provided illegal filter_milestone - {self.filter_milestone}, it should be the number '
+                             f'of a milestone, {ANY_MILESTONE} for any milestone or {NO_MILESTONE} for no milestone')
+
     def load_actions(self):
         for key in self.config['Actions']:
             if key not in self.OPTIONAL_ACTIONS:
@@ -141,6 +163,30 @@ class Configuration(object):
         self.load_actions()
         self.load_column_rules()
 
+    def get_query_fields(self):
+        """Get the column rules which the items are matched by, so only the item fields they use are fetched"""
+        if not (self.add or self.move):
+            return frozenset()
+
+        return frozenset(rule for rules in self.column_to_rules.values() for rule in rules)
+
+    def get_label_filter(self):
+        """Get the label filters compiled into a LabelFilter, which is compiled again once they are changed"""
+        labels = (tuple(self.must_have_labels), tuple(self.cant_have_labels), tuple(self.filter_labels))
+        if self.label_filter is None or self.label_filter[0] != labels:
+            self.label_filter = (labels, LabelFilter(*labels))
+
+        return self.label_filter[1]
+
+    def get_column_rule_table(self):
+        """Get the column rules compiled into a ColumnRuleTable of their distinct conditions, so the items are matched
+        without parsing the rules and every condition is checked once per item. It is compiled again once the rules
+        are changed."""
+        if self.column_rule_table is None or self.column_rule_table[0] != self.column_to_rules:
+            self.column_rule_table = (deepcopy(self.column_to_rules), ColumnRuleTable(self.column_to_rules))
+
+        return self.column_rule_table[1]
+
     def get_closed_columns(self):
         return self.closed_issues_column, self.closed_pull_requests_column, self.merged_pull_requests_column
 
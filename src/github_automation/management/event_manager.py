@@ -1,16 +1,14 @@
 from __future__ import absolute_import
 
+import asyncio
 import json
+from copy import copy
 
-from github_automation.common.utils import (get_column_items_with_prev_column,
-                                            get_first_column_items,
-                                            is_matching_project_item,
-                                            get_project_from_response)
 from github_automation.core.project_item.issue import Issue, parse_issue
-from github_automation.core.project.project import Project, parse_project
+from github_automation.core.project.project import Project, load_project, load_project_async
 from github_automation.core.project_item.pull_request import PullRequest, parse_pull_request
 from github_automation.management.configuration import Configuration
-from github_automation.management.github_client import GraphQLClient
+from github_automation.management.github_client import get_shared_client
 
 
 class EventManager(object):
@@ -30,67 +28,73 @@ class EventManager(object):
         self.repository_name = config.repository_name
 
         self.event = json.loads(event)
-        self.client = client if client else GraphQLClient(api_key)
+        self.client = client if client else get_shared_client(api_key)
 
-    def get_prev_column_cursor(self, column_name):
-        layout = self.client.get_project_layout(owner=self.config.project_owner,
-                                                repository_name=self.config.repository_name,
-                                                project_number=self.config.project_number,
-                                                is_org_project=self.config.is_org_project)
+    def load_project_column(self, column_name):
+        return load_project(self.client, self.config, column_names=[column_name])
 
-        prev_cursor = ''
-        project = get_project_from_response(layout, self.config.is_org_project)
-        column_edges = project.get('columns', {}).get('edges', {}) if project else {}
-        for index, column in enumerate(column_edges):
-            if column_name == column['node']['name']:
-                if index != 0:
-                    prev_cursor = column_edges[index - 1]['cursor']
+    async def load_project_column_async(self, column_name, config):
+        return await load_project_async(self.client, config, column_names=[column_name])
 
-        return prev_cursor
+    @staticmethod
+    def get_item_action(item, config):
+        """Get the action to take on the item in the project of the configuration and the item's matching column"""
+        if (config.remove and config.project_number in item.get_associated_project()
+                and not config.get_label_filter().is_matching(item.label_mask)):
+            return 'remove', None
 
-    def load_project_column(self, column_name):
-        prev_cursor = self.get_prev_column_cursor(column_name)
-        if prev_cursor:
-            response = get_column_items_with_prev_column(self.client, self.config, prev_cursor)
+        matching_column_name = Project.get_matching_column(item, config)
 
-        else:
-            response = get_first_column_items(self.client, self.config)
+        if config.add and config.project_number not in item.get_associated_project():
+            return 'add', matching_column_name
+
+        column_name_before = [value['project_column'] for _id, value in item.card_id_project.items()
+                              if value['project_number'] == config.project_number][0]
+        if (config.add and not column_name_before) or \
+                (config.move and matching_column_name != column_name_before):
+            print(f'Moving {item.title} from {column_name_before}')
+            return 'move', matching_column_name
 
-        project = get_project_from_response(response, self.config.is_org_project)
-        return Project(**parse_project(project, config=self.config))
+        if config.sort and column_name_before == matching_column_name:
+            return 'sort', matching_column_name
 
-    def manage_item_in_project(self, item):
-        if (self.config.remove and self.config.project_number in item.get_associated_project()
-                and not is_matching_project_item(item.labels,
-                                                 self.config.must_have_labels, self.config.cant_have_labels,
-                                                 self.config.filter_labels)):
+        return None, matching_column_name
 
-            card_id = [_id for _id, value in item.card_id_project.items()
-                       if value['project_number'] == self.config.project_number][0]
+    def manage_item_in_project(self, item):
+        action, matching_column_name = self.get_item_action(item, self.config)
+        if action == 'remove':
+            card_id = item.get_card_id_from_project(self.config.project_number)
             Project.remove_item(self.client, item.title, card_id, self.config, item)
-            return
-
-        matching_column_name = Project.get_matching_column(item, self.config)
 
-        if self.config.add and self.config.project_number not in item.get_associated_project():
+        elif action == 'add':
             project = self.load_project_column(matching_column_name)
             project.add_item(self.client, item, matching_column_name, self.config)
-            return
 
-        column_name_before = [value['project_column'] for _id, value in item.card_id_project.items()
-                              if value['project_number'] == self.config.project_number][0]
-        if (self.config.add and not column_name_before) or \
-                (self.config.move and matching_column_name != column_name_before):
-            print(f'Moving {item.title} from {column_name_before}')
+        elif action == 'move':
             project = self.load_project_column(matching_column_name)
             project.move_item(self.client, item, matching_column_name, self.config)
-            return
 
-        if self.config.sort and column_name_before == matching_column_name:
+        elif action == 'sort':
             project = self.load_project_column(matching_column_name)
             project.columns[matching_column_name].sort_cards(self.client, self.config)
 
-            return
+    async def manage_item_in_project_async(self, item, config):
+        action, matching_column_name = self.get_item_action(item, config)
+        if action == 'remove':
+            card_id = item.get_card_id_from_project(config.project_number)
+            await Project.remove_item_async(self.client, item.title, card_id, config, item)
+
+        elif action == 'add':
+            project = await self.load_project_column_async(matching_column_name, config)
+            await project.add_item_async(self.client, item, matching_column_name, config)
+
+        elif action == 'move':
+            project = await self.load_project_column_async(matching_column_name, config)
+            await project.move_item_async(self.client, item, matching_column_name, config)
+
+        elif action == 'sort':
+            project = await self.load_project_column_async(matching_column_name, config)
+            await project.columns[matching_column_name].sort_cards_async(self.client, config)
 
     def get_project_item_object(self):
         """Get the issue or pull request full representation from the API"""
@@ -109,24 +113,65 @@ class EventManager(object):
             print("This is not an issue or a pull request.")
             return
 
-    def run(self):
-        item = self.get_project_item_object()
+    async def get_project_item_object_async(self):
+        if 'issue' in self.event:
+            issue_response = await self.client.get_issue(self.project_owner, self.repository_name,
+                                                         self.event['issue']['number'])
+            return Issue(**parse_issue(issue_response['repository']['issue']))
+        elif 'pull_request' in self.event:
+            pr_response = await self.client.get_pull_request(self.project_owner, self.repository_name,
+                                                             self.event['pull_request']['number'])
+            return PullRequest(**parse_pull_request(pr_response['repository']['pullRequest']))
+        else:
+            print("This is not an issue or a pull request.")
+            return
+
+    @staticmethod
+    def is_item_to_manage(item):
         if item is None:
-            return  # In case the event is not for an issue / pull request
+            return False  # In case the event is not for an issue / pull request
         if item.state and item.state.upper() in ('CLOSED', 'MERGED'):
             print(f"The item is {item.state.lower()}, not taking an action.")
+            return False
+
+        return True
+
+    def load_configuration(self, conf_path, item):
+        """Load the configuration, returns it only if the item is in its project or matches its filters"""
+        config = Configuration(conf_path, self.verbose, self.quiet, self.log_path)
+        config.load_properties()
+
+        if (config.project_number in item.get_associated_project() or
+                config.get_label_filter().is_matching(item.label_mask)):
+            return config
+
+        config.logger.debug(f"The issue does not match the filter provided in the configuration "
+                            f"file {conf_path}.")
+        return None
+
+    def run(self):
+        item = self.get_project_item_object()
+        if not self.is_item_to_manage(item):
             return
 
         for conf_path in self.conf_paths:
-            self.config = Configuration(conf_path, self.verbose, self.quiet, self.log_path)
-            self.config.load_properties()
-
-            if (self.config.project_number in item.get_associated_project() or
-                    is_matching_project_item(item.labels, self.config.must_have_labels,
-                                             self.config.cant_have_labels, self.config.filter_labels)):
+            self.config = self.load_configuration(conf_path, item)
+            if self.config:
                 item.set_priority(self.config.priority_list)
                 self.manage_item_in_project(item)
 
-            else:
-                self.config.logger.debug(f"The issue does not match the filter provided in the configuration "
-                                         f"file {conf_path}.")
+    async def run_async(self):
+        """Same as run, where the projects of all the configurations are managed concurrently"""
+        item = await self.get_project_item_object_async()
+        if not self.is_item_to_manage(item):
+            return
+
+        projects_to_manage = []
+        for conf_path in self.conf_paths:
+            config = self.load_configuration(conf_path, item)
+            if config:
+                project_item = copy(item)  # each project sets the priority of the item by its own priority list
+                project_item.set_priority(config.priority_list)
+                projects_to_manage.append(self.manage_item_in_project_async(project_item, config))
+
+        await asyncio.gather(*projects_to_manage)
@@ -1,682 +1,764 @@
+import asyncio
+import json
 import os
-import sys
+import random
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from functools import lru_cache
 
 import requests
+from requests.adapters import HTTPAdapter
 from gql import Client, gql
+from gql.client import AsyncClientSession, SyncClientSession
+from gql.transport.exceptions import TransportQueryError, TransportServerError
 from gql.transport.requests import RequestsHTTPTransport
+from graphql import (build_ast_schema, build_client_schema, get_introspection_query, parse, print_schema,
+                     validate)
+
+from github_automation.common.constants import (ANY_MILESTONE, BASE_URL_ENV_VARIABLE, CACHE_PATH_ENV_VARIABLE,
+                                                SCHEMA_PATH_ENV_VARIABLE)
+from github_automation.management.cassette import wrap_transport
+from github_automation.management.queries import (BATCH_MUTATIONS, QUERY_REGISTRY, get_mutation_alias,
+                                                  get_project_operation, is_idempotent, is_mutation)
+from github_automation.management.response_cache import ResponseCache, get_mutated_project_ids
 
 # Disable insecure warnings
 requests.packages.urllib3.disable_warnings()
 
+BUNDLED_SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'github_schema.graphql')
+DEFAULT_SCHEMA_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'github-automation',
+                                         'github_schema.graphql')
+
+
+def get_schema_cache_path(schema_path=None):
+    return schema_path or os.getenv(SCHEMA_PATH_ENV_VARIABLE) or DEFAULT_SCHEMA_CACHE_PATH
+
+
+def get_response_cache(cache_path=None, cache_ttls=None, base_url='', api_key=None):
+    """Get the response cache in the given path or the one set in the environment, or None if caching is disabled
+
+    The responses are kept apart by the GitHub url and the token of the client which fetched them.
+    """
+    cache_path = cache_path or os.getenv(CACHE_PATH_ENV_VARIABLE)
+    if not cache_path:
+        return None
+
+    return ResponseCache(cache_path, cache_ttls, scope=ResponseCache.get_scope(base_url, api_key))
+
+
+def get_base_url(base_url, default_base_url):
+    """Get the url of the GitHub API to send the requests to, e.g. of GitHub Enterprise or of a fake GitHub"""
+    return (base_url or os.getenv(BASE_URL_ENV_VARIABLE) or default_base_url).rstrip('/')
+
+
+def get_schema_path(schema_path=None):
+    """Get the cached schema if it was refreshed, otherwise the schema snapshot shipped with the package"""
+    cache_path = get_schema_cache_path(schema_path)
+    return cache_path if os.path.isfile(cache_path) else BUNDLED_SCHEMA_PATH
+
+
+@lru_cache(maxsize=None)
+def load_schema(schema_path):
+    with open(schema_path, 'r') as schema_file:
+        return build_ast_schema(parse(schema_file.read()))
+
+
+class GitHubHTTPError(TransportServerError):
+    """An error status GitHub responded with, along with the number of seconds it asked to wait before retrying and
+    the time (in epoch seconds) its rate limit resets at"""
+
+    def __init__(self, status, message, retry_after=None, rate_limit_reset=None):
+        super().__init__(f'{status} {message}')
+        self.status = status
+        self.retry_after = float(retry_after) if retry_after else None
+        self.rate_limit_reset = float(rate_limit_reset) if rate_limit_reset else None
+
+
+def get_error_message(body, reason):
+    try:
+        return json.loads(body)['message']
+    except (ValueError, KeyError, TypeError):
+        return reason
+
+
+class PooledRequestsHTTPTransport(RequestsHTTPTransport):
+    """Requests transport which keeps its connections alive in a pool of the given size"""
+
+    def __init__(self, url, pool_size=10, **kwargs):
+        super().__init__(url, **kwargs)
+        self.pool_size = pool_size
+
+    def connect(self):
+        super().connect()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        for prefix in "http://", "https://":
+            self.session.mount(prefix, adapter)
+
+        self.session.hooks['response'].append(self.raise_for_error_status)
+
+    @staticmethod
+    def raise_for_error_status(response, *args, **kwargs):
+        """Raise the error status with its Retry-After header, which are lost once the transport handles the response"""
+        if response.status_code >= 400:
+            raise GitHubHTTPError(response.status_code, get_error_message(response.text, response.reason),
+                                  response.headers.get('Retry-After'), response.headers.get('X-RateLimit-Reset'))
+
+
+async def raise_for_error_status_async(session, context, params):
+    response = params.response
+    if response.status >= 400:
+        raise GitHubHTTPError(response.status, get_error_message(await response.text(), response.reason),
+                              response.headers.get('Retry-After'), response.headers.get('X-RateLimit-Reset'))
+
+
+class RateLimitExceeded(Exception):
+    """Raised when the GitHub rate limit budget is exhausted for longer than the client is allowed to wait"""
+
+
+class RateLimiter(object):
+    """Paces the requests by the rate limit budget which GitHub returns with the result of every query
+
+    Requests are sent right away while there is plenty of budget, once less than pacing_threshold of the limit is left
+    the remaining budget is spread evenly until it resets. When there is no budget left for another request it waits
+    for the reset, or raises RateLimitExceeded if the reset is more than max_wait seconds away. When the budget is
+    shared by the clients of several processes, shares is their number and each of them paces its requests by its
+    share of the remaining budget.
+    """
+    DEFAULT_MAX_WAIT = 3600
+    DEFAULT_PACING_THRESHOLD = 0.1
+
+    def __init__(self, max_wait=DEFAULT_MAX_WAIT, pacing_threshold=DEFAULT_PACING_THRESHOLD, clock=time.time,
+                 shares=1):
+        self.max_wait = max_wait
+        self.pacing_threshold = pacing_threshold
+        self.shares = shares
+        self.clock = clock
+        self.limit = None
+        self.remaining = None
+        self.reset_at = None
+        self.cost = 1
+        self.next_request_at = 0
+        # the budget is shared by the threads of the client, so its updates are serialized with a lock
+        self.lock = threading.Lock()
+
+    def update(self, rate_limit):
+        if not rate_limit:
+            return
+
+        with self.lock:
+            self._update(rate_limit)
+
+    def _update(self, rate_limit):
+        reset_at = datetime.strptime(rate_limit['resetAt'], '%Y-%m-%dT%H:%M:%SZ').replace(
+            tzinfo=timezone.utc).timestamp()
+        remaining = rate_limit['remaining']
+        if reset_at == self.reset_at and self.remaining is not None:
+            # the results of concurrent requests can arrive out of order, the lowest budget is the latest one
+            remaining = min(remaining, self.remaining)
+
+        self.limit = rate_limit['limit']
+        self.remaining = remaining
+        self.reset_at = reset_at
+        self.cost = max(rate_limit['cost'], 1)
+
+    def reserve(self):
+        """Reserve the budget of the next request, returns the number of seconds to wait before sending it"""
+        with self.lock:
+            return self._reserve()
+
+    def _reserve(self):
+        now = self.clock()
+        send_at = max(now, self.next_request_at)
+        if self.remaining is not None and send_at >= self.reset_at:
+            self.remaining = None  # the budget was reset, it is known again once the next result arrives
+
+        remaining = self.remaining
+        if remaining is not None:
+            if remaining < self.cost:
+                send_at = self.reset_at
+                remaining = None
+            else:
+                if remaining < self.limit * self.pacing_threshold:
+                    send_at += (self.reset_at - send_at) * self.cost * self.shares / remaining
+
+                remaining -= self.cost
+
+        if send_at - now > self.max_wait:
+            raise RateLimitExceeded(f'The GitHub API rate limit is exhausted until '
+                                    f'{datetime.fromtimestamp(self.reset_at, timezone.utc).isoformat()}')
+
+        self.remaining = remaining
+        self.next_request_at = send_at
+        return send_at - now
+
+    def exhaust(self, reset_at=None, retry_after=None):
+        """Mark the budget as exhausted after GitHub rejected a request, the next request waits for the reset
+
+        When no result told the reset time yet, it is taken from the reset time (in epoch seconds) or the number of
+        seconds to wait which the rejected response had in its headers.
+        """
+        with self.lock:
+            now = self.clock()
+            if self.reset_at is None or self.reset_at <= now:
+                if reset_at is None and retry_after is not None:
+                    reset_at = now + retry_after
+
+                if reset_at is None or reset_at <= now:
+                    raise RateLimitExceeded('The GitHub API rate limit is exhausted')
+
+                self.reset_at = reset_at
+
+            self.remaining = 0
+
+
+class RetryPolicy(object):
+    """Decides which failed requests are sent again and how long to wait before every retry
+
+    Bad gateway and timeout responses, dropped connections and GraphQL "something went wrong" timeouts are retried
+    with capped exponential backoff and full jitter. Secondary rate limit responses are retried after the Retry-After
+    header, or after a minute when it is missing. The retries and give-ups of every kind of error are counted.
+    Requests which are not idempotent (e.g. adding cards) are only retried on errors of requests which GitHub did not
+    execute, as the others may have been applied before failing.
+    """
+    DEFAULT_MAX_RETRIES = 5
+    DEFAULT_BASE_DELAY = 1
+    DEFAULT_MAX_DELAY = 60
+    SECONDARY_RATE_LIMIT_DELAY = 60
+    TRANSIENT_STATUSES = (502, 503, 504)
+    NOT_EXECUTED_ERROR_KINDS = ('secondary rate limit',)
+    CONNECTION_ERRORS = (requests.ConnectionError, requests.Timeout, ConnectionError, asyncio.TimeoutError)
+
+    def __init__(self, max_retries=DEFAULT_MAX_RETRIES, base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY,
+                 random_fraction=random.random):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.random_fraction = random_fraction
+        self.metrics = Counter()
+
+    def get_error_kind(self, ex):
+        if isinstance(ex, GitHubHTTPError):
+            if ex.status in self.TRANSIENT_STATUSES:
+                return 'server error'
+            if ex.status == 403 and (ex.retry_after is not None or 'secondary rate limit' in str(ex).lower()):
+                return 'secondary rate limit'
+        elif isinstance(ex, TransportQueryError):
+            if 'something went wrong' in str(ex).lower():
+                return 'query timeout'
+        elif isinstance(ex, self.CONNECTION_ERRORS):
+            return 'connection error'
+
+        return None
+
+    def get_delay(self, ex, attempt, idempotent=True):
+        """Get the number of seconds to wait before retrying the failed request, or None if it should not be retried"""
+        error_kind = self.get_error_kind(ex)
+        if error_kind is None:
+            return None
+
+        if attempt >= self.max_retries or (not idempotent and error_kind not in self.NOT_EXECUTED_ERROR_KINDS):
+            self.metrics[f'{error_kind} give-ups'] += 1
+            return None
+
+        self.metrics[f'{error_kind} retries'] += 1
+        if error_kind == 'secondary rate limit':
+            return ex.retry_after if ex.retry_after is not None else self.SECONDARY_RATE_LIMIT_DELAY
+
+        return self.random_fraction() * min(self.max_delay, self.base_delay * 2 ** attempt)
+
 
 class GraphQLClient(object):
     BASE_URL = 'https://api.github.com'
+    DEFAULT_POOL_SIZE = 10
+    DEFAULT_BATCH_SIZE = 25
 
-    def __init__(self, api_key=None):
+    def __init__(self, api_key=None, schema_path=None, pool_size=DEFAULT_POOL_SIZE, batch_size=DEFAULT_BATCH_SIZE,
+                 max_rate_limit_wait=RateLimiter.DEFAULT_MAX_WAIT, max_retries=RetryPolicy.DEFAULT_MAX_RETRIES,
+                 cache_path=None, cache_ttls=None, record_path=None, replay_path=None, replay_latency=None,
+                 base_url=None, rate_limit_shares=1, validate=True):
         api_key = api_key if api_key else os.getenv("GITHUB_TOKEN")  # TODO: add explanation in readme
-        sample_transport = RequestsHTTPTransport(
-            url=self.BASE_URL + '/graphql',
+        self.base_url = get_base_url(base_url, self.BASE_URL)
+        sample_transport = PooledRequestsHTTPTransport(
+            url=self.base_url + '/graphql',
+            pool_size=pool_size,
             use_json=True,
             headers={
                 'Authorization': f"Bearer {api_key}"
             },
             verify=False
         )
-        self.client = Client(
-            transport=sample_transport,
-            fetch_schema_from_transport=True,
-        )
+        # The schema is loaded from disk to validate the queries without an introspection query on every run,
+        # the registry queries are validated once here instead of on every execution
+        self.schema = self.get_validated_schema(schema_path, validate)
+        self.client = Client(transport=wrap_transport(sample_transport, record_path, replay_path, replay_latency))
+        self.session = None
+        self.session_lock = threading.Lock()
+        self.batch_size = batch_size
+        self.rate_limiter = RateLimiter(max_wait=max_rate_limit_wait, shares=rate_limit_shares)
+        self.retry_policy = RetryPolicy(max_retries=max_retries)
+        self.cache = get_response_cache(cache_path, cache_ttls, self.base_url, api_key)
+
+    @staticmethod
+    def get_validated_schema(schema_path=None, validate=True):
+        """Load the schema and validate the registry queries against it, or None if the queries are not validated
+
+        The queries are not validated when refreshing the schema, as the cached schema may be the invalid one.
+        """
+        if not validate:
+            return None
+
+        schema = load_schema(get_schema_path(schema_path))
+        QUERY_REGISTRY.validate(schema)
+        return schema
+
+    def mutation_batcher(self):
+        return MutationBatcher(self, self.batch_size)
+
+    def connect(self):
+        """Open the transport once, so all the queries reuse its session and kept-alive connections"""
+        with self.session_lock:
+            if self.session is None:
+                self.client.transport.connect()
+                self.session = SyncClientSession(client=self.client)
+
+        return self.session
+
+    def close(self):
+        if self.session is not None:
+            self.client.transport.close()
+            self.session = None
+
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def refresh_schema(self, schema_path=None):
+        """Fetch the full schema from GitHub using introspection and store it in the on-disk schema cache"""
+        return self.store_schema(self.execute_query(get_introspection_query()), schema_path)
+
+    def store_schema(self, introspection, schema_path=None):
+        schema_path = get_schema_cache_path(schema_path)
+        schema_dir = os.path.dirname(schema_path)
+        if schema_dir:
+            os.makedirs(schema_dir, exist_ok=True)
+
+        with open(schema_path, 'w') as schema_file:
+            schema_file.write(f'# Introspected from {self.base_url}/graphql on {datetime.utcnow().isoformat()}\n')
+            schema_file.write(print_schema(build_client_schema(introspection)))
+
+        load_schema.cache_clear()
+        return schema_path
+
+    def get_document(self, query):
+        if isinstance(query, str):  # queries which are not in the registry are parsed and validated on every call
+            query = gql(query)
+            validation_errors = validate(self.schema, query) if self.schema is not None else []
+            if validation_errors:
+                raise validation_errors[0]
+
+        return query
+
+    def get_retry_delay(self, ex, attempt, idempotent=True):
+        """Get the number of seconds to wait before sending a failed request again, or None if it is not retried"""
+        if 'API rate limit exceeded' in str(ex):
+            self.rate_limiter.exhaust(getattr(ex, 'rate_limit_reset', None), getattr(ex, 'retry_after', None))
+            return 0
+
+        return self.retry_policy.get_delay(ex, attempt, idempotent)
+
+    def invalidate_cache(self, query, response=None):
+        """Drop the cached responses of the projects changed by a mutation, the ones of all the projects if the
+        mutation failed or its projects are unknown"""
+        if self.cache is not None and is_mutation(query):
+            self.cache.invalidate(get_mutated_project_ids(response))
 
     def execute_query(self, query, variable_values=None):
-        gql_query = gql(query)
+        query = self.get_document(query)
+        idempotent = is_idempotent(query)
+        attempt = 0
+        response = None
         try:
-            response = self.client.execute(gql_query, variable_values=variable_values)
-            return response
-        except Exception as ex:
-            if 'API rate limit exceeded' in str(ex):
-                print("API rate limit exceeded")
-                sys.exit(0)
+            while True:
+                time.sleep(self.rate_limiter.reserve())
+                try:
+                    response = self.connect().execute(query, variable_values=variable_values)
+                except Exception as ex:
+                    delay = self.get_retry_delay(ex, attempt, idempotent)
+                    if delay is None:
+                        raise
 
-            raise
+                    attempt += 1
+                    time.sleep(delay)
+                    continue
+
+                self.rate_limiter.update(response.pop('rateLimit', None))
+                return response
+        finally:
+            # also when the mutation failed, as some of the mutations of a batch may have been applied
+            self.invalidate_cache(query, response)
+
+    def execute_operation(self, operation, variable_values=None, fields=None):
+        if self.cache is not None:
+            response = self.cache.get(operation, variable_values, fields)
+            if response is not None:
+                return response
 
-    def get_github_issues(self, owner, name, after, labels, milestone):
+        response = self.execute_query(QUERY_REGISTRY.get(operation, fields), variable_values)
+        if self.cache is not None:
+            self.cache.set(operation, variable_values, response, fields)
+
+        return response
+
+    def get_github_issues(self, owner, name, after, labels, milestone, fields=None):
+        """The milestone is a milestone number, none or * - the milestone filter of GitHub takes a database id for
+        the numbers, so they (and none) are sent as the milestoneNumber filter"""
         vars = {"owner": owner, "name": name, "labels": labels, "milestone": milestone, "after": after}
         if not milestone:
             del vars['milestone']
+        elif milestone != ANY_MILESTONE:
+            vars['milestoneNumber'] = vars.pop('milestone')
         if not after:
             del vars['after']
         if not labels:
             del vars['labels']
-            return self.execute_query('''
-                    query ($after: String, $owner: String!, $name: String!, $milestone: String){
-                      repository(owner: $owner, name: $name) {
-                        issues(first: 100, after:$after, states: OPEN, filterBy:{milestone: $milestone}) {
-                          pageInfo {
-                            hasNextPage
-                            endCursor
-                          }
-                          edges {
-                            cursor
-                            node {
-                            projectCards(first:5){
-                            nodes{
-                              id
-                              column {
-                                name
-                              }
-                              project{
-                                number
-                                }
-                              }
-                            }
-                              timelineItems(first:10, itemTypes:[CROSS_REFERENCED_EVENT]){
-                                __typename
-                                ... on IssueTimelineItemsConnection{
-                                  nodes {
-                                    ... on CrossReferencedEvent {
-                                      willCloseTarget
-                                      source {
-                                        __typename
-                                        ... on PullRequest {
-                                          id
-                                          title
-                                          state
-                                          isDraft
-                                          assignees(first:10){
-                                            nodes{
-                                              login
-                                            }
-                                          }
-                                          labels(first:5){
-                                            nodes{
-                                              name
-                                            }
-                                          }
-                                          reviewRequests(first:1){
-                                            totalCount
-                                          }
-                                          reviews(first:1){
-                                            totalCount
-                                          }
-                                          number
-                                          reviewDecision
-                                        }
-                                      }
-                                    }
-                                  }
-                                }
-                              }
-                              title
-                              id
-                              number
-                              state
-                              milestone {
-                                title
-                              }
-                              labels(first: 10) {
-                                edges {
-                                  node {
-                                    name
-                                  }
-                                }
-                              }
-                              assignees(last: 10) {
-                                edges {
-                                  node {
-                                    id
-                                    login
-                                  }
-                                }
-                              }
-                            }
-                          }
-                        }
-                      }
-                    }''', vars)
-        return self.execute_query('''
-        query ($after: String, $owner: String!, $name: String!, $labels: [String!], $milestone: String){
-          repository(owner: $owner, name: $name) {
-            issues(first: 100, after:$after, states: OPEN, filterBy:{labels: $labels, milestone: $milestone}) {
-              pageInfo {
-                hasNextPage
-                endCursor
-              }
-              edges {
-                cursor
-                node {
-                    projectCards(first:5){
-                    nodes{
-                      id
-                      column {
-                        name
-                      }
-                      project{
-                        number
-                      }
-                    }
-                  }
-                  timelineItems(first:10, itemTypes:[CROSS_REFERENCED_EVENT]){
-                    __typename
-                    ... on IssueTimelineItemsConnection{
-                      nodes {
-                        ... on CrossReferencedEvent {
-                          willCloseTarget
-                          source {
-                            __typename
-                            ... on PullRequest {
-                              id
-                              title
-                              state
-                              isDraft
-                              assignees(first:10){
-                                nodes{
-                                  login
-                                }
-                              }
-                              labels(first:5){
-                                nodes{
-                                  name
-                                }
-                              }
-                              reviewRequests(first:1){
-                                totalCount
-                              }
-                              reviews(first:1){
-                                totalCount
-                              }
-                              number
-                              reviewDecision
-                            }
-                          }
-                        }
-                      }
-                    }
-                  }
-                  title
-                  id
-                  number
-                  milestone {
-                    title
-                  }
-                  labels(first: 10) {
-                    edges {
-                      node {
-                        name
-                      }
-                    }
-                  }
-                  assignees(last: 10) {
-                    edges {
-                      node {
-                        id
-                        login
-                      }
-                    }
-                  }
-                }
-              }
-            }
-          }
-        }''', vars)
-
-    def get_github_pull_requests(self, owner, name, after):
+            return self.execute_operation('issues', vars, fields)
+        return self.execute_operation('issues_with_labels', vars, fields)
+
+    def get_github_pull_requests(self, owner, name, after, fields=None):
         vars = {"owner": owner, "name": name, "after": after}
         if not after:
             del vars['after']
-        return self.execute_query('''
-                query ($after: String, $owner: String!, $name: String!) {
-                  repository(owner: $owner, name: $name) {
-                    pullRequests(first: 100, after:$after, states: OPEN) {
-                      pageInfo {
-                        endCursor
-                        hasNextPage
-                      }
-                      edges {
-                        cursor
-                        node {
-                          title
-                          id
-                          state
-                          number
-                          mergedAt
-                          merged
-                          reviewDecision
-                          reviews(last: 10) {
-                            totalCount
-                          }
-                          reviewRequests(first: 10) {
-                            totalCount
-                          }
-                          labels(first: 10) {
-                            edges {
-                              node {
-                                name
-                              }
-                            }
-                          }
-                          assignees(last: 10) {
-                            edges {
-                              node {
-                                id
-                                login
-                              }
-                            }
-                          }
-                          projectCards(first: 5) {
-                            nodes {
-                              id
-                              column {
-                                name
-                              }
-                              project {
-                                number
-                              }
-                            }
-                          }
-                        }
-                      }
-                    }
-                  }
-                }
-                ''', vars)
+        return self.execute_operation('pull_requests', vars, fields)
+
+    def search_issues(self, search_query, after=None, fields=None):
+        return self.execute_operation('search_issues', {'searchQuery': search_query, 'after': after}, fields)
+
+    def search_pull_requests(self, search_query, after=None, fields=None):
+        return self.execute_operation('search_pull_requests', {'searchQuery': search_query, 'after': after}, fields)
 
     def add_items_to_project(self, issue_id, column_id):
-        return self.execute_query('''
-        mutation addProjectCardAction($contentID: ID!, $columnId: ID!){
-          addProjectCard(input: {contentId: $contentID, projectColumnId: $columnId}) {
-            cardEdge{
-              node{
-                id
-              }
-            }
-          }
-        }''', {'contentID': issue_id, 'columnId': column_id})
+        return self.execute_operation('add_project_card', {'contentID': issue_id, 'columnId': column_id})
 
     def add_to_column(self, card_id, column_id):
         variable_dict = {'cardId': card_id, 'columnId': column_id}
 
-        self.execute_query('''
-        mutation moveProjectCardAction($cardId: ID!, $columnId: ID!){
-          moveProjectCard(input: {cardId: $cardId, columnId: $columnId}) {
-            cardEdge{
-              node{
-                id
-              }
-            }
-          }
-        }''', variable_dict)
+        return self.execute_operation('move_project_card', variable_dict)
 
     def move_to_specific_place_in_column(self, card_id, column_id, after_card_id):
         variable_dict = {'cardId': card_id, 'columnId': column_id, 'afterCardId': after_card_id}
 
-        self.execute_query('''
-        mutation moveProjectCardAction($cardId: ID!, $columnId: ID!, $afterCardId: ID!){
-          moveProjectCard(input: {cardId: $cardId, columnId: $columnId, afterCardId: $afterCardId}) {
-            cardEdge{
-              node{
-                id
-              }
-            }
-          }
-        }''', variable_dict)
+        return self.execute_operation('move_project_card_after_card', variable_dict)
 
     def delete_project_card(self, card_id):
-        return self.execute_query('''
-        mutation deleteProjectCardAction($cardId: ID!){
-          deleteProjectCard(input: {cardId: $cardId}) {
-            deletedCardId
-          }
-        }''', {'cardId': card_id})
+        return self.execute_operation('delete_project_card', {'cardId': card_id})
 
     def get_project_layout(self, owner, repository_name, project_number, is_org_project=False):
         query_args = {"owner": owner, "name": repository_name, "number": project_number}
-        query = '''
-        project(number: $number) {
-          name
-          id
-          number
-          columns(first: 15) {
-            edges{
-              cursor
-              node {
-                name
-              }
-            }
-          }
-        }
-      }
-    }'''
         if is_org_project:
-            # replace repository query with org query and remove name for args
-            query_prefix = '''query ($owner: String!, $number: Int!) {
-            organization(login: $owner) {\n'''
+            # the org query has no repository name argument
             del query_args['name']
-        else:
-            query_prefix = '''query ($owner: String!, $name: String!, $number: Int!){
-            repository(owner: $owner, name: $name) {\n'''
-        query = query_prefix + query
-        return self.execute_query(query, query_args)
-
-    def get_issue(self, owner, name, issue_number):
-        return self.execute_query('''
-        query ($owner: String!, $name: String!, $issueNumber: Int!){
-  repository(owner: $owner, name: $name) {
-    issue(number: $issueNumber) {
-      projectCards(first:5){
-        nodes{
-          id
-          column {
-            name
-          }
-          project{
-            number
-          }
-        }
-      }
-      timelineItems(first: 5, itemTypes: [CROSS_REFERENCED_EVENT]) {
-        __typename
-        ... on IssueTimelineItemsConnection {
-          nodes {
-            ... on CrossReferencedEvent {
-              willCloseTarget
-              source {
-                __typename
-                ... on PullRequest {
-                  id
-                  title
-                  state
-                  isDraft
-                  assignees(first: 5) {
-                    nodes {
-                      login
-                    }
-                  }
-                  labels(first:5){
-                    nodes{
-                      name
-                    }
-                  }
-                  reviewRequests(first:1){
-                    totalCount
-                  }
-                  reviews(first:1){
-                    totalCount
-                  }
-                  number
-                  reviewDecision
-                }
-              }
-            }
-          }
-        }
-      }
-      title
-      id
-      number
-      state
-      milestone {
-        title
-      }
-      labels(last: 10) {
-        edges {
-          node {
-            name
-          }
-        }
-      }
-      assignees(last: 10) {
-        edges {
-          node {
-            id
-            login
-          }
-        }
-      }
-    }
-  }
-}
-''', {"owner": owner, "name": name, "issueNumber": issue_number})
-
-    def get_pull_request(self, owner, name, pull_request_number):
-        return self.execute_query('''
-query ($owner: String!, $name: String!, $prNumber: Int!) {
-  repository(owner: $owner, name: $name) {
-    pullRequest(number: $prNumber) {
-      projectCards(first: 5) {
-        nodes {
-          id
-          column {
-            name
-          }
-          project {
-            number
-          }
-        }
-      }
-      title
-      id
-      number
-      state
-      mergedAt
-      merged
-      reviewDecision
-      reviews(last: 10) {
-        totalCount
-      }
-      reviewRequests(first: 10) {
-        totalCount
-      }
-      labels(last: 10) {
-        edges {
-          node {
-            name
-          }
-        }
-      }
-      assignees(last: 10) {
-        edges {
-          node {
-            id
-            login
-          }
-        }
-      }
-    }
-  }
-}
-''', {"owner": owner, "name": name, "prNumber": pull_request_number})
+
+        return self.execute_operation(get_project_operation('project_layout', is_org_project), query_args)
+
+    def get_issue(self, owner, name, issue_number, fields=None):
+        return self.execute_operation('issue', {"owner": owner, "name": name, "issueNumber": issue_number}, fields)
+
+    def get_milestone(self, owner, name, milestone_number):
+        return self.execute_operation('milestone', {'owner': owner, 'name': name, 'number': milestone_number})
+
+    def get_pull_request(self, owner, name, pull_request_number, fields=None):
+        return self.execute_operation('pull_request', {"owner": owner, "name": name, "prNumber": pull_request_number},
+                                      fields)
 
     def get_column_items(self, owner, name, project_number, prev_column_id, start_cards_cursor='',
-                         is_org_project=False):
+                         is_org_project=False, fields=None):
         query_args = {"owner": owner, "name": name, "projectNumber": project_number, "prevColumnID": prev_column_id,
                       "start_cards_cursor": start_cards_cursor}
-        query = '''
-    project(number: $projectNumber) {
-      name
-      id
-      number
-      columns(after: $prevColumnID, first: 1) {
-        nodes {
-          name
-          id
-          cards(first: 100, after: $start_cards_cursor) {
-            pageInfo {
-              endCursor
-              hasNextPage
-            }
-            edges {
-              cursor
-              node {
-                note
-                state
-                id
-                content {
-                  __typename
-                  ... on Issue {
-                    id
-                    number
-                    title
-                    labels(first: 10) {
-                      edges {
-                        node {
-                          name
-                        }
-                      }
-                    }
-                    assignees(first: 10) {
-                      edges {
-                        node {
-                          login
-                        }
-                      }
-                    }
-                  }
-                  ... on PullRequest {
-                    id
-                    number
-                    title
-                    labels(first: 10) {
-                      edges {
-                        node {
-                          name
-                        }
-                      }
-                    }
-                    reviewDecision
-                    reviews(last: 10) {
-                      totalCount
-                    }
-                    reviewRequests(first: 10) {
-                      totalCount
-                    }
-                    assignees(first: 10) {
-                      edges {
-                        node {
-                          login
-                        }
-                      }
-                    }
-                  }
-                }
-              }
-            }
-          }
-        }
-      }
-    }
-  }
-}
-'''
         if is_org_project:
-            # replace repository query with org query and remove name for args
-            query_prefix = '''query ($owner: String!, $projectNumber: Int!, $prevColumnID: String!, $start_cards_cursor: String) {
-            organization(login: $owner) {\n'''
+            # the org query has no repository name argument
             del query_args['name']
-        else:
-            query_prefix = '''query ($owner: String!, $name: String!, $projectNumber: Int!, $prevColumnID: String!, $start_cards_cursor: String) {
-            repository(owner: $owner, name: $name) {\n'''
-        query = query_prefix + query
-        return self.execute_query(query, query_args)
 
-    def get_first_column_items(self, owner, name, project_number, start_cards_cursor='', is_org_project=False):
+        return self.execute_operation(get_project_operation('column_items', is_org_project), query_args, fields)
+
+    def get_first_column_items(self, owner, name, project_number, start_cards_cursor='', is_org_project=False,
+                               fields=None):
         query_args = {"owner": owner, "name": name, "projectNumber": project_number,
                       "start_cards_cursor": start_cards_cursor}
-        query = '''
-        project(number: $projectNumber) {
-          name
-          id
-          number
-          columns(first: 1) {
-            nodes {
-              name
-              id
-              cards(first: 100, after: $start_cards_cursor) {
-                pageInfo {
-                  endCursor
-                  hasNextPage
-                }
-                edges {
-                  cursor
-                  node {
-                    note
-                    state
-                    id
-                    content {
-                      __typename
-                      ... on Issue {
-                        id
-                        number
-                        title
-                        labels(first: 10) {
-                          edges {
-                            node {
-                              name
-                            }
-                          }
-                        }
-                        assignees(first: 10) {
-                          edges {
-                            node {
-                              login
-                            }
-                          }
-                        }
-                      }
-                      ... on PullRequest {
-                        title
-                        id
-                        state
-                        number
-                        mergedAt
-                        merged
-                        reviewDecision
-                        reviews(last: 10) {
-                          totalCount
-                        }
-                        reviewRequests(first: 10) {
-                          totalCount
-                        }
-                        labels(first: 10) {
-                          edges {
-                            node {
-                              name
-                            }
-                          }
-                        }
-                        assignees(first: 10) {
-                          edges {
-                            node {
-                              login
-                            }
-                          }
-                        }
-                      }
-                    }
-                  }
-                }
-              }
-            }
-          }
-        }
-      }
-    }
-    '''
         if is_org_project:
-            # replace repository query with org query and remove name for args
-            query_prefix = '''query ($owner: String!, $projectNumber: Int!, $start_cards_cursor: String) {
-            organization(login: $owner) {\n'''
+            # the org query has no repository name argument
             del query_args['name']
-        else:
-            query_prefix = '''query ($owner: String!, $name: String!, $projectNumber: Int!, $start_cards_cursor: String) {
-            repository(owner: $owner, name: $name) {\n'''
-        query = query_prefix + query
-        return self.execute_query(query, query_args)
+
+        return self.execute_operation(get_project_operation('first_column_items', is_org_project), query_args,
+                                      fields)
+
+    def get_board_items(self, owner, name, project_number, is_org_project=False, fields=None):
+        query_args = {"owner": owner, "name": name, "projectNumber": project_number}
+        if is_org_project:
+            del query_args['name']
+
+        return self.execute_operation(get_project_operation('board_items', is_org_project), query_args, fields)
 
     def un_archive_card(self, card_id):
-        return self.execute_query(''' mutation ($card_id: ID!, $isArchived: Boolean){
-        updateProjectCard(input: {projectCardId: $card_id, isArchived: $isArchived}) {
-          projectCard {
-            isArchived
-          }
-        }
-      }''', {'card_id': card_id, "isArchived": False})
+        return self.execute_operation('un_archive_project_card', {'card_id': card_id, "isArchived": False})
+
+
+class MutationBatcher(object):
+    """Collects card mutations and sends them as aliased mutations of a single request, batch_size at a time
+
+    GitHub executes the mutations of a request one after the other, so the mutations are applied in the order they
+    were added. on_success is called with the result of the mutation (the same as the result of the matching
+    GraphQLClient method) and on_error with the error message of the mutation once it was sent.
+    The batcher can be used as a context manager which sends the pending mutations when the outermost block exits.
+    """
+
+    def __init__(self, client, batch_size=GraphQLClient.DEFAULT_BATCH_SIZE):
+        self.client = client
+        self.batch_size = batch_size
+        self.pending_mutations = []
+        self.depth = 0
+
+    def __enter__(self):
+        self.depth += 1
+        return self
+
+    def __exit__(self, *args):
+        self.depth -= 1
+        if self.depth == 0:
+            self.flush()
+
+    def add_items_to_project(self, issue_id, column_id, on_success=None, on_error=None):
+        self.add('add_project_card', {'contentId': issue_id, 'projectColumnId': column_id}, on_success, on_error)
+
+    def add_to_column(self, card_id, column_id, on_success=None, on_error=None):
+        self.add('move_project_card', {'cardId': card_id, 'columnId': column_id}, on_success, on_error)
+
+    def move_to_specific_place_in_column(self, card_id, column_id, after_card_id, on_success=None, on_error=None):
+        self.add('move_project_card', {'cardId': card_id, 'columnId': column_id, 'afterCardId': after_card_id},
+                 on_success, on_error)
+
+    def delete_project_card(self, card_id, on_success=None, on_error=None):
+        self.add('delete_project_card', {'cardId': card_id}, on_success, on_error)
+
+    def add(self, mutation, mutation_input, on_success=None, on_error=None):
+        self.pending_mutations.append((mutation, mutation_input, on_success, on_error))
+        if len(self.pending_mutations) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Send the pending mutations, returns the error message of every sent mutation or None if it succeeded"""
+        errors = []
+        while self.pending_mutations:
+            batch = self.pending_mutations[:self.batch_size]
+            del self.pending_mutations[:self.batch_size]
+            try:
+                errors.extend(self.send_batch(batch))
+            except RateLimitExceeded:
+                self.pending_mutations.clear()  # none of the rest can be sent either
+                raise
+
+        return errors
+
+    def send_batch(self, batch):
+        document = QUERY_REGISTRY.get_batch_mutation([mutation for mutation, _, _, _ in batch])
+        variables = {f'input{index}': mutation_input for index, (_, mutation_input, _, _) in enumerate(batch)}
+        alias_to_error = {}
+        try:
+            response = self.client.execute_query(document, variables)
+        except TransportQueryError as ex:
+            # The errors of specific mutations have their alias as the first element of the path
+            response = ex.data or {}
+            for error in ex.errors or []:
+                path = error.get('path') if isinstance(error, dict) else None
+                alias = path[0] if path else None
+                message = error.get('message', str(error)) if isinstance(error, dict) else str(error)
+                alias_to_error.setdefault(alias, message)
+        except RateLimitExceeded:
+            raise
+        except Exception as ex:
+            response = {}
+            alias_to_error[None] = str(ex)
+
+        errors = []
+        for index, (mutation, _, on_success, on_error) in enumerate(batch):
+            alias = get_mutation_alias(index)
+            result = response.get(alias)
+            error = alias_to_error.get(alias)
+            if result is None and error is None:
+                error = alias_to_error.get(None, 'No result was returned for the mutation')
+
+            errors.append(self.report_result({BATCH_MUTATIONS[mutation][0]: result}, error, on_success, on_error))
+
+        return errors
+
+    @staticmethod
+    def report_result(result, error, on_success, on_error):
+        if error is None and on_success:
+            try:
+                on_success(result)
+            except RateLimitExceeded:
+                raise
+            except Exception as ex:
+                error = str(ex)
+
+        if error is not None and on_error:
+            on_error(error)
+
+        return error
+
+
+class ImmediateMutations(MutationBatcher):
+    """Sends every mutation on its own when it is added, for clients which do not support batching"""
+
+    def add_items_to_project(self, issue_id, column_id, on_success=None, on_error=None):
+        self.execute(lambda: self.client.add_items_to_project(issue_id, column_id), on_success, on_error)
+
+    def add_to_column(self, card_id, column_id, on_success=None, on_error=None):
+        self.execute(lambda: self.client.add_to_column(card_id=card_id, column_id=column_id), on_success, on_error)
+
+    def move_to_specific_place_in_column(self, card_id, column_id, after_card_id, on_success=None, on_error=None):
+        self.execute(lambda: self.client.move_to_specific_place_in_column(card_id=card_id,
+                                                                          column_id=column_id,
+                                                                          after_card_id=after_card_id),
+                     on_success, on_error)
+
+    def delete_project_card(self, card_id, on_success=None, on_error=None):
+        self.execute(lambda: self.client.delete_project_card(card_id), on_success, on_error)
+
+    def execute(self, send_mutation, on_success, on_error):
+        try:
+            result = send_mutation()
+        except RateLimitExceeded:
+            raise
+        except Exception as ex:
+            self.report_result(None, str(ex), on_success, on_error)
+            return
+
+        self.report_result(result, None, on_success, on_error)
+
+
+class AsyncGraphQLClient(GraphQLClient):
+    """A GraphQLClient on an aiohttp transport, its query methods return coroutines so many requests can be in flight
+
+    Up to pool_size requests are sent concurrently, the rest wait for a free slot.
+    """
+
+    def __init__(self, api_key=None, schema_path=None, pool_size=GraphQLClient.DEFAULT_POOL_SIZE,
+                 max_rate_limit_wait=RateLimiter.DEFAULT_MAX_WAIT, max_retries=RetryPolicy.DEFAULT_MAX_RETRIES,
+                 cache_path=None, cache_ttls=None, record_path=None, replay_path=None, replay_latency=None,
+                 base_url=None, rate_limit_shares=1, validate=True):
+        # aiohttp is only required when using the async client
+        from aiohttp import TraceConfig
+        from gql.transport.aiohttp import AIOHTTPTransport
+
+        api_key = api_key if api_key else os.getenv("GITHUB_TOKEN")
+        self.base_url = get_base_url(base_url, self.BASE_URL)
+        trace_config = TraceConfig()
+        trace_config.on_request_end.append(raise_for_error_status_async)
+        transport = AIOHTTPTransport(
+            url=self.base_url + '/graphql',
+            headers={
+                'Authorization': f"Bearer {api_key}"
+            },
+            ssl=False,
+            client_session_args={'trace_configs': [trace_config]}
+        )
+        self.schema = self.get_validated_schema(schema_path, validate)
+        self.client = Client(transport=wrap_transport(transport, record_path, replay_path, replay_latency))
+        self.session = None
+        self.pool_size = pool_size
+        self.semaphore = None
+        self.rate_limiter = RateLimiter(max_wait=max_rate_limit_wait, shares=rate_limit_shares)
+        self.retry_policy = RetryPolicy(max_retries=max_retries)
+        self.cache = get_response_cache(cache_path, cache_ttls, self.base_url, api_key)
+
+    async def connect(self):
+        if self.session is None:
+            # Created here as asyncio primitives are bound to the running event loop
+            self.semaphore = asyncio.Semaphore(self.pool_size)
+            self.session = AsyncClientSession(client=self.client)
+            await self.client.transport.connect()
+
+        return self.session
+
+    async def close(self):
+        if self.session is not None:
+            self.session = None
+            await self.client.transport.close()
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def refresh_schema(self, schema_path=None):
+        return self.store_schema(await self.execute_query(get_introspection_query()), schema_path)
+
+    async def execute_query(self, query, variable_values=None):
+        query = self.get_document(query)
+        idempotent = is_idempotent(query)
+        session = await self.connect()
+        attempt = 0
+        response = None
+        try:
+            while True:
+                await asyncio.sleep(self.rate_limiter.reserve())
+                try:
+                    async with self.semaphore:
+                        response = await session.execute(query, variable_values=variable_values)
+                except Exception as ex:
+                    delay = self.get_retry_delay(ex, attempt, idempotent)
+                    if delay is None:
+                        raise
+
+                    attempt += 1
+                    await asyncio.sleep(delay)
+                    continue
+
+                self.rate_limiter.update(response.pop('rateLimit', None))
+                return response
+        finally:
+            self.invalidate_cache(query, response)
+
+    async def execute_operation(self, operation, variable_values=None, fields=None):
+        if self.cache is not None:
+            response = self.cache.get(operation, variable_values, fields)
+            if response is not None:
+                return response
+
+        response = await self.execute_query(QUERY_REGISTRY.get(operation, fields), variable_values)
+        if self.cache is not None:
+            self.cache.set(operation, variable_values, response, fields)
+
+        return response
+
+
+def get_mutation_batcher(client):
+    """Get a batcher for the card mutations of the client, or the client itself if it is already a batcher"""
+    if isinstance(client, MutationBatcher):
+        return client
+
+    if isinstance(client, GraphQLClient) and not isinstance(client, AsyncGraphQLClient):
+        return client.mutation_batcher()
+
+    return ImmediateMutations(client)
+
+
+_shared_clients = {}
+
+
+def get_shared_client(api_key=None, **kwargs):
+    """Get the client of the process for the given token and client arguments, so all the boards of a run share one
+    connection pool"""
+    api_key = api_key if api_key else os.getenv("GITHUB_TOKEN")
+    key = (api_key, json.dumps(kwargs, sort_keys=True, default=str))
+    if key not in _shared_clients:
+        _shared_clients[key] = GraphQLClient(api_key, **kwargs)
+
+    return _shared_clients[key]
@@ -1,35 +1,179 @@
 from __future__ import absolute_import
 
-from github_automation.common.utils import (get_column_items_with_prev_column,
-                                            get_first_column_items,
-                                            is_matching_project_item, get_labels,
-                                            get_project_from_response)
+import asyncio
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from github_automation.common.constants import SEARCH_RESULTS_LIMIT
+from github_automation.common.utils import (LABEL_INTERNER, get_labels, get_milestone_title, get_search_connection,
+                                            get_search_query, iter_pages, iter_pages_async)
 from github_automation.core.project_item.issue import Issue, parse_issue
 from github_automation.core.project_item.pull_request import PullRequest, parse_pull_request
-from github_automation.core.project.project import Project, parse_project
+from github_automation.core.project.project import load_project, load_project_async
 from github_automation.management.configuration import Configuration
-from github_automation.management.github_client import GraphQLClient
+from github_automation.management.github_client import get_shared_client
+
+
+def get_issues_connection(response):
+    return response.get('repository', {}).get('issues', {})
+
+
+def get_pull_requests_connection(response):
+    return response.get('repository', {}).get('pullRequests', {})
+
+
+class RepositoryItems(object):
+    """The open issues and pull requests of a repository, fetched once for all the boards which manage it
+
+    The issues are fetched with the union of the label filters of the boards, and the items with the union of the
+    fields their column rules use. Every page is parsed once it is fetched and dropped, the parsed items are kept
+    with their label masks and every board filters them by its own labels and builds its own items from them.
+    """
+
+    def __init__(self, client, configurations, prefetch_pages=False):
+        self.client = client
+        self.owner = configurations[0].project_owner
+        self.name = configurations[0].repository_name
+        self.milestone = configurations[0].filter_milestone
+        self.labels = sorted({label for configuration in configurations for label in configuration.filter_labels})
+        self.fields = frozenset().union(*[configuration.get_query_fields() for configuration in configurations])
+        self.prefetch_pages = prefetch_pages
+        self.locks = {'issues': threading.Lock(), 'pull_requests': threading.Lock()}
+        self.items = {}
+        self.item_tasks = {}
+
+    def get_issue_page(self, after):
+        return self.client.get_github_issues(owner=self.owner, name=self.name, after=after, labels=self.labels,
+                                             milestone=self.milestone, fields=self.fields)
+
+    def get_pull_request_page(self, after):
+        return self.client.get_github_pull_requests(owner=self.owner, name=self.name, after=after,
+                                                    fields=self.fields)
+
+    def iter_issues(self, paginate=iter_pages):
+        return self.iter_items('issues', paginate, self.get_issue_page, get_issues_connection, parse_issue)
+
+    def iter_pull_requests(self, paginate=iter_pages):
+        return self.iter_items('pull_requests', paginate, self.get_pull_request_page, get_pull_requests_connection,
+                               parse_pull_request)
+
+    @staticmethod
+    def parse_page(page, parse):
+        """Get the label mask and the parsed fields of every item of a page"""
+        parsed_items = []
+        for edge in page.get('edges', []):
+            parsed_item = parse(edge['node'])
+            parsed_items.append((LABEL_INTERNER.get_mask(parsed_item['labels']), parsed_item))
+
+        return parsed_items
+
+    def iter_items(self, kind, paginate, get_page, get_connection, parse):
+        """Iterate over the label masks and the parsed fields of the items of the kind, which are fetched by the
+        first call using paginate (iter_pages for a sync client or iter_pages_async for an async one)"""
+        if paginate is iter_pages_async:
+            return self.iter_items_async(kind, get_page, get_connection, parse)
+
+        with self.locks[kind]:  # the boards load their issues and pull requests on separate threads
+            if kind not in self.items:
+                self.items[kind] = [parsed_item
+                                    for page in paginate(get_page, get_connection, prefetch=self.prefetch_pages)
+                                    for parsed_item in self.parse_page(page, parse)]
+
+        return iter(self.items[kind])
+
+    async def iter_items_async(self, kind, get_page, get_connection, parse):
+        async def fetch_items():
+            return [parsed_item
+                    async for page in iter_pages_async(get_page, get_connection, prefetch=self.prefetch_pages)
+                    for parsed_item in self.parse_page(page, parse)]
+
+        if kind not in self.item_tasks:
+            self.item_tasks[kind] = asyncio.ensure_future(fetch_items())
+
+        for parsed_item in await self.item_tasks[kind]:
+            yield parsed_item
+
+
+def get_shared_repository_items(client, configurations, prefetch_pages=False):
+    """Get the RepositoryItems of every configuration which lists the items of a repository with other configurations
+
+    The configurations are grouped by their repository and milestone filter, the ones which search for their items
+    (fetch_mode = search) already get only their own items and are not grouped.
+    """
+    repository_configurations = defaultdict(list)
+    for configuration in configurations:
+        if configuration.fetch_mode == 'list':
+            repository_configurations[(configuration.project_owner, configuration.repository_name,
+                                       configuration.filter_milestone)].append(configuration)
+
+    shared_items = {}
+    for group in repository_configurations.values():
+        if len(group) > 1:
+            repository_items = RepositoryItems(client, group, prefetch_pages)
+            shared_items.update((configuration, repository_items) for configuration in group)
+
+    return shared_items
 
 
 class ProjectManager(object):
 
-    def __init__(self, configuration: Configuration, client=None, api_key=None):
+    def __init__(self, configuration: Configuration, client=None, api_key=None, load=True, prefetch_pages=False,
+                 repository_items: RepositoryItems = None):
         self.config = configuration
-        self.client = client if client else GraphQLClient(api_key)
+        self.client = client if client else get_shared_client(api_key)
+        self.prefetch_pages = prefetch_pages
+        self.repository_items = repository_items
+
+        self.project = None
+        self.matching_issues = {}
+        self.matching_pull_requests = {}
+        if load:
+            self.load()
+
+    def log_load_time(self, name, started_at):
+        self.config.logger.info(f'Loaded the {name} in {time.perf_counter() - started_at:.2f} seconds')
+
+    def load(self):
+        """Load the board, the issues and the pull requests concurrently on threads which share the client
+
+        They are independent until the board is managed, so loading takes about as long as the slowest of them, an
+        error in any of them is raised once all of them are done.
+        """
+        def timed_load(name, load):
+            started_at = time.perf_counter()
+            result = load()
+            self.log_load_time(name, started_at)
+            return result
 
-        self.project = self.get_github_project()
-        self.matching_issues = self.get_github_issues()
-        self.matching_pull_requests = self.get_github_pull_requests()
+        loaders = {'board': self.get_github_project, 'issues': self.get_github_issues,
+                   'pull requests': self.get_github_pull_requests}
+        with ThreadPoolExecutor(max_workers=len(loaders)) as executor:
+            futures = [executor.submit(timed_load, name, load) for name, load in loaders.items()]
+
+        self.project, self.matching_issues, self.matching_pull_requests = [future.result() for future in futures]
+
+    async def load_async(self):
+        """Load the board, the issues and the pull requests concurrently using an AsyncGraphQLClient"""
+        async def timed_load(name, load):
+            started_at = time.perf_counter()
+            result = await load()
+            self.log_load_time(name, started_at)
+            return result
+
+        self.project, self.matching_issues, self.matching_pull_requests = await asyncio.gather(
+            timed_load('board', self.get_github_project_async), timed_load('issues', self.get_github_issues_async),
+            timed_load('pull requests', self.get_github_pull_requests_async))
 
     def construct_issue_object(self, github_issues):
         issues = {}
         if 'edges' not in github_issues:
             return issues
+        label_filter = self.config.get_label_filter()
         for edge in github_issues['edges']:
             node_data = edge['node']
-            issue_labels = get_labels(node_data['labels']['edges'])
-            if is_matching_project_item(issue_labels, self.config.must_have_labels, self.config.cant_have_labels,
-                                        self.config.filter_labels):
+            if label_filter.is_matching(LABEL_INTERNER.get_mask(get_labels(node_data['labels']['edges']))):
                 issue = Issue(**parse_issue(node_data), priority_list=self.config.priority_list)
                 issues[issue.id] = issue
 
@@ -39,76 +183,176 @@ class ProjectManager(object):
         prs = {}
         if 'edges' not in github_prs:
             return prs
+        label_filter = self.config.get_label_filter()
         for edge in github_prs['edges']:
             node_data = edge['node']
-            pr_labels = get_labels(node_data['labels']['edges'])
-            if is_matching_project_item(pr_labels, self.config.must_have_labels, self.config.cant_have_labels,
-                                        self.config.filter_labels):
+            if label_filter.is_matching(LABEL_INTERNER.get_mask(get_labels(node_data['labels']['edges']))):
                 pull_request = PullRequest(**parse_pull_request(node_data), priority_list=self.config.priority_list)
                 prs[pull_request.id] = pull_request
 
         return prs
 
     def get_github_project(self):
-        layout = self.client.get_project_layout(owner=self.config.project_owner,
-                                                repository_name=self.config.repository_name,
-                                                project_number=self.config.project_number,
-                                                is_org_project=self.config.is_org_project)
-
-        layout_project = get_project_from_response(layout, self.config.is_org_project)
-        column_edges = layout_project['columns']['edges']
-        builder = get_first_column_items(self.client, self.config)
-        builder_project = get_project_from_response(builder, self.config.is_org_project)
-        for index, column in enumerate(column_edges):
-            if column['node']['name'] in self.config.column_names:
-                if index == 0:
-                    continue
-                else:
-                    prev_cursor = column_edges[index - 1]['cursor']
-                    column_response = get_column_items_with_prev_column(self.client, self.config, prev_cursor)
-                    column_project = get_project_from_response(column_response, self.config.is_org_project)
-                    builder_project['columns']['nodes'].extend(
-                        column_project['columns']['nodes'])
-        return Project(**parse_project(builder_project, self.config))
+        return load_project(self.client, self.config, prefetch=self.prefetch_pages)
+
+    async def get_github_project_async(self):
+        return await load_project_async(self.client, self.config, prefetch=self.prefetch_pages)
+
+    def is_milestone_number(self):
+        return self.config.filter_milestone.isdigit()
+
+    def get_milestone_title(self):
+        """The search matches the milestone by its title, so the milestone number of the filter is resolved to it"""
+        if not self.is_milestone_number():
+            return None
+
+        milestone_number = int(self.config.filter_milestone)
+        return get_milestone_title(self.client.get_milestone(self.config.project_owner, self.config.repository_name,
+                                                             milestone_number), milestone_number)
+
+    async def get_milestone_title_async(self):
+        if not self.is_milestone_number():
+            return None
+
+        milestone_number = int(self.config.filter_milestone)
+        return get_milestone_title(await self.client.get_milestone(self.config.project_owner,
+                                                                   self.config.repository_name, milestone_number),
+                                   milestone_number)
+
+    def get_search_page_connection(self, response):
+        """Get the connection of a search page, warns on the last page if the search had more results than returned"""
+        connection = get_search_connection(response)
+        issue_count = connection.get('issueCount', 0)
+        if not connection.get('pageInfo', {}).get('hasNextPage') and issue_count > SEARCH_RESULTS_LIMIT:
+            self.config.logger.warning(f'The GitHub search found {issue_count} items, but only the first '
+                                       f'{SEARCH_RESULTS_LIMIT} of them are returned and managed - use stricter '
+                                       f'filters or fetch_mode = list')
+
+        return connection
+
+    def get_issue_search_page(self, search_query):
+        return lambda after: self.client.search_issues(search_query, after=after,
+                                                       fields=self.config.get_query_fields())
+
+    async def iter_issue_search_pages_async(self):
+        search_query = get_search_query(self.config, 'issue', await self.get_milestone_title_async())
+        async for page in iter_pages_async(self.get_issue_search_page(search_query), self.get_search_page_connection,
+                                           prefetch=self.prefetch_pages):
+            yield page
+
+    def iter_issue_pages(self, paginate=iter_pages):
+        """Iterate over the pages of the open issues, using iter_pages for a sync client or iter_pages_async for an
+        async one, the next page is fetched while a page is parsed if prefetch_pages is set"""
+        if self.config.fetch_mode == 'search':
+            if paginate is iter_pages_async:  # the milestone title is fetched before the first page
+                return self.iter_issue_search_pages_async()
+
+            search_query = get_search_query(self.config, 'issue', self.get_milestone_title())
+            return paginate(self.get_issue_search_page(search_query), self.get_search_page_connection,
+                            prefetch=self.prefetch_pages)
+
+        return paginate(lambda after: self.client.get_github_issues(owner=self.config.project_owner,
+                                                                    name=self.config.repository_name,
+                                                                    after=after,
+                                                                    labels=self.config.filter_labels,
+                                                                    milestone=self.config.filter_milestone,
+                                                                    fields=self.config.get_query_fields()),
+                        get_issues_connection,
+                        prefetch=self.prefetch_pages)
+
+    def iter_pull_request_pages(self, paginate=iter_pages):
+        if self.config.fetch_mode == 'search':
+            search_query = get_search_query(self.config, 'pr')
+            return paginate(lambda after: self.client.search_pull_requests(search_query, after=after,
+                                                                           fields=self.config.get_query_fields()),
+                            self.get_search_page_connection, prefetch=self.prefetch_pages)
+
+        return paginate(lambda after: self.client.get_github_pull_requests(owner=self.config.project_owner,
+                                                                           name=self.config.repository_name,
+                                                                           after=after,
+                                                                           fields=self.config.get_query_fields()),
+                        get_pull_requests_connection,
+                        prefetch=self.prefetch_pages)
+
+    def construct_shared_item(self, item_class, label_mask, parsed_item):
+        """Build an item of the board out of the parsed item of its RepositoryItems if it matches the label filters"""
+        if self.config.get_label_filter().is_matching(label_mask):
+            return item_class(**parsed_item, priority_list=self.config.priority_list)
+
+        return None
+
+    def iter_github_issues(self):
+        """Yield the issues which match the filters, each page is parsed and dropped once it is fetched"""
+        if self.repository_items is not None:
+            for label_mask, parsed_issue in self.repository_items.iter_issues():
+                issue = self.construct_shared_item(Issue, label_mask, parsed_issue)
+                if issue is not None:
+                    yield issue
+
+            return
+
+        for page in self.iter_issue_pages():
+            yield from self.construct_issue_object(page).values()
+
+    async def iter_github_issues_async(self):
+        if self.repository_items is not None:
+            async for label_mask, parsed_issue in self.repository_items.iter_issues(iter_pages_async):
+                issue = self.construct_shared_item(Issue, label_mask, parsed_issue)
+                if issue is not None:
+                    yield issue
+
+            return
+
+        async for page in self.iter_issue_pages(iter_pages_async):
+            for issue in self.construct_issue_object(page).values():
+                yield issue
+
+    def iter_github_pull_requests(self):
+        """Yield the pull requests which match the filters, each page is parsed and dropped once it is fetched"""
+        if self.repository_items is not None:
+            for label_mask, parsed_pull_request in self.repository_items.iter_pull_requests():
+                pull_request = self.construct_shared_item(PullRequest, label_mask, parsed_pull_request)
+                if pull_request is not None:
+                    yield pull_request
+
+            return
+
+        for page in self.iter_pull_request_pages():
+            yield from self.construct_pull_request_object(page).values()
+
+    async def iter_github_pull_requests_async(self):
+        if self.repository_items is not None:
+            async for label_mask, parsed_pull_request in self.repository_items.iter_pull_requests(iter_pages_async):
+                pull_request = self.construct_shared_item(PullRequest, label_mask, parsed_pull_request)
+                if pull_request is not None:
+                    yield pull_request
+
+            return
+
+        async for page in self.iter_pull_request_pages(iter_pages_async):
+            for pull_request in self.construct_pull_request_object(page).values():
+                yield pull_request
 
     def get_github_issues(self):
-        response = self.client.get_github_issues(owner=self.config.project_owner,
-                                                 name=self.config.repository_name,
-                                                 labels=self.config.filter_labels,
-                                                 milestone=self.config.filter_milestone,
-                                                 after=None)
-        issues = response.get('repository', {}).get('issues', {})
-
-        while response.get('repository', {}).get('issues', {}).get('pageInfo').get('hasNextPage'):
-            after = response.get('repository', {}).get('issues', {}).get('pageInfo').get('endCursor')
-            response = self.client.get_github_issues(owner=self.config.project_owner,
-                                                     name=self.config.repository_name,
-                                                     after=after,
-                                                     labels=self.config.filter_labels,
-                                                     milestone=self.config.filter_milestone)
-            issues.get('edges').extend(response.get('repository', {}).get('issues', {}).get('edges'))
-
-        return self.construct_issue_object(issues)
+        return {issue.id: issue for issue in self.iter_github_issues()}
 
-    def get_github_pull_requests(self):
-        response = self.client.get_github_pull_requests(owner=self.config.project_owner,
-                                                        name=self.config.repository_name,
-                                                        after=None)
-        pull_requests = response.get('repository', {}).get('pullRequests', {})
+    async def get_github_issues_async(self):
+        return {issue.id: issue async for issue in self.iter_github_issues_async()}
 
-        while response.get('repository', {}).get('pullRequests', {}).get('pageInfo', {}).get('hasNextPage'):
-            after = response.get('repository', {}).get('pullRequests', {}).get('pageInfo', {}).get('endCursor')
-            response = self.client.get_github_pull_requests(owner=self.config.project_owner,
-                                                            name=self.config.repository_name,
-                                                            after=after)
-            pull_requests.get('edges').extend(response.get('repository', {}).get('pullRequests', {}).get('edges'))
+    def get_github_pull_requests(self):
+        return {pull_request.id: pull_request for pull_request in self.iter_github_pull_requests()}
 
-        return self.construct_pull_request_object(pull_requests)
+    async def get_github_pull_requests_async(self):
+        return {pull_request.id: pull_request async for pull_request in self.iter_github_pull_requests_async()}
 
     def add_items_to_project(self, all_items):
         items_to_add = self.project.find_missing_item_ids(all_items)
         self.project.add_items(self.client, all_items, items_to_add, self.config)
 
+    async def add_items_to_project_async(self, all_items):
+        items_to_add = self.project.find_missing_item_ids(all_items)
+        await self.project.add_items_async(self.client, all_items, items_to_add, self.config)
+
     def manage(self):
         if self.config.remove:  # Better to first remove items that should not be in the board
             self.project.remove_items(self.client, self.config)
@@ -127,3 +371,23 @@ class ProjectManager(object):
                 self.project.move_items(self.client, self.config, self.matching_issues)
             if self.matching_pull_requests:
                 self.project.move_items(self.client, self.config, self.matching_pull_requests)
+
+    async def manage_async(self):
+        """Same as manage, where the independent requests of every step are sent concurrently"""
+        if self.config.remove:  # Better to first remove items that should not be in the board
+            await self.project.remove_items_async(self.client, self.config)
+
+        if self.config.add:
+            if self.matching_issues:
+                await self.add_items_to_project_async(self.matching_issues)
+            if self.matching_pull_requests:
+                await self.add_items_to_project_async(self.matching_pull_requests)
+
+        if self.config.sort:
+            await self.project.sort_items_in_columns_async(self.client, self.config)
+
+        if self.config.move:
+            if self.matching_issues:
+                await self.project.move_items_async(self.client, self.config, self.matching_issues)
+            if self.matching_pull_requests:
+                await self.project.move_items_async(self.client, self.config, self.matching_pull_requests)
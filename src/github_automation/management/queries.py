@@ -0,0 +1,1311 @@
+from gql import gql
+from graphql import (REMOVE, FieldNode, OperationType, TypeInfo, TypeInfoVisitor, Visitor, print_ast, validate,
+                     visit)
+
+ISSUES_QUERY = '''query ($after: String, $owner: String!, $name: String!, $milestone: String,
+       $milestoneNumber: String){
+  repository(owner: $owner, name: $name) {
+    issues(first: 100, after:$after, states: OPEN, filterBy:{milestone: $milestone,
+                                                             milestoneNumber: $milestoneNumber}) {
+      pageInfo {
+        hasNextPage
+        endCursor
+      }
+      edges {
+        cursor
+        node {
+        projectCards(first:5){
+        nodes{
+          id
+          column {
+            name
+          }
+          project{
+            number
+            }
+          }
+        }
+          timelineItems(first:10, itemTypes:[CROSS_REFERENCED_EVENT]){
+            __typename
+            ... on IssueTimelineItemsConnection{
+              nodes {
+                ... on CrossReferencedEvent {
+                  willCloseTarget
+                  source {
+                    __typename
+                    ... on PullRequest {
+                      id
+                      title
+                      state
+                      isDraft
+                      assignees(first:10){
+                        nodes{
+                          login
+                        }
+                      }
+                      labels(first:5){
+                        nodes{
+                          name
+                        }
+                      }
+                      reviewRequests(first:1){
+                        totalCount
+                      }
+                      reviews(first:1){
+                        totalCount
+                      }
+                      number
+                      reviewDecision
+                    }
+                  }
+                }
+              }
+            }
+          }
+          title
+          id
+          number
+          state
+          milestone {
+            title
+          }
+          labels(first: 10) {
+            edges {
+              node {
+                name
+              }
+            }
+          }
+          assignees(last: 10) {
+            edges {
+              node {
+                id
+                login
+              }
+            }
+          }
+        }
+      }
+    }
+  }
+}
+'''
+
+ISSUES_WITH_LABELS_QUERY = '''query ($after: String, $owner: String!, $name: String!, $labels: [String!],
+       $milestone: String, $milestoneNumber: String){
+  repository(owner: $owner, name: $name) {
+    issues(first: 100, after:$after, states: OPEN, filterBy:{labels: $labels, milestone: $milestone,
+                                                             milestoneNumber: $milestoneNumber}) {
+      pageInfo {
+        hasNextPage
+        endCursor
+      }
+      edges {
+        cursor
+        node {
+            projectCards(first:5){
+            nodes{
+              id
+              column {
+                name
+              }
+              project{
+                number
+              }
+            }
+          }
+          timelineItems(first:10, itemTypes:[CROSS_REFERENCED_EVENT]){
+            __typename
+            ... on IssueTimelineItemsConnection{
+              nodes {
+                ... on CrossReferencedEvent {
+                  willCloseTarget
+                  source {
+                    __typename
+                    ... on PullRequest {
+                      id
+                      title
+                      state
+                      isDraft
+                      assignees(first:10){
+                        nodes{
+                          login
+                        }
+                      }
+                      labels(first:5){
+                        nodes{
+                          name
+                        }
+                      }
+                      reviewRequests(first:1){
+                        totalCount
+                      }
+                      reviews(first:1){
+                        totalCount
+                      }
+                      number
+                      reviewDecision
+                    }
+                  }
+                }
+              }
+            }
+          }
+          title
+          id
+          number
+          milestone {
+            title
+          }
+          labels(first: 10) {
+            edges {
+              node {
+                name
+              }
+            }
+          }
+          assignees(last: 10) {
+            edges {
+              node {
+                id
+                login
+              }
+            }
+          }
+        }
+      }
+    }
+  }
+}
+'''
+
+PULL_REQUESTS_QUERY = '''query ($after: String, $owner: String!, $name: String!) {
+  repository(owner: $owner, name: $name) {
+    pullRequests(first: 100, after:$after, states: OPEN) {
+      pageInfo {
+        endCursor
+        hasNextPage
+      }
+      edges {
+        cursor
+        node {
+          title
+          id
+          state
+          number
+          mergedAt
+          merged
+          reviewDecision
+          reviews(last: 10) {
+            totalCount
+          }
+          reviewRequests(first: 10) {
+            totalCount
+          }
+          labels(first: 10) {
+            edges {
+              node {
+                name
+              }
+            }
+          }
+          assignees(last: 10) {
+            edges {
+              node {
+                id
+                login
+              }
+            }
+          }
+          projectCards(first: 5) {
+            nodes {
+              id
+              column {
+                name
+              }
+              project {
+                number
+              }
+            }
+          }
+        }
+      }
+    }
+  }
+}
+
+'''
+
+SEARCH_ISSUES_QUERY = '''query ($after: String, $searchQuery: String!) {
+  search(first: 100, after: $after, query: $searchQuery, type: ISSUE) {
+    issueCount
+    pageInfo {
+      hasNextPage
+      endCursor
+    }
+    edges {
+      cursor
+      node {
+        ... on Issue {
+          projectCards(first: 5) {
+            nodes {
+              id
+              column {
+                name
+              }
+              project {
+                number
+              }
+            }
+          }
+          timelineItems(first: 10, itemTypes: [CROSS_REFERENCED_EVENT]) {
+            __typename
+            ... on IssueTimelineItemsConnection {
+              nodes {
+                ... on CrossReferencedEvent {
+                  willCloseTarget
+                  source {
+                    __typename
+                    ... on PullRequest {
+                      id
+                      title
+                      state
+                      isDraft
+                      assignees(first: 10) {
+                        nodes {
+                          login
+                        }
+                      }
+                      labels(first: 5) {
+                        nodes {
+                          name
+                        }
+                      }
+                      reviewRequests(first: 1) {
+                        totalCount
+                      }
+                      reviews(first: 1) {
+                        totalCount
+                      }
+                      number
+                      reviewDecision
+                    }
+                  }
+                }
+              }
+            }
+          }
+          title
+          id
+          number
+          state
+          milestone {
+            title
+          }
+          labels(first: 10) {
+            edges {
+              node {
+                name
+              }
+            }
+          }
+          assignees(last: 10) {
+            edges {
+              node {
+                id
+                login
+              }
+            }
+          }
+        }
+      }
+    }
+  }
+}
+'''
+
+SEARCH_PULL_REQUESTS_QUERY = '''query ($after: String, $searchQuery: String!) {
+  search(first: 100, after: $after, query: $searchQuery, type: ISSUE) {
+    issueCount
+    pageInfo {
+      hasNextPage
+      endCursor
+    }
+    edges {
+      cursor
+      node {
+        ... on PullRequest {
+          title
+          id
+          state
+          number
+          mergedAt
+          merged
+          reviewDecision
+          reviews(last: 10) {
+            totalCount
+          }
+          reviewRequests(first: 10) {
+            totalCount
+          }
+          labels(first: 10) {
+            edges {
+              node {
+                name
+              }
+            }
+          }
+          assignees(last: 10) {
+            edges {
+              node {
+                id
+                login
+              }
+            }
+          }
+          projectCards(first: 5) {
+            nodes {
+              id
+              column {
+                name
+              }
+              project {
+                number
+              }
+            }
+          }
+        }
+      }
+    }
+  }
+}
+'''
+
+ISSUE_QUERY = '''query ($owner: String!, $name: String!, $issueNumber: Int!){
+  repository(owner: $owner, name: $name) {
+    issue(number: $issueNumber) {
+      projectCards(first:5){
+        nodes{
+          id
+          column {
+            name
+          }
+          project{
+            number
+          }
+        }
+      }
+      timelineItems(first: 5, itemTypes: [CROSS_REFERENCED_EVENT]) {
+        __typename
+        ... on IssueTimelineItemsConnection {
+          nodes {
+            ... on CrossReferencedEvent {
+              willCloseTarget
+              source {
+                __typename
+                ... on PullRequest {
+                  id
+                  title
+                  state
+                  isDraft
+                  assignees(first: 5) {
+                    nodes {
+                      login
+                    }
+                  }
+                  labels(first:5){
+                    nodes{
+                      name
+                    }
+                  }
+                  reviewRequests(first:1){
+                    totalCount
+                  }
+                  reviews(first:1){
+                    totalCount
+                  }
+                  number
+                  reviewDecision
+                }
+              }
+            }
+          }
+        }
+      }
+      title
+      id
+      number
+      state
+      milestone {
+        title
+      }
+      labels(last: 10) {
+        edges {
+          node {
+            name
+          }
+        }
+      }
+      assignees(last: 10) {
+        edges {
+          node {
+            id
+            login
+          }
+        }
+      }
+    }
+  }
+}
+'''
+
+PULL_REQUEST_QUERY = '''query ($owner: String!, $name: String!, $prNumber: Int!) {
+  repository(owner: $owner, name: $name) {
+    pullRequest(number: $prNumber) {
+      projectCards(first: 5) {
+        nodes {
+          id
+          column {
+            name
+          }
+          project {
+            number
+          }
+        }
+      }
+      title
+      id
+      number
+      state
+      mergedAt
+      merged
+      reviewDecision
+      reviews(last: 10) {
+        totalCount
+      }
+      reviewRequests(first: 10) {
+        totalCount
+      }
+      labels(last: 10) {
+        edges {
+          node {
+            name
+          }
+        }
+      }
+      assignees(last: 10) {
+        edges {
+          node {
+            id
+            login
+          }
+        }
+      }
+    }
+  }
+}
+'''
+
+MILESTONE_QUERY = '''query ($owner: String!, $name: String!, $number: Int!) {
+  repository(owner: $owner, name: $name) {
+    milestone(number: $number) {
+      title
+    }
+  }
+}
+'''
+
+REPO_PROJECT_LAYOUT_QUERY = '''query ($owner: String!, $name: String!, $number: Int!){
+  repository(owner: $owner, name: $name) {
+    project(number: $number) {
+      name
+      id
+      number
+      columns(first: 15) {
+        edges{
+          cursor
+          node {
+            name
+          }
+        }
+      }
+    }
+  }
+}
+'''
+
+ORG_PROJECT_LAYOUT_QUERY = '''query ($owner: String!, $number: Int!) {
+  organization(login: $owner) {
+    project(number: $number) {
+      name
+      id
+      number
+      columns(first: 15) {
+        edges{
+          cursor
+          node {
+            name
+          }
+        }
+      }
+    }
+  }
+}
+'''
+
+REPO_FIRST_COLUMN_ITEMS_QUERY = '''query ($owner: String!, $name: String!, $projectNumber: Int!,
+       $start_cards_cursor: String) {
+  repository(owner: $owner, name: $name) {
+    project(number: $projectNumber) {
+      name
+      id
+      number
+      columns(first: 1) {
+        nodes {
+          name
+          id
+          cards(first: 100, after: $start_cards_cursor) {
+            pageInfo {
+              endCursor
+              hasNextPage
+            }
+            edges {
+              cursor
+              node {
+                note
+                state
+                id
+                content {
+                  __typename
+                  ... on Issue {
+                    id
+                    number
+                    title
+                    labels(first: 10) {
+                      edges {
+                        node {
+                          name
+                        }
+                      }
+                    }
+                    assignees(first: 10) {
+                      edges {
+                        node {
+                          login
+                        }
+                      }
+                    }
+                  }
+                  ... on PullRequest {
+                    title
+                    id
+                    state
+                    number
+                    mergedAt
+                    merged
+                    reviewDecision
+                    reviews(last: 10) {
+                      totalCount
+                    }
+                    reviewRequests(first: 10) {
+                      totalCount
+                    }
+                    labels(first: 10) {
+                      edges {
+                        node {
+                          name
+                        }
+                      }
+                    }
+                    assignees(first: 10) {
+                      edges {
+                        node {
+                          login
+                        }
+                      }
+                    }
+                  }
+                }
+              }
+            }
+          }
+        }
+      }
+    }
+  }
+}
+
+'''
+
+ORG_FIRST_COLUMN_ITEMS_QUERY = '''query ($owner: String!, $projectNumber: Int!, $start_cards_cursor: String) {
+  organization(login: $owner) {
+    project(number: $projectNumber) {
+      name
+      id
+      number
+      columns(first: 1) {
+        nodes {
+          name
+          id
+          cards(first: 100, after: $start_cards_cursor) {
+            pageInfo {
+              endCursor
+              hasNextPage
+            }
+            edges {
+              cursor
+              node {
+                note
+                state
+                id
+                content {
+                  __typename
+                  ... on Issue {
+                    id
+                    number
+                    title
+                    labels(first: 10) {
+                      edges {
+                        node {
+                          name
+                        }
+                      }
+                    }
+                    assignees(first: 10) {
+                      edges {
+                        node {
+                          login
+                        }
+                      }
+                    }
+                  }
+                  ... on PullRequest {
+                    title
+                    id
+                    state
+                    number
+                    mergedAt
+                    merged
+                    reviewDecision
+                    reviews(last: 10) {
+                      totalCount
+                    }
+                    reviewRequests(first: 10) {
+                      totalCount
+                    }
+                    labels(first: 10) {
+                      edges {
+                        node {
+                          name
+                        }
+                      }
+                    }
+                    assignees(first: 10) {
+                      edges {
+                        node {
+                          login
+                        }
+                      }
+                    }
+                  }
+                }
+              }
+            }
+          }
+        }
+      }
+    }
+  }
+}
+
+'''
+
+REPO_COLUMN_ITEMS_QUERY = '''query ($owner: String!, $name: String!, $projectNumber: Int!, $prevColumnID: String!,
+       $start_cards_cursor: String) {
+  repository(owner: $owner, name: $name) {
+    project(number: $projectNumber) {
+      name
+      id
+      number
+      columns(after: $prevColumnID, first: 1) {
+        nodes {
+          name
+          id
+          cards(first: 100, after: $start_cards_cursor) {
+            pageInfo {
+              endCursor
+              hasNextPage
+            }
+            edges {
+              cursor
+              node {
+                note
+                state
+                id
+                content {
+                  __typename
+                  ... on Issue {
+                    id
+                    number
+                    title
+                    labels(first: 10) {
+                      edges {
+                        node {
+                          name
+                        }
+                      }
+                    }
+                    assignees(first: 10) {
+                      edges {
+                        node {
+                          login
+                        }
+                      }
+                    }
+                  }
+                  ... on PullRequest {
+                    id
+                    number
+                    title
+                    labels(first: 10) {
+                      edges {
+                        node {
+                          name
+                        }
+                      }
+                    }
+                    reviewDecision
+                    reviews(last: 10) {
+                      totalCount
+                    }
+                    reviewRequests(first: 10) {
+                      totalCount
+                    }
+                    assignees(first: 10) {
+                      edges {
+                        node {
+                          login
+                        }
+                      }
+                    }
+                  }
+                }
+              }
+            }
+          }
+        }
+      }
+    }
+  }
+}
+'''
+
+ORG_COLUMN_ITEMS_QUERY = '''query ($owner: String!, $projectNumber: Int!, $prevColumnID: String!,
+       $start_cards_cursor: String) {
+  organization(login: $owner) {
+    project(number: $projectNumber) {
+      name
+      id
+      number
+      columns(after: $prevColumnID, first: 1) {
+        nodes {
+          name
+          id
+          cards(first: 100, after: $start_cards_cursor) {
+            pageInfo {
+              endCursor
+              hasNextPage
+            }
+            edges {
+              cursor
+              node {
+                note
+                state
+                id
+                content {
+                  __typename
+                  ... on Issue {
+                    id
+                    number
+                    title
+                    labels(first: 10) {
+                      edges {
+                        node {
+                          name
+                        }
+                      }
+                    }
+                    assignees(first: 10) {
+                      edges {
+                        node {
+                          login
+                        }
+                      }
+                    }
+                  }
+                  ... on PullRequest {
+                    id
+                    number
+                    title
+                    labels(first: 10) {
+                      edges {
+                        node {
+                          name
+                        }
+                      }
+                    }
+                    reviewDecision
+                    reviews(last: 10) {
+                      totalCount
+                    }
+                    reviewRequests(first: 10) {
+                      totalCount
+                    }
+                    assignees(first: 10) {
+                      edges {
+                        node {
+                          login
+                        }
+                      }
+                    }
+                  }
+                }
+              }
+            }
+          }
+        }
+      }
+    }
+  }
+}
+'''
+
+REPO_BOARD_ITEMS_QUERY = '''query ($owner: String!, $name: String!, $projectNumber: Int!) {
+  repository(owner: $owner, name: $name) {
+    project(number: $projectNumber) {
+      name
+      id
+      number
+      columns(first: 15) {
+        edges {
+          cursor
+          node {
+            name
+            id
+            cards(first: 100) {
+              pageInfo {
+                endCursor
+                hasNextPage
+              }
+              edges {
+                cursor
+                node {
+                  note
+                  state
+                  id
+                  content {
+                    __typename
+                    ... on Issue {
+                      id
+                      number
+                      title
+                      labels(first: 10) {
+                        edges {
+                          node {
+                            name
+                          }
+                        }
+                      }
+                      assignees(first: 10) {
+                        edges {
+                          node {
+                            login
+                          }
+                        }
+                      }
+                    }
+                    ... on PullRequest {
+                      id
+                      number
+                      title
+                      labels(first: 10) {
+                        edges {
+                          node {
+                            name
+                          }
+                        }
+                      }
+                      reviewDecision
+                      reviews(last: 10) {
+                        totalCount
+                      }
+                      reviewRequests(first: 10) {
+                        totalCount
+                      }
+                      assignees(first: 10) {
+                        edges {
+                          node {
+                            login
+                          }
+                        }
+                      }
+                    }
+                  }
+                }
+              }
+            }
+          }
+        }
+      }
+    }
+  }
+}
+'''
+
+ORG_BOARD_ITEMS_QUERY = '''query ($owner: String!, $projectNumber: Int!) {
+  organization(login: $owner) {
+    project(number: $projectNumber) {
+      name
+      id
+      number
+      columns(first: 15) {
+        edges {
+          cursor
+          node {
+            name
+            id
+            cards(first: 100) {
+              pageInfo {
+                endCursor
+                hasNextPage
+              }
+              edges {
+                cursor
+                node {
+                  note
+                  state
+                  id
+                  content {
+                    __typename
+                    ... on Issue {
+                      id
+                      number
+                      title
+                      labels(first: 10) {
+                        edges {
+                          node {
+                            name
+                          }
+                        }
+                      }
+                      assignees(first: 10) {
+                        edges {
+                          node {
+                            login
+                          }
+                        }
+                      }
+                    }
+                    ... on PullRequest {
+                      id
+                      number
+                      title
+                      labels(first: 10) {
+                        edges {
+                          node {
+                            name
+                          }
+                        }
+                      }
+                      reviewDecision
+                      reviews(last: 10) {
+                        totalCount
+                      }
+                      reviewRequests(first: 10) {
+                        totalCount
+                      }
+                      assignees(first: 10) {
+                        edges {
+                          node {
+                            login
+                          }
+                        }
+                      }
+                    }
+                  }
+                }
+              }
+            }
+          }
+        }
+      }
+    }
+  }
+}
+'''
+
+ADD_PROJECT_CARD_MUTATION = '''mutation addProjectCardAction($contentID: ID!, $columnId: ID!){
+  addProjectCard(input: {contentId: $contentID, projectColumnId: $columnId}) {
+    cardEdge{
+      node{
+        id
+        project {
+          id
+        }
+      }
+    }
+  }
+}
+'''
+
+MOVE_PROJECT_CARD_MUTATION = '''mutation moveProjectCardAction($cardId: ID!, $columnId: ID!){
+  moveProjectCard(input: {cardId: $cardId, columnId: $columnId}) {
+    cardEdge{
+      node{
+        id
+        project {
+          id
+        }
+      }
+    }
+  }
+}
+'''
+
+MOVE_PROJECT_CARD_AFTER_CARD_MUTATION = '''mutation moveProjectCardAction($cardId: ID!, $columnId: ID!,
+                               $afterCardId: ID!){
+  moveProjectCard(input: {cardId: $cardId, columnId: $columnId, afterCardId: $afterCardId}) {
+    cardEdge{
+      node{
+        id
+        project {
+          id
+        }
+      }
+    }
+  }
+}
+'''
+
+DELETE_PROJECT_CARD_MUTATION = '''mutation deleteProjectCardAction($cardId: ID!){
+  deleteProjectCard(input: {cardId: $cardId}) {
+    deletedCardId
+    column {
+      project {
+        id
+      }
+    }
+  }
+}
+'''
+
+UN_ARCHIVE_PROJECT_CARD_MUTATION = '''mutation ($card_id: ID!, $isArchived: Boolean){
+  updateProjectCard(input: {projectCardId: $card_id, isArchived: $isArchived}) {
+    projectCard {
+      isArchived
+      project {
+        id
+      }
+    }
+  }
+}
+'''
+
+RATE_LIMIT_SELECTION = 'rateLimit { cost limit remaining resetAt }'
+
+
+def with_rate_limit(query):
+    """Add the rate limit budget to the top level fields of the query, it is used for pacing the requests"""
+    query = query.rstrip()
+    return f'{query[:-1]}  {RATE_LIMIT_SELECTION}\n}}\n'
+
+
+QUERIES = {
+    'issues': with_rate_limit(ISSUES_QUERY),
+    'issues_with_labels': with_rate_limit(ISSUES_WITH_LABELS_QUERY),
+    'pull_requests': with_rate_limit(PULL_REQUESTS_QUERY),
+    'search_issues': with_rate_limit(SEARCH_ISSUES_QUERY),
+    'search_pull_requests': with_rate_limit(SEARCH_PULL_REQUESTS_QUERY),
+    'issue': with_rate_limit(ISSUE_QUERY),
+    'pull_request': with_rate_limit(PULL_REQUEST_QUERY),
+    'milestone': with_rate_limit(MILESTONE_QUERY),
+    'project_layout': with_rate_limit(REPO_PROJECT_LAYOUT_QUERY),
+    'org_project_layout': with_rate_limit(ORG_PROJECT_LAYOUT_QUERY),
+    'first_column_items': with_rate_limit(REPO_FIRST_COLUMN_ITEMS_QUERY),
+    'org_first_column_items': with_rate_limit(ORG_FIRST_COLUMN_ITEMS_QUERY),
+    'column_items': with_rate_limit(REPO_COLUMN_ITEMS_QUERY),
+    'org_column_items': with_rate_limit(ORG_COLUMN_ITEMS_QUERY),
+    'board_items': with_rate_limit(REPO_BOARD_ITEMS_QUERY),
+    'org_board_items': with_rate_limit(ORG_BOARD_ITEMS_QUERY),
+    'add_project_card': ADD_PROJECT_CARD_MUTATION,
+    'move_project_card': MOVE_PROJECT_CARD_MUTATION,
+    'move_project_card_after_card': MOVE_PROJECT_CARD_AFTER_CARD_MUTATION,
+    'delete_project_card': DELETE_PROJECT_CARD_MUTATION,
+    'un_archive_project_card': UN_ARCHIVE_PROJECT_CARD_MUTATION,
+}
+
+
+NON_IDEMPOTENT_MUTATIONS = ('addProjectCard',)  # sending it again adds another card
+
+# The card mutations which can be sent together as aliased fields of a single mutation document
+BATCH_MUTATIONS = {
+    'add_project_card': ('addProjectCard', 'AddProjectCardInput!', 'cardEdge { node { id project { id } } }'),
+    'move_project_card': ('moveProjectCard', 'MoveProjectCardInput!', 'cardEdge { node { id project { id } } }'),
+    'delete_project_card': ('deleteProjectCard', 'DeleteProjectCardInput!',
+                            'deletedCardId column { project { id } }'),
+}
+
+
+# The fields which are only fetched when a column rule uses them, by the type which has them and the prefixes of the
+# rules which use them. The fields of the pull request which is linked to an issue are used by the issue.pull_request
+# rules, and only its labels are optional among the fields which are always fetched.
+OPTIONAL_FIELDS = {
+    'Issue': {
+        'assignees': ('issue.assignees',),
+        'timelineItems': ('issue.pull_request',),
+    },
+    'PullRequest': {
+        'assignees': ('pull_request.assignees',),
+        'reviews': ('pull_request.review_requested',),
+        'reviewRequests': ('pull_request.review_requested',),
+        'reviewDecision': ('pull_request.review_completed', 'pull_request.review_requested_changes'),
+    },
+}
+LINKED_PULL_REQUEST_OPTIONAL_FIELDS = {'labels': ('pull_request.labels',)}
+
+
+class OptionalFieldsRemover(Visitor):
+    """Removes the optional fields which none of the given rules use from a document"""
+
+    def __init__(self, type_info, rules):
+        super().__init__()
+        self.type_info = type_info
+        self.rules = rules
+
+    def enter_field(self, node, key, parent, path, ancestors):
+        parent_type = self.type_info.get_parent_type()
+        optional_fields = dict(OPTIONAL_FIELDS.get(getattr(parent_type, 'name', None), {}))
+        is_linked_pull_request = any(isinstance(ancestor, FieldNode) and ancestor.name.value == 'timelineItems'
+                                     for ancestor in ancestors)
+        if is_linked_pull_request:
+            optional_fields.update(LINKED_PULL_REQUEST_OPTIONAL_FIELDS)
+
+        rule_prefixes = optional_fields.get(node.name.value)
+        if rule_prefixes is None:
+            return None
+
+        if is_linked_pull_request:
+            rule_prefixes = tuple(f'issue.{rule_prefix}' for rule_prefix in rule_prefixes)
+
+        if not any(rule.startswith(rule_prefixes) for rule in self.rules):
+            return REMOVE
+
+        return None
+
+
+def remove_optional_fields(schema, document, rules):
+    type_info = TypeInfo(schema)
+    # the edited nodes are not hashable as the validation expects, so the document is parsed again
+    return gql(print_ast(visit(document, TypeInfoVisitor(type_info, OptionalFieldsRemover(type_info, rules)))))
+
+
+def get_mutation_alias(index):
+    return f'mutation{index}'
+
+
+def build_batch_mutation(mutations):
+    """Build a mutation document with an aliased field and an input variable for every one of the given mutations"""
+    variables = []
+    fields = []
+    for index, mutation in enumerate(mutations):
+        field_name, input_type, selection = BATCH_MUTATIONS[mutation]
+        variables.append(f'$input{index}: {input_type}')
+        fields.append(f'  {get_mutation_alias(index)}: {field_name}(input: $input{index}) {{ {selection} }}')
+
+    return 'mutation ({}) {{\n{}\n}}'.format(', '.join(variables), '\n'.join(fields))
+
+
+def is_mutation(document):
+    return any(getattr(definition, 'operation', None) == OperationType.MUTATION
+               for definition in document.definitions)
+
+
+def is_idempotent(document):
+    """Whether sending the document again has the same effect, so it can be sent again after it may have been applied"""
+    return not any(isinstance(selection, FieldNode) and selection.name.value in NON_IDEMPOTENT_MUTATIONS
+                   for definition in document.definitions
+                   if getattr(definition, 'operation', None) == OperationType.MUTATION
+                   for selection in definition.selection_set.selections)
+
+
+def get_project_operation(operation, is_org_project=False):
+    """Get the name of the organization or the repository variant of a project operation"""
+    return f'org_{operation}' if is_org_project else operation
+
+
+class QueryRegistry(object):
+    """Holds the parsed documents of the queries, so each query is parsed and validated once per process"""
+
+    def __init__(self, queries):
+        self.documents = {operation: gql(query) for operation, query in queries.items()}
+        self.batch_documents = {}
+        self.minimal_documents = {}
+        self.validated_schemas = set()
+
+    def get(self, operation, fields=None):
+        """Get the document of the operation, with only the optional fields which the given column rules use
+
+        All the fields are fetched when no rules are given, the document of each set of rules is built only once.
+        """
+        if fields is None:
+            return self.documents[operation]
+
+        key = (operation, frozenset(fields))
+        if key not in self.minimal_documents:
+            if not self.validated_schemas:
+                raise ValueError('The optional fields are found by the schema, validate the queries against it first')
+
+            schema = next(iter(self.validated_schemas))  # the types of the fields are the same in all the schemas
+            document = remove_optional_fields(schema, self.documents[operation], key[1])
+            for validated_schema in self.validated_schemas:
+                self.validate_document(validated_schema, operation, document)
+
+            self.minimal_documents[key] = document
+
+        return self.minimal_documents[key]
+
+    def get_batch_mutation(self, mutations):
+        """Get the document of a batch of the given mutations, each sequence of mutations is built only once"""
+        mutations = tuple(mutations)
+        if mutations not in self.batch_documents:
+            document = gql(build_batch_mutation(mutations))
+            for schema in self.validated_schemas:
+                self.validate_document(schema, 'batch mutation', document)
+
+            self.batch_documents[mutations] = document
+
+        return self.batch_documents[mutations]
+
+    @staticmethod
+    def validate_document(schema, operation, document):
+        validation_errors = validate(schema, document)
+        if validation_errors:
+            raise ValueError(f'The {operation} query does not match the GitHub schema - {validation_errors[0]}')
+
+    def validate(self, schema):
+        if schema in self.validated_schemas:
+            return
+
+        for operation, document in self.documents.items():
+            self.validate_document(schema, operation, document)
+
+        for document in self.batch_documents.values():
+            self.validate_document(schema, 'batch mutation', document)
+
+        for (operation, _), document in self.minimal_documents.items():
+            self.validate_document(schema, operation, document)
+
+        self.validated_schemas.add(schema)
+
+
+QUERY_REGISTRY = QueryRegistry(QUERIES)
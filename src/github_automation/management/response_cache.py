@@ -0,0 +1,141 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from github_automation.management.queries import QUERIES
+
+
+class ResponseCache(object):
+    """Stores the responses of the registry queries in an SQLite file, so they can be reused by the next runs
+
+    The responses are keyed by a hash of the scope of the client (the GitHub url and a hash of the token, as different
+    hosts and tokens see different data), the query, the operation, its variables and the fetched item fields, and are
+    kept for the TTL of the operation - operations without a TTL are not cached. Every mutation changes project cards,
+    so it invalidates the responses of the operations which return the cards of the projects it changed (or of all the
+    projects if they are unknown), the project layout is only changed from the GitHub UI.
+    """
+    VERSION = 1  # the version of the table, a table of an older version is dropped
+    DEFAULT_TTLS = {
+        'project_layout': 3600,
+        'org_project_layout': 3600,
+        'first_column_items': 300,
+        'org_first_column_items': 300,
+        'column_items': 300,
+        'org_column_items': 300,
+        'board_items': 300,
+        'org_board_items': 300,
+    }
+    CARD_INDEPENDENT_OPERATIONS = ('project_layout', 'org_project_layout')
+
+    def __init__(self, path, ttls=None, clock=time.time, scope=''):
+        self.ttls = dict(self.DEFAULT_TTLS, **(ttls or {}))
+        self.scope = scope
+        self.clock = clock
+        cache_dir = os.path.dirname(path)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+        # the connection is shared by the threads of the client, so its use is serialized with a lock
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        with self.lock:
+            if self.connection.execute('PRAGMA user_version').fetchone()[0] < self.VERSION:
+                self.connection.execute('DROP TABLE IF EXISTS responses')
+                self.connection.execute(f'PRAGMA user_version = {self.VERSION}')
+
+            self.connection.execute('CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, '
+                                    'operation TEXT NOT NULL, project_id TEXT, response TEXT NOT NULL, '
+                                    'expires_at REAL NOT NULL)')
+            self.connection.execute('DELETE FROM responses WHERE expires_at <= ?', (self.clock(),))
+
+    @staticmethod
+    def get_scope(base_url, api_key):
+        token_hash = hashlib.sha256((api_key or '').encode('utf-8')).hexdigest()
+        return f'{base_url} {token_hash}'
+
+    def get_key(self, operation, variable_values, fields=None):
+        fields = sorted(fields) if fields is not None else None
+        content = json.dumps([self.scope, QUERIES[operation], operation, variable_values or {}, fields],
+                             sort_keys=True)
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+    def get(self, operation, variable_values=None, fields=None):
+        if not self.ttls.get(operation):
+            return None
+
+        with self.lock:
+            row = self.connection.execute('SELECT response FROM responses WHERE key = ? AND expires_at > ?',
+                                          (self.get_key(operation, variable_values, fields), self.clock())).fetchone()
+
+        return json.loads(row[0]) if row else None
+
+    def set(self, operation, variable_values, response, fields=None):
+        ttl = self.ttls.get(operation)
+        if not ttl:
+            return
+
+        with self.lock:
+            self.connection.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)',
+                                    (self.get_key(operation, variable_values, fields), operation,
+                                     get_response_project_id(response), json.dumps(response), self.clock() + ttl))
+
+    def invalidate(self, project_ids=None):
+        """Drop the responses which may have been changed by a mutation of the cards of the given projects, or of any
+        project if none were given. The responses of unknown projects are always dropped."""
+        placeholders = ', '.join('?' for _ in self.CARD_INDEPENDENT_OPERATIONS)
+        query = f'DELETE FROM responses WHERE operation NOT IN ({placeholders})'
+        parameters = list(self.CARD_INDEPENDENT_OPERATIONS)
+        if project_ids is not None:
+            query += f' AND (project_id IS NULL OR project_id IN ({", ".join("?" for _ in project_ids)}))'
+            parameters.extend(project_ids)
+
+        with self.lock:
+            self.connection.execute(query, parameters)
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+def get_response_project_id(response):
+    """Get the id of the project a response of a project query is about, or None if it is not about a project"""
+    for root in ('repository', 'organization'):
+        project = (response.get(root) or {}).get('project')
+        if project and project.get('id'):
+            return project['id']
+
+    return None
+
+
+def find_project_id(result):
+    if isinstance(result, dict):
+        project = result.get('project')
+        if isinstance(project, dict) and project.get('id'):
+            return project['id']
+
+        for value in result.values():
+            project_id = find_project_id(value)
+            if project_id is not None:
+                return project_id
+
+    return None
+
+
+def get_mutated_project_ids(response):
+    """Get the ids of the projects whose cards were changed by the mutations of a response, or None if the project of
+    any of the mutations is unknown"""
+    if not response:
+        return None
+
+    project_ids = set()
+    for result in response.values():
+        project_id = find_project_id(result)
+        if project_id is None:
+            return None
+
+        project_ids.add(project_id)
+
+    return sorted(project_ids)
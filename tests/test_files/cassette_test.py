@@ -0,0 +1,70 @@
+from __future__ import absolute_import
+
+import asyncio
+import json
+
+import pytest
+from graphql import ExecutionResult
+from github_automation.management.cassette import RecordingTransport, ReplayTransport
+from github_automation.management.github_client import AsyncGraphQLClient, GraphQLClient
+
+RATE_LIMIT = {'cost': 1, 'limit': 5000, 'remaining': 4999, 'resetAt': '2020-09-13T12:36:40Z'}
+
+
+@pytest.fixture
+def cassette_path(tmpdir, mocker):
+    cassette_path = str(tmpdir.join('cassettes', 'board.json'))
+    client = GraphQLClient(api_key='test', record_path=cassette_path)
+    assert isinstance(client.client.transport, RecordingTransport)
+    mocker.patch.object(client.client.transport.transport, 'connect')
+    mocker.patch.object(client.client.transport.transport, 'close')
+    mocker.patch.object(client.client.transport.transport, 'execute', side_effect=[
+        ExecutionResult(data={'repository': {'issue': {'number': 1}}, 'rateLimit': RATE_LIMIT}),
+        ExecutionResult(data={'repository': {'issue': {'number': 2}}, 'rateLimit': RATE_LIMIT}),
+        ExecutionResult(data={'repository': {'issue': {'number': 2, 'title': 'changed'}}, 'rateLimit': RATE_LIMIT}),
+    ])
+    with client:
+        client.get_issue('owner', 'name', 1)
+        client.get_issue('owner', 'name', 2)
+        client.get_issue('owner', 'name', 2)
+
+    return cassette_path
+
+
+def test_recording_requests(cassette_path):
+    with open(cassette_path) as cassette_file:
+        cassette = json.load(cassette_file)
+
+    assert [interaction['variables']['issueNumber'] for interaction in cassette['interactions']] == [1, 2, 2]
+    assert cassette['interactions'][0]['result']['data']['rateLimit'] == RATE_LIMIT
+
+
+def test_replaying_requests(cassette_path, mocker):
+    sleep = mocker.patch('github_automation.management.cassette.time.sleep')
+    client = GraphQLClient(api_key='test', replay_path=cassette_path, replay_latency=0.1)
+    assert isinstance(client.client.transport, ReplayTransport)
+
+    assert client.get_issue('owner', 'name', 2) == {'repository': {'issue': {'number': 2}}}
+    assert client.get_issue('owner', 'name', 2) == {'repository': {'issue': {'number': 2, 'title': 'changed'}}}
+    assert client.get_issue('owner', 'name', 2) == {'repository': {'issue': {'number': 2, 'title': 'changed'}}}
+    assert client.get_issue('owner', 'name', 1) == {'repository': {'issue': {'number': 1}}}
+    assert [call.args[0] for call in sleep.call_args_list if call.args[0]] == [0.1] * 4
+
+    with pytest.raises(ValueError) as exception:
+        client.get_issue('owner', 'name', 3)
+
+    assert 'has no recorded result' in str(exception.value)
+
+
+def test_replaying_requests_async(cassette_path):
+    async def get_issues():
+        async with AsyncGraphQLClient(api_key='test', replay_path=cassette_path) as client:
+            return await asyncio.gather(client.get_issue('owner', 'name', 1), client.get_issue('owner', 'name', 2))
+
+    assert asyncio.run(get_issues()) == [{'repository': {'issue': {'number': 1}}},
+                                         {'repository': {'issue': {'number': 2}}}]
+
+
+def test_recording_while_replaying(cassette_path, tmpdir):
+    with pytest.raises(ValueError):
+        GraphQLClient(api_key='test', replay_path=cassette_path, record_path=str(tmpdir.join('other.json')))
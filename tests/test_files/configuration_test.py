@@ -36,6 +36,10 @@ def test_loading_configuration():
     assert configuration.column_to_rules['Waiting for Docs']['issue.pull_request.assignees'] == ['ronykoz||not rony']
     assert configuration.column_to_rules['In progress']['pull_request.review_requested'] is False
 
+    assert 'issue.pull_request.review_requested' in configuration.get_query_fields()
+    configuration.add = configuration.move = False
+    assert configuration.get_query_fields() == frozenset()  # the items are not matched to columns
+
 
 def test_loading_illegal_configuration():
     configuration = Configuration(os.path.join(MOCK_FOLDER_PATH, 'illegal_conf.ini'))
@@ -59,3 +63,44 @@ def test_loading_illegal_configuration():
         configuration.load_properties()
         assert 'Provided illegal key' in exception
         assert 'in General section' in exception
+
+
+def test_loading_fetch_mode(tmpdir):
+    conf_path = tmpdir.join('conf.ini')
+    conf_path.write('[General]\nfetch_mode = search\n')
+    configuration = Configuration(str(conf_path), quiet=True)
+    configuration.load_general_properties()
+    assert configuration.fetch_mode == 'search'
+
+    conf_path.write('[General]\nfetch_mode = scan\n')
+    configuration = Configuration(str(conf_path), quiet=True)
+    with pytest.raises(ValueError) as exception:
+        configuration.load_general_properties()
+
+    assert 'Provided illegal fetch_mode - scan' in str(exception.value)
+
+
+def test_loading_filter_milestone(tmpdir):
+    conf_path = tmpdir.join('conf.ini')
+    for milestone in ['3', '*', 'none']:
+        conf_path.write(f'[General]\nfilter_milestone = {milestone}\n')
+        configuration = Configuration(str(conf_path), quiet=True)
+        configuration.load_general_properties()
+        assert configuration.filter_milestone == milestone
+
+    conf_path.write('[General]\nfilter_milestone = Sprint 1\n')
+    configuration = Configuration(str(conf_path), quiet=True)
+    with pytest.raises(ValueError) as exception:
+        configuration.load_general_properties()
+
+    assert 'Provided illegal filter_milestone - Sprint 1' in str(exception.value)
+
+
+def test_column_rule_table_is_compiled_again_once_the_rules_change():
+    configuration = Configuration(os.path.join(MOCK_FOLDER_PATH, 'conf.ini'), quiet=True)
+    configuration.load_properties()
+    column_rule_table = configuration.get_column_rule_table()
+    assert configuration.get_column_rule_table() is column_rule_table
+
+    configuration.column_to_rules['Queue']['issue.milestone'] = '1'
+    assert configuration.get_column_rule_table() is not column_rule_table
@@ -1,3 +1,4 @@
+import asyncio
 import json
 import os
 import sys
@@ -292,97 +293,6 @@ def test_loading_event_manager_with_pull_request():
     assert pr_object.title == title
 
 
-def test_get_prev_column_repo_project():
-    event = {
-        "action": "some action",
-        "issue": {
-            "number": 1
-        }
-    }
-
-    project_layout = {
-        "repository": {
-            "project": {
-                "columns": {
-                    "edges": [
-                        {
-                            "cursor": 1,
-                            "node": {
-                                "name": "Queue"
-                            }
-                        },
-                        {
-                            "cursor": 2,
-                            "node": {
-                                "name": "In progress"
-                            }
-                        }
-                    ]
-                }
-            }
-        }
-    }
-
-    class MockClient(object):
-        def get_project_layout(*args, **kwargs):
-            return project_layout
-
-    client = MockClient()
-    manager = EventManager(os.path.join(MOCK_FOLDER_PATH, 'conf.ini'), client=client,
-                           event=json.dumps(event))
-    manager.config = Configuration(os.path.join(MOCK_FOLDER_PATH, 'conf.ini'))
-    manager.config.load_properties()
-
-    assert manager.get_prev_column_cursor("Queue") == ""
-    assert manager.get_prev_column_cursor("In progress") == 1
-
-
-def test_get_prev_column_org_project():
-    event = {
-        "action": "some action",
-        "issue": {
-            "number": 1
-        }
-    }
-
-    project_layout = {
-        "organization": {
-            "project": {
-                "columns": {
-                    "edges": [
-                        {
-                            "cursor": 1,
-                            "node": {
-                                "name": "Queue"
-                            }
-                        },
-                        {
-                            "cursor": 2,
-                            "node": {
-                                "name": "In progress"
-                            }
-                        }
-                    ]
-                }
-            }
-        }
-    }
-
-    class MockClient(object):
-        def get_project_layout(*args, **kwargs):
-            return project_layout
-
-    client = MockClient()
-    manager = EventManager(os.path.join(MOCK_FOLDER_PATH, 'conf.ini'), client=client,
-                           event=json.dumps(event))
-    manager.config = Configuration(os.path.join(MOCK_FOLDER_PATH, 'conf.ini'))
-    manager.config.load_properties()
-    manager.config.is_org_project = True
-
-    assert manager.get_prev_column_cursor("Queue") == ""
-    assert manager.get_prev_column_cursor("In progress") == 1
-
-
 def test_load_repo_project_column():
     event = {
         "action": "some action",
@@ -1408,3 +1318,47 @@ def test_loading_event_manager_with_merged_pull_request():
     assert manager.run() is None
     assert 'The item is merged' in out.getvalue()
     sys.stdout = saved_stdout
+
+
+def test_event_manager_flow_async():
+    issue = {
+        "id": "issue=",
+        "number": 1,
+        "title": "issue 1",
+        "labels": {"edges": [{"node": {"name": "bug"}}, {"node": {"name": "test"}}, {"node": {"name": "Testing"}}]},
+        "assignees": {"edges": [{"node": {"id": "1", "login": "ronykoz"}}]}
+    }
+    calls = []
+
+    class AsyncMockClient(object):
+        async def get_issue(self, *args):
+            return {"repository": {"issue": issue}}
+
+        async def get_project_layout(self, **kwargs):
+            calls.append(('load layout', kwargs['project_number']))
+            return {"repository": {"project": {"name": "test", "columns": {"edges": [
+                {"cursor": 1, "node": {"name": "Queue"}},
+                {"cursor": 2, "node": {"name": "In progress"}}
+            ]}}}}
+
+        async def get_column_items(self, **kwargs):
+            calls.append(('load column', kwargs['prev_column_id']))
+            return {"repository": {"project": {"columns": {"nodes": [{
+                "name": "In progress",
+                "id": "in progress=",
+                "cards": {"pageInfo": {"hasNextPage": False}, "edges": []}
+            }]}}}}
+
+        async def add_items_to_project(self, item_id, column_id):
+            calls.append(('add', item_id, column_id))
+            return {"addProjectCard": {"cardEdge": {"node": {"id": "card="}}}}
+
+        async def add_to_column(self, card_id, column_id):
+            calls.append(('move', card_id, column_id))
+
+    manager = EventManager(os.path.join(MOCK_FOLDER_PATH, 'conf.ini'), client=AsyncMockClient(),
+                           event=json.dumps({"issue": {"number": 1}}))
+    asyncio.run(manager.run_async())
+    # only the layout and the cards of the matching column are loaded, not the whole board
+    assert calls == [('load layout', 1), ('load column', 1), ('add', 'issue=', 'in progress='),
+                     ('move', 'card=', 'in progress=')]
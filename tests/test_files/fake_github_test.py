@@ -0,0 +1,149 @@
+from __future__ import absolute_import
+
+import os
+
+import pytest
+from click.testing import CliRunner
+from github_automation.cli.main import main
+from github_automation.common.constants import BASE_URL_ENV_VARIABLE, SCHEMA_PATH_ENV_VARIABLE
+from github_automation.fake_github.model import generate_board
+from github_automation.fake_github.server import FakeGitHubServer, RateLimit
+from github_automation.management.configuration import Configuration
+from github_automation.management.github_client import GraphQLClient, get_schema_path
+from github_automation.management.project_manager import ProjectManager
+
+MOCK_FOLDER_PATH = os.path.join(os.getcwd(), "tests", "mock_data")
+
+
+def get_board_state(project):
+    return {column.name: [card.id for card in column.card_list] for column in project.column_list}
+
+
+def test_managing_fake_board():
+    config = Configuration(os.path.join(MOCK_FOLDER_PATH, 'conf.ini'), quiet=True)
+    config.load_properties()
+    github, project = generate_board(owner='ronykoz', repository_name='test', column_names=config.column_names,
+                                     issues=250, pull_requests=40, cards=120,
+                                     labels=['bug', 'test', 'not test', 'Testing', 'High'])
+    with FakeGitHubServer(github) as server:
+        client = GraphQLClient(api_key='test', base_url=server.url)
+        ProjectManager(configuration=config, client=client).manage()
+        board_state = get_board_state(project)
+
+        ProjectManager(configuration=config, client=client).manage()
+        assert get_board_state(project) == board_state  # the board was already in place after the first run
+
+    for column in project.column_list:
+        for card in column.card_list:
+            labels = [label.name for label in card.content.label_list]
+            assert 'bug' in labels and 'test' in labels and 'not test' not in labels
+
+
+@pytest.mark.parametrize('filter_milestone', ['', '2', '*', 'none'])
+def test_search_fetch_mode_manages_the_same_board(filter_milestone):
+    board_states = []
+    for fetch_mode in ['list', 'search']:
+        config = Configuration(os.path.join(MOCK_FOLDER_PATH, 'conf.ini'), quiet=True)
+        config.load_properties()
+        config.fetch_mode = fetch_mode
+        config.filter_milestone = filter_milestone
+        github, project = generate_board(owner='ronykoz', repository_name='test', column_names=config.column_names,
+                                         issues=150, pull_requests=40, cards=60,
+                                         labels=['bug', 'test', 'not test', 'Testing', 'High'])
+        with FakeGitHubServer(github) as server:
+            ProjectManager(configuration=config, client=GraphQLClient(api_key='test', base_url=server.url)).manage()
+
+        board_states.append({column.name: [card.content.number for card in column.card_list]
+                             for column in project.column_list})
+
+    assert board_states[0] == board_states[1]
+
+
+def test_fake_server_errors_are_retried():
+    github, _ = generate_board(issues=1, pull_requests=0)
+    with FakeGitHubServer(github, error_rate=0.3, secondary_rate_limit_rate=0.3, retry_after=0, seed=1) as server:
+        client = GraphQLClient(api_key='test', base_url=server.url)
+        client.retry_policy.base_delay = 0.01
+        for _ in range(5):
+            assert client.get_issue('owner', 'repository', 1)['repository']['issue']['number'] == 1
+
+    assert client.retry_policy.metrics['server error retries'] > 0
+    assert client.retry_policy.metrics['secondary rate limit retries'] > 0
+
+
+def test_fake_server_rate_limit():
+    github, _ = generate_board(issues=1, pull_requests=0)
+    with FakeGitHubServer(github, rate_limit=RateLimit(limit=2, window=1)) as server:
+        client = GraphQLClient(api_key='test', base_url=server.url)
+        for _ in range(3):  # the last query waits for the rate limit to reset
+            assert client.get_issue('owner', 'repository', 1)['repository']['issue']['number'] == 1
+
+        assert server.request_count == 3
+
+
+def test_fake_server_mutation_errors():
+    github, project = generate_board(issues=1, pull_requests=0)
+    issue = github.repositories[('owner', 'repository')].issue_list[0]
+    card = issue.card_list[0]
+    with FakeGitHubServer(github) as server:
+        client = GraphQLClient(api_key='test', base_url=server.url)
+        with pytest.raises(Exception) as exception:
+            client.add_items_to_project(issue.id, project.column_list[1].id)
+
+        assert 'Project already has the associated issue' in str(exception.value)
+
+        client.add_to_column(card.id, project.column_list[1].id)
+        assert card.column is project.column_list[1]
+        assert project.column_list[1].card_list[0] is card
+
+
+def test_managing_boards_in_workers(tmpdir, monkeypatch):
+    conf_paths = []
+    github = None
+    projects = []
+    for repository_name in ['test', 'other']:
+        with open(os.path.join(MOCK_FOLDER_PATH, 'conf.ini'), 'r') as conf_file:
+            conf = conf_file.read().replace('repository_name = test', f'repository_name = {repository_name}')
+
+        conf_path = tmpdir.join(f'{repository_name}.ini')
+        conf_path.write(conf)
+        conf_paths.append(str(conf_path))
+        github, project = generate_board(github, owner='ronykoz', repository_name=repository_name,
+                                         column_names=['Queue', 'In progress', 'Review in progress',
+                                                       'Waiting for Docs'],
+                                         issues=60, pull_requests=10, cards=20,
+                                         labels=['bug', 'test', 'not test', 'Testing', 'High'])
+        projects.append(project)
+
+    with FakeGitHubServer(github) as server:
+        monkeypatch.setenv(BASE_URL_ENV_VARIABLE, server.url)
+        result = CliRunner().invoke(main, ['manage', '-c', ','.join(conf_paths), '--workers', '2'])
+
+    assert result.exit_code == 0, result.output
+    for conf_path in conf_paths:
+        assert f'Starting going over the board {conf_path}' in result.output
+
+    for project in projects:
+        for column in project.column_list:
+            for card in column.card_list:
+                labels = [label.name for label in card.content.label_list]
+                assert 'bug' in labels and 'test' in labels and 'not test' not in labels
+
+
+def test_refreshing_invalid_schema(tmpdir, monkeypatch, mocker):
+    schema_path = tmpdir.join('schema.graphql')
+    schema_path.write('type Query {\n  viewer: String\n}\n')
+    monkeypatch.setenv(SCHEMA_PATH_ENV_VARIABLE, str(schema_path))
+    with pytest.raises(ValueError):
+        GraphQLClient(api_key='test')
+
+    with FakeGitHubServer() as server:
+        monkeypatch.setenv(BASE_URL_ENV_VARIABLE, server.url)
+        close = mocker.spy(GraphQLClient, 'close')
+        result = CliRunner().invoke(main, ['refresh-schema'])
+
+    assert result.exit_code == 0, result.output
+    assert close.call_count == 1  # the connection pool of the client is closed
+    assert get_schema_path() == str(schema_path)
+    client = GraphQLClient(api_key='test')
+    assert 'moveProjectCard' in client.schema.mutation_type.fields
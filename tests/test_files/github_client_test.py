@@ -0,0 +1,376 @@
+from __future__ import absolute_import
+
+import asyncio
+
+import pytest
+from gql.transport.exceptions import TransportQueryError
+from graphql import ExecutionResult, get_introspection_query, graphql_sync, print_ast
+from github_automation.management.github_client import (BUNDLED_SCHEMA_PATH,
+                                                        AsyncGraphQLClient,
+                                                        GitHubHTTPError,
+                                                        GraphQLClient,
+                                                        RateLimiter,
+                                                        RateLimitExceeded,
+                                                        RetryPolicy,
+                                                        get_mutation_batcher,
+                                                        get_schema_path,
+                                                        get_shared_client)
+from github_automation.management.queries import QUERY_REGISTRY, get_project_operation
+
+
+@pytest.fixture
+def client(mocker):
+    client = GraphQLClient(api_key='test', schema_path='/not/existing/schema.graphql')
+    mocker.patch.object(client.client.transport, 'execute', return_value=ExecutionResult(data={}))
+    return client
+
+
+def test_loading_bundled_schema(client):
+    assert get_schema_path('/not/existing/schema.graphql') == BUNDLED_SCHEMA_PATH
+    assert client.schema is not None
+    assert client.client.fetch_schema_from_transport is False
+
+
+def test_loading_cached_schema(tmpdir):
+    schema_path = tmpdir.join('schema.graphql')
+    with open(BUNDLED_SCHEMA_PATH) as bundled_schema:
+        schema_path.write(bundled_schema.read() + '\ntype CachedOnly {\n  id: ID!\n}\n')
+    assert get_schema_path(str(schema_path)) == str(schema_path)
+
+    client = GraphQLClient(api_key='test', schema_path=str(schema_path))
+    assert 'CachedOnly' in client.schema.type_map
+
+
+def test_loading_schema_not_matching_queries(tmpdir):
+    schema_path = tmpdir.join('schema.graphql')
+    schema_path.write('type Query {\n  viewer: String\n}\n')
+    with pytest.raises(ValueError) as exception:
+        GraphQLClient(api_key='test', schema_path=str(schema_path))
+
+    assert 'does not match the GitHub schema' in str(exception.value)
+
+
+def test_query_registry():
+    assert QUERY_REGISTRY.get('issues') is QUERY_REGISTRY.get('issues')
+    assert get_project_operation('column_items', is_org_project=True) == 'org_column_items'
+    assert get_project_operation('column_items') == 'column_items'
+
+
+def test_minimal_queries(client):
+    label_rules = frozenset(['issue.labels', 'pull_request.labels'])
+    for operation in ['issues', 'issue', 'column_items', 'org_first_column_items']:
+        print_document = print_ast(QUERY_REGISTRY.get(operation, label_rules))
+        for field in ['timelineItems', 'assignees', 'reviews', 'reviewRequests', 'reviewDecision']:
+            assert field not in print_document
+        assert 'labels' in print_document
+
+    assert QUERY_REGISTRY.get('issue', label_rules) is QUERY_REGISTRY.get('issue', set(label_rules))
+
+    print_document = print_ast(QUERY_REGISTRY.get('issue', ['issue.pull_request.review_requested']))
+    assert 'reviewRequests' in print_document and 'reviewDecision' not in print_document
+    assert 'timelineItems' in print_document and 'assignees' not in print_document
+
+    client.get_issue('owner', 'name', 1, fields=label_rules)
+    assert 'timelineItems' not in print_ast(client.client.transport.execute.call_args.args[0])
+
+
+@pytest.mark.parametrize('is_org_project', [True, False])
+def test_queries_match_schema(client, is_org_project):
+    client.get_github_issues('owner', 'name', after='cursor', labels=['bug'], milestone='1')
+    client.get_github_issues('owner', 'name', after=None, labels=[], milestone=None)
+    client.get_github_pull_requests('owner', 'name', after=None)
+    client.search_issues('repo:owner/name is:issue is:open label:"bug"', after='cursor')
+    client.search_pull_requests('repo:owner/name is:pr is:open -label:"bug"')
+    client.get_issue('owner', 'name', 1)
+    client.get_pull_request('owner', 'name', 1)
+    client.get_project_layout('owner', 'name', 1, is_org_project=is_org_project)
+    client.get_first_column_items('owner', 'name', 1, is_org_project=is_org_project)
+    client.get_column_items('owner', 'name', 1, 'cursor', is_org_project=is_org_project)
+    client.get_board_items('owner', 'name', 1, is_org_project=is_org_project)
+    client.add_items_to_project('issue', 'column')
+    client.add_to_column('card', 'column')
+    client.move_to_specific_place_in_column('card', 'column', 'after card')
+    client.delete_project_card('card')
+    client.un_archive_card('card')
+
+    assert client.client.transport.execute.call_count == 16
+
+
+def test_milestone_filter_is_sent_by_number(client):
+    # the milestone filter of GitHub takes the database id of the milestone, its number is sent as milestoneNumber
+    for milestone, filter_by in [('2', {'milestoneNumber': '2'}), ('none', {'milestoneNumber': 'none'}),
+                                 ('*', {'milestone': '*'})]:
+        client.get_github_issues('owner', 'name', after=None, labels=[], milestone=milestone)
+        assert client.client.transport.execute.call_args.kwargs['variable_values'] == dict(
+            {'owner': 'owner', 'name': 'name'}, **filter_by)
+
+
+def test_refresh_schema(mocker, tmpdir):
+    client = GraphQLClient(api_key='test')
+    introspection = graphql_sync(client.schema, get_introspection_query()).data
+    mocker.patch.object(client.client.transport, 'execute', return_value=ExecutionResult(data=introspection))
+
+    schema_path = client.refresh_schema(str(tmpdir.join('cache', 'schema.graphql')))
+    assert get_schema_path(schema_path) == schema_path
+
+    cached_client = GraphQLClient(api_key='test', schema_path=schema_path)
+    assert 'moveProjectCard' in cached_client.schema.mutation_type.fields
+
+
+def test_connection_is_kept_between_queries(client):
+    client.get_issue('owner', 'name', 1)
+    session = client.session
+    transport_session = client.client.transport.session
+    client.get_pull_request('owner', 'name', 1)
+
+    assert client.session is session
+    assert client.client.transport.session is transport_session
+    assert transport_session.get_adapter('https://api.github.com').poolmanager.connection_pool_kw['maxsize'] == 10
+
+    client.close()
+    assert client.session is None
+    assert client.client.transport.session is None
+
+
+def test_shared_client():
+    client = get_shared_client('token', pool_size=5)
+    assert get_shared_client('token', pool_size=5) is client
+    assert get_shared_client('other token', pool_size=5) is not client
+    assert client.client.transport.pool_size == 5
+
+    # a client with other arguments is not shared with the ones which were created before it
+    other_client = get_shared_client('token', pool_size=5, base_url='https://github.example.com/api')
+    assert other_client is not client
+    assert other_client.base_url == 'https://github.example.com/api'
+    assert get_shared_client('token', pool_size=5, max_retries=1).retry_policy.max_retries == 1
+
+
+def test_async_client_limits_concurrent_requests(mocker):
+    client = AsyncGraphQLClient(api_key='test', pool_size=2)
+    in_flight = []
+
+    async def execute(*args, **kwargs):
+        in_flight.append(1)
+        max_in_flight.append(len(in_flight))
+        await asyncio.sleep(0.01)
+        in_flight.pop()
+        return ExecutionResult(data={})
+
+    max_in_flight = []
+    mocker.patch.object(client.client.transport, 'execute', side_effect=execute)
+
+    async def run_queries():
+        async with client:
+            return await asyncio.gather(*[client.get_issue('owner', 'name', number) for number in range(5)])
+
+    assert asyncio.run(run_queries()) == [{}] * 5
+    assert max(max_in_flight) == 2
+    assert client.session is None
+
+
+def test_mutation_batcher(client):
+    def execute(document, variable_values=None):
+        print_document = print_ast(document)
+        assert print_document.count('moveProjectCard') + print_document.count('deleteProjectCard') == \
+            len(variable_values)
+        data = {alias: {'cardEdge': {'node': {'id': mutation_input['cardId']}}}
+                for alias, mutation_input in zip(['mutation0', 'mutation1'], variable_values.values())}
+        if variable_values['input0']['cardId'] == 'card3':
+            data['mutation1'] = None
+            return ExecutionResult(data=data, errors=[{'message': 'Could not resolve to a node',
+                                                       'path': ['mutation1']}])
+
+        return ExecutionResult(data=data)
+
+    client.client.transport.execute.side_effect = execute
+    client.batch_size = 2
+    moved_cards = []
+    errors = []
+    with client.mutation_batcher() as batcher:
+        for card_id in ['card1', 'card2', 'card3']:
+            batcher.move_to_specific_place_in_column(
+                card_id, 'column', 'after card',
+                on_success=lambda result: moved_cards.append(result['moveProjectCard']['cardEdge']['node']['id']))
+        assert client.client.transport.execute.call_count == 1  # The first batch is sent once it is full
+
+        batcher.delete_project_card('card4', on_error=errors.append)
+
+    assert client.client.transport.execute.call_count == 2
+    assert moved_cards == ['card1', 'card2', 'card3']
+    assert errors == ['Could not resolve to a node']
+
+
+def test_mutation_batcher_aborts_when_rate_limit_is_exhausted(client, mocker):
+    mocker.patch.object(client.rate_limiter, 'reserve', side_effect=RateLimitExceeded('exhausted'))
+    errors = []
+    batcher = client.mutation_batcher()
+    with pytest.raises(RateLimitExceeded):
+        with batcher:
+            batcher.delete_project_card('card1', on_error=errors.append)
+            batcher.delete_project_card('card2', on_error=errors.append)
+
+    assert errors == []
+    assert batcher.pending_mutations == []
+    assert client.client.transport.execute.call_count == 0
+
+    class MockClient(object):
+        def delete_project_card(self, card_id):
+            raise RateLimitExceeded('exhausted')
+
+    with pytest.raises(RateLimitExceeded):
+        with get_mutation_batcher(MockClient()) as batcher:
+            batcher.delete_project_card('card', on_error=errors.append)
+
+    assert errors == []
+
+
+def test_immediate_mutations():
+    class MockClient(object):
+        def add_to_column(self, card_id, column_id):
+            raise Exception('failed')
+
+        def delete_project_card(self, card_id):
+            return {'deleteProjectCard': {'deletedCardId': card_id}}
+
+    results = []
+    with get_mutation_batcher(MockClient()) as batcher:
+        batcher.add_to_column('card', 'column', on_error=results.append)
+        batcher.delete_project_card('card', on_success=results.append)
+        assert results == ['failed', {'deleteProjectCard': {'deletedCardId': 'card'}}]
+
+
+def test_rate_limiter_paces_requests():
+    now = [1600000000]
+    rate_limiter = RateLimiter(max_wait=600, clock=lambda: now[0])
+    assert rate_limiter.reserve() == 0  # the budget is unknown before the first result
+
+    # 1600000600 is 2020-09-13T12:36:40Z
+    rate_limiter.update({'cost': 1, 'limit': 5000, 'remaining': 1000, 'resetAt': '2020-09-13T12:36:40Z'})
+    assert rate_limiter.reserve() == 0
+
+    rate_limiter.update({'cost': 2, 'limit': 5000, 'remaining': 300, 'resetAt': '2020-09-13T12:36:40Z'})
+    assert rate_limiter.reserve() == 4  # 150 requests are left for the 600 seconds until the reset
+    assert rate_limiter.reserve() == 4 + 596 * 2 / 298  # the requests are spread one after the other
+
+    rate_limiter.update({'cost': 2, 'limit': 5000, 'remaining': 1, 'resetAt': '2020-09-13T12:36:40Z'})
+    assert rate_limiter.reserve() == 600
+    now[0] = 1600000600
+    assert rate_limiter.reserve() == 0
+
+    rate_limiter.update({'cost': 1, 'limit': 5000, 'remaining': 0, 'resetAt': '2020-09-13T13:36:40Z'})
+    with pytest.raises(RateLimitExceeded):
+        rate_limiter.reserve()
+
+    # before any result told the reset time, it is taken from the headers of the rejected response
+    rate_limiter = RateLimiter(max_wait=600, clock=lambda: now[0])
+    with pytest.raises(RateLimitExceeded):
+        rate_limiter.exhaust()
+
+    rate_limiter.exhaust(reset_at=now[0] + 300)
+    assert rate_limiter.reserve() == 300
+    rate_limiter = RateLimiter(max_wait=600, clock=lambda: now[0])
+    rate_limiter.exhaust(retry_after=60)
+    assert rate_limiter.reserve() == 60
+
+    # the budget is shared by the clients of 3 processes, so every one of them sends a third of the requests
+    rate_limiter = RateLimiter(max_wait=600, clock=lambda: now[0], shares=3)
+    rate_limiter.update({'cost': 2, 'limit': 5000, 'remaining': 300, 'resetAt': '2020-09-13T13:36:40Z'})
+    assert rate_limiter.reserve() == 72  # 50 requests of each process for the 3600 seconds until the reset
+
+
+def test_rate_limit_is_read_from_queries(client, mocker):
+    now = [1600000000]
+    sleep = mocker.patch('github_automation.management.github_client.time.sleep',
+                         side_effect=lambda seconds: now.__setitem__(0, now[0] + seconds))
+    client.rate_limiter.clock = lambda: now[0]
+    rate_limit = {'cost': 1, 'limit': 5000, 'remaining': 4000, 'resetAt': '2020-09-13T12:36:40Z'}
+    client.client.transport.execute.side_effect = [
+        ExecutionResult(data={'repository': {}, 'rateLimit': rate_limit}),
+        ExecutionResult(errors=[{'message': 'API rate limit exceeded for user ID 1.'}]),
+        ExecutionResult(data={'repository': {}}),
+        ExecutionResult(errors=[{'message': 'API rate limit exceeded for user ID 1.'}]),
+    ]
+
+    assert client.get_issue('owner', 'name', 1) == {'repository': {}}
+    assert client.get_issue('owner', 'name', 2) == {'repository': {}}  # sent again once the rate limit was reset
+    assert [call.args[0] for call in sleep.call_args_list] == [0, 0, 0, 600]
+
+    with pytest.raises(RateLimitExceeded):  # the rate limit was not reset as expected
+        client.get_issue('owner', 'name', 3)
+
+
+def test_rate_limit_is_read_from_rejected_response_headers(client, mocker):
+    now = [1600000000]
+    sleep = mocker.patch('github_automation.management.github_client.time.sleep',
+                         side_effect=lambda seconds: now.__setitem__(0, now[0] + seconds))
+    client.rate_limiter.clock = lambda: now[0]
+    client.client.transport.execute.side_effect = [
+        GitHubHTTPError(403, 'API rate limit exceeded for user ID 1.', rate_limit_reset=str(now[0] + 120)),
+        ExecutionResult(data={'repository': {}}),
+    ]
+
+    assert client.get_issue('owner', 'name', 1) == {'repository': {}}  # the first response was rejected
+    assert [call.args[0] for call in sleep.call_args_list] == [0, 0, 120]
+
+
+def test_retry_policy():
+    retry_policy = RetryPolicy(max_retries=2, base_delay=1, max_delay=3, random_fraction=lambda: 0.5)
+    assert retry_policy.get_delay(GitHubHTTPError(502, 'Bad Gateway'), 0) == 0.5
+    assert retry_policy.get_delay(GitHubHTTPError(504, 'Gateway Timeout'), 1) == 1
+    assert retry_policy.get_delay(GitHubHTTPError(504, 'Gateway Timeout'), 2) is None
+    assert retry_policy.get_delay(GitHubHTTPError(403, 'You have exceeded a secondary rate limit', '30'), 0) == 30
+    assert retry_policy.get_delay(GitHubHTTPError(403, 'You have exceeded a secondary rate limit'), 0) == 60
+    assert retry_policy.get_delay(TransportQueryError('Something went wrong while executing your query'), 0) == 0.5
+    assert retry_policy.get_delay(ConnectionResetError(), 0) == 0.5
+    assert retry_policy.get_delay(GitHubHTTPError(401, 'Bad credentials'), 0) is None
+    assert retry_policy.get_delay(TransportQueryError('Could not resolve to a node'), 0) is None
+
+    assert retry_policy.metrics == {'server error retries': 2, 'server error give-ups': 1,
+                                    'secondary rate limit retries': 2, 'query timeout retries': 1,
+                                    'connection error retries': 1}
+
+    # requests which are not idempotent are only retried when they were not executed
+    assert retry_policy.get_delay(GitHubHTTPError(502, 'Bad Gateway'), 0, idempotent=False) is None
+    assert retry_policy.get_delay(ConnectionResetError(), 0, idempotent=False) is None
+    assert retry_policy.get_delay(GitHubHTTPError(403, 'You have exceeded a secondary rate limit', '30'), 0,
+                                  idempotent=False) == 30
+
+
+def test_batches_which_add_cards_are_not_sent_again(client, mocker):
+    mocker.patch('github_automation.management.github_client.time.sleep')
+    client.client.transport.execute.side_effect = [
+        GitHubHTTPError(502, 'Bad Gateway'),
+        GitHubHTTPError(502, 'Bad Gateway'),
+        ExecutionResult(data={'mutation0': {'cardEdge': {'node': {'id': 'card'}}}}),
+    ]
+    errors = []
+    with client.mutation_batcher() as batcher:
+        batcher.add_items_to_project('issue', 'column', on_error=errors.append)
+
+    assert client.client.transport.execute.call_count == 1  # the card may have been added before the error
+    assert errors == ['502 Bad Gateway']
+
+    moved_cards = []
+    with client.mutation_batcher() as batcher:
+        batcher.add_to_column('card', 'column', on_success=moved_cards.append)
+
+    assert client.client.transport.execute.call_count == 3  # moving the card again has the same effect
+    assert moved_cards == [{'moveProjectCard': {'cardEdge': {'node': {'id': 'card'}}}}]
+
+
+def test_transient_errors_are_retried(client, mocker):
+    sleep = mocker.patch('github_automation.management.github_client.time.sleep')
+    client.retry_policy.random_fraction = lambda: 1
+    client.client.transport.execute.side_effect = [
+        GitHubHTTPError(502, 'Bad Gateway'),
+        GitHubHTTPError(403, 'You have exceeded a secondary rate limit', '5'),
+        ExecutionResult(errors=[{'message': 'Something went wrong while executing your query.'}]),
+        ExecutionResult(data={'repository': {}}),
+        GitHubHTTPError(401, 'Bad credentials'),
+    ]
+
+    assert client.get_issue('owner', 'name', 1) == {'repository': {}}
+    assert [call.args[0] for call in sleep.call_args_list if call.args[0]] == [1, 5, 4]
+
+    with pytest.raises(GitHubHTTPError):
+        client.get_issue('owner', 'name', 1)
@@ -1,11 +1,30 @@
+import asyncio
 import os
+import threading
+from copy import deepcopy
+
+import pytest
 
 from github_automation.management.configuration import Configuration
-from github_automation.management.project_manager import ProjectManager
+from github_automation.management.project_manager import ProjectManager, get_shared_repository_items
 
 MOCK_FOLDER_PATH = os.path.join(os.getcwd(), "tests", "mock_data")
 
 
+def get_board_items(project_layout, *column_responses):
+    """Merge the responses of the layout and of the single column queries into the response of a board query"""
+    owner = next(iter(project_layout))
+    column_edges = project_layout[owner]['project']['columns']['edges']
+    column_nodes = [column_node for column_response in column_responses
+                    for column_node in column_response[owner]['project']['columns']['nodes']]
+    board_items = deepcopy(column_responses[0])
+    board_items[owner]['project']['columns'] = {
+        'edges': [{'cursor': column_edge['cursor'], 'node': deepcopy(column_node)}
+                  for column_edge, column_node in zip(column_edges, column_nodes)]
+    }
+    return board_items
+
+
 def test_loading_repo_project():
     project_layout = {
         "repository": {
@@ -481,14 +500,8 @@ def test_loading_repo_project():
                 }
             }
 
-        def get_project_layout(self, **kwargs):
-            return project_layout
-
-        def get_first_column_items(self, **kwargs):
-            return column1
-
-        def get_column_items(self, **kwargs):
-            return column2
+        def get_board_items(self, **kwargs):
+            return get_board_items(project_layout, column1, column2)
 
         def get_github_issues(self, **kwargs):
             if not kwargs['after']:
@@ -1030,14 +1043,8 @@ def test_loading_org_project():
                 }
             }
 
-        def get_project_layout(self, **kwargs):
-            return org_project_layout
-
-        def get_first_column_items(self, **kwargs):
-            return column1
-
-        def get_column_items(self, **kwargs):
-            return column2
+        def get_board_items(self, **kwargs):
+            return get_board_items(org_project_layout, column1, column2)
 
         def get_github_issues(self, **kwargs):
             if not kwargs['after']:
@@ -1101,3 +1108,307 @@ def test_loading_org_project():
 
     manager.manage()
     assert manager.project.is_in_column("In progress", "56565=") is False
+
+
+def test_manage_async():
+    def column(name, column_id, cards):
+        return {
+            "repository": {
+                "project": {
+                    "name": "test",
+                    "columns": {
+                        "nodes": [
+                            {
+                                "name": name,
+                                "id": column_id,
+                                "cards": {
+                                    "pageInfo": {
+                                        "hasNextPage": False,
+                                        "endCursor": "MQ"
+                                    },
+                                    "edges": cards
+                                }
+                            }
+                        ]
+                    }
+                }
+            }
+        }
+
+    card_to_remove = {
+        "cursor": "MQ",
+        "node": {
+            "id": "card1=",
+            "content": {
+                "__typename": "Issue",
+                "id": "issue1=",
+                "number": 1,
+                "title": "issue 1",
+                "labels": {"edges": [{"node": {"name": "bug"}}]},
+                "assignees": {"edges": []}
+            }
+        }
+    }
+    issue_to_add = {
+        "id": "issue2=",
+        "number": 2,
+        "title": "issue 2",
+        "labels": {"edges": [{"node": {"name": "bug"}}, {"node": {"name": "test"}}, {"node": {"name": "Testing"}}]},
+        "assignees": {"edges": [{"node": {"id": "1", "login": "ronykoz"}}]}
+    }
+
+    config = Configuration(os.path.join(MOCK_FOLDER_PATH, 'conf.ini'))
+    config.load_properties()
+    calls = []
+
+    class AsyncMockClient(object):
+        async def get_board_items(self, **kwargs):
+            project_layout = {
+                "repository": {
+                    "project": {
+                        "columns": {
+                            "edges": [
+                                {"cursor": 1, "node": {"name": "Queue"}},
+                                {"cursor": 2, "node": {"name": "In progress"}}
+                            ]
+                        }
+                    }
+                }
+            }
+            return get_board_items(project_layout, column("Queue", "queue=", [card_to_remove]),
+                                   column("In progress", "in progress=", []))
+
+        async def get_github_issues(self, **kwargs):
+            return {"repository": {"issues": {"pageInfo": {"hasNextPage": False}, "edges": [{"node": issue_to_add}]}}}
+
+        async def get_github_pull_requests(self, **kwargs):
+            return {"repository": {"pullRequests": {"pageInfo": {"hasNextPage": False}, "edges": []}}}
+
+        async def delete_project_card(self, card_id):
+            calls.append(('delete', card_id))
+
+        async def add_items_to_project(self, item_id, column_id):
+            calls.append(('add', item_id, column_id))
+            return {"addProjectCard": {"cardEdge": {"node": {"id": "card2="}}}}
+
+        async def add_to_column(self, card_id, column_id):
+            calls.append(('move', card_id, column_id))
+
+    async def manage():
+        manager = ProjectManager(configuration=config, client=AsyncMockClient(), load=False)
+        await manager.load_async()
+        assert list(manager.project.columns) == ["Queue", "In progress"]
+        assert list(manager.matching_issues) == ["issue2="]
+
+        await manager.manage_async()
+        return manager
+
+    manager = asyncio.run(manage())
+    assert calls == [('delete', 'card1='), ('add', 'issue2=', 'in progress='), ('move', 'card2=', 'in progress=')]
+    assert manager.project.is_in_column("Queue", "issue1=") is False
+    assert manager.project.is_in_column("In progress", "issue2=") is True
+
+
+def test_issues_are_streamed_page_by_page():
+    config = Configuration(os.path.join(MOCK_FOLDER_PATH, 'conf.ini'))
+    config.load_properties()
+    requested_pages = []
+
+    class MockClient(object):
+        def get_github_issues(self, after, **kwargs):
+            page = int(after) if after else 0
+            requested_pages.append(page)
+            issue = {"id": f"issue{page}=", "number": page, "title": f"issue {page}",
+                     "labels": {"edges": [{"node": {"name": "bug"}}, {"node": {"name": "test"}}]}}
+            return {"repository": {"issues": {"pageInfo": {"hasNextPage": page < 2, "endCursor": str(page + 1)},
+                                              "edges": [{"node": issue}]}}}
+
+    manager = ProjectManager(configuration=config, client=MockClient(), load=False)
+    issues = manager.iter_github_issues()
+    assert next(issues).id == "issue0="
+    assert requested_pages == [0]  # the next page is only fetched once the issues of the first one were used
+    assert [issue.id for issue in issues] == ["issue1=", "issue2="]
+    assert requested_pages == [0, 1, 2]
+
+
+def test_next_issue_page_is_prefetched():
+    config = Configuration(os.path.join(MOCK_FOLDER_PATH, 'conf.ini'))
+    config.load_properties()
+    requested_pages = []
+    second_page_requested = threading.Event()
+
+    def get_page(after):
+        page = int(after) if after else 0
+        requested_pages.append(page)
+        if page == 1:
+            second_page_requested.set()
+
+        issue = {"id": f"issue{page}=", "number": page, "title": f"issue {page}",
+                 "labels": {"edges": [{"node": {"name": "bug"}}, {"node": {"name": "test"}}]}}
+        return {"repository": {"issues": {"pageInfo": {"hasNextPage": page < 2, "endCursor": str(page + 1)},
+                                          "edges": [{"node": issue}]}}}
+
+    class MockClient(object):
+        def get_github_issues(self, after, **kwargs):
+            return get_page(after)
+
+    class AsyncMockClient(object):
+        async def get_github_issues(self, after, **kwargs):
+            return get_page(after)
+
+    manager = ProjectManager(configuration=config, client=MockClient(), load=False, prefetch_pages=True)
+    issues = manager.iter_github_issues()
+    assert next(issues).id == "issue0="
+    # the second page is requested while the first one is used
+    assert second_page_requested.wait(timeout=5)
+    assert [issue.id for issue in issues] == ["issue1=", "issue2="]
+    assert requested_pages == [0, 1, 2]
+
+    requested_pages.clear()
+    manager = ProjectManager(configuration=config, client=AsyncMockClient(), load=False, prefetch_pages=True)
+
+    async def iterate_issues():
+        issues = manager.iter_github_issues_async()
+        assert (await issues.__anext__()).id == "issue0="
+        assert requested_pages == [0, 1]
+        assert [issue.id async for issue in issues] == ["issue1=", "issue2="]
+
+    asyncio.run(iterate_issues())
+    assert requested_pages == [0, 1, 2]
+
+
+def test_board_issues_and_pull_requests_are_loaded_concurrently():
+    config = Configuration(os.path.join(MOCK_FOLDER_PATH, 'conf.ini'))
+    config.load_properties()
+    # every load waits for the other two, so they only finish if they run at the same time
+    all_loading = threading.Barrier(3, timeout=5)
+
+    class MockClient(object):
+        def get_board_items(self, **kwargs):
+            all_loading.wait()
+            return {"repository": {"project": {"name": "test", "number": 1, "columns": {"edges": []}}}}
+
+        def get_github_issues(self, **kwargs):
+            all_loading.wait()
+            return {"repository": {"issues": {"pageInfo": {"hasNextPage": False}, "edges": []}}}
+
+        def get_github_pull_requests(self, **kwargs):
+            all_loading.wait()
+            return {"repository": {"pullRequests": {"pageInfo": {"hasNextPage": False}, "edges": []}}}
+
+    manager = ProjectManager(configuration=config, client=MockClient())
+    assert manager.project.name == "test"
+    assert manager.matching_issues == {}
+    assert manager.matching_pull_requests == {}
+
+    class FailingMockClient(MockClient):
+        def get_github_issues(self, **kwargs):
+            all_loading.wait()
+            raise ValueError("issues failed")
+
+    all_loading.reset()
+    with pytest.raises(ValueError) as exception:
+        ProjectManager(configuration=config, client=FailingMockClient())
+
+    assert str(exception.value) == "issues failed"
+
+
+def test_boards_of_the_same_repository_share_its_items():
+    bug_config = Configuration(os.path.join(MOCK_FOLDER_PATH, 'conf.ini'))
+    bug_config.load_properties()
+    docs_config = Configuration(os.path.join(MOCK_FOLDER_PATH, 'conf.ini'))
+    docs_config.load_properties()
+    docs_config.filter_labels = ['docs']
+    search_config = Configuration(os.path.join(MOCK_FOLDER_PATH, 'conf.ini'))
+    search_config.load_properties()
+    search_config.fetch_mode = 'search'
+    issue_requests = []
+
+    def get_issue(number, label):
+        return {"id": f"issue{number}=", "number": number, "title": f"issue {number}",
+                "labels": {"edges": [{"node": {"name": label}}, {"node": {"name": "test"}}]}}
+
+    class MockClient(object):
+        def get_github_issues(self, labels, **kwargs):
+            issue_requests.append(labels)
+            return {"repository": {"issues": {"pageInfo": {"hasNextPage": False},
+                                              "edges": [{"node": get_issue(1, "bug")},
+                                                        {"node": get_issue(2, "docs")}]}}}
+
+        def get_github_pull_requests(self, **kwargs):
+            return {"repository": {"pullRequests": {"pageInfo": {"hasNextPage": False}, "edges": []}}}
+
+    class AsyncMockClient(object):
+        async def get_github_issues(self, **kwargs):
+            return MockClient().get_github_issues(**kwargs)
+
+        async def get_github_pull_requests(self, **kwargs):
+            return MockClient().get_github_pull_requests(**kwargs)
+
+    client = MockClient()
+    shared_items = get_shared_repository_items(client, [bug_config, docs_config, search_config])
+    assert search_config not in shared_items
+    assert shared_items[bug_config] is shared_items[docs_config]
+
+    bug_manager = ProjectManager(configuration=bug_config, client=client, load=False,
+                                 repository_items=shared_items[bug_config])
+    docs_manager = ProjectManager(configuration=docs_config, client=client, load=False,
+                                  repository_items=shared_items[docs_config])
+    assert list(bug_manager.get_github_issues()) == ["issue1="]
+    assert list(docs_manager.get_github_issues()) == ["issue2="]
+    assert issue_requests == [['bug', 'docs']]  # the issues are fetched once with the labels of both boards
+    # the parsed issues are kept for the boards instead of the pages they were fetched in
+    assert [parsed_issue['number'] for _, parsed_issue in shared_items[bug_config].items['issues']] == [1, 2]
+
+    issue_requests.clear()
+    client = AsyncMockClient()
+    shared_items = get_shared_repository_items(client, [bug_config, docs_config])
+    bug_manager = ProjectManager(configuration=bug_config, client=client, load=False,
+                                 repository_items=shared_items[bug_config])
+    docs_manager = ProjectManager(configuration=docs_config, client=client, load=False,
+                                  repository_items=shared_items[docs_config])
+
+    async def get_issues():
+        return await asyncio.gather(bug_manager.get_github_issues_async(), docs_manager.get_github_issues_async())
+
+    bug_issues, docs_issues = asyncio.run(get_issues())
+    assert list(bug_issues) == ["issue1="]
+    assert list(docs_issues) == ["issue2="]
+    assert issue_requests == [['bug', 'docs']]
+
+
+def test_search_resolves_the_milestone_and_reports_truncated_results(mocker):
+    config = Configuration(os.path.join(MOCK_FOLDER_PATH, 'conf.ini'), quiet=True)
+    config.load_properties()
+    config.fetch_mode = 'search'
+    config.filter_milestone = '2'
+    search_queries = []
+
+    def get_search_page(search_query, after):
+        search_queries.append(search_query)
+        return {'search': {'issueCount': 1500, 'edges': [],
+                           'pageInfo': {'hasNextPage': after is None, 'endCursor': 'page2'}}}
+
+    class MockClient(object):
+        def get_milestone(self, owner, name, milestone_number):
+            return {'repository': {'milestone': {'title': f'Sprint {milestone_number}'}}}
+
+        def search_issues(self, search_query, after=None, fields=None):
+            return get_search_page(search_query, after)
+
+    class AsyncMockClient(object):
+        async def get_milestone(self, owner, name, milestone_number):
+            return {'repository': {'milestone': {'title': f'Sprint {milestone_number}'}}}
+
+        async def search_issues(self, search_query, after=None, fields=None):
+            return get_search_page(search_query, after)
+
+    warning = mocker.patch.object(config.logger, 'warning')
+    assert ProjectManager(configuration=config, client=MockClient(), load=False).get_github_issues() == {}
+    manager = ProjectManager(configuration=config, client=AsyncMockClient(), load=False)
+    assert asyncio.run(manager.get_github_issues_async()) == {}
+
+    assert len(search_queries) == 4
+    assert all(search_query.endswith(' milestone:"Sprint 2"') for search_query in search_queries)
+    assert warning.call_count == 2  # once on the last page of every search
+    assert 'found 1500 items' in warning.call_args[0][0]
@@ -1,16 +1,22 @@
 from __future__ import absolute_import
 
+import asyncio
 import os
+import random
 
 import pytest
 from github_automation.common.constants import DEFAULT_PRIORITY_LIST
+from github_automation.common.utils import get_longest_increasing_subsequence
 from github_automation.core.project_item.issue import Issue
 from github_automation.core.project.project import (ItemCard, Project,
                                                     ProjectColumn,
                                                     _extract_card_node_data,
+                                                    load_project,
+                                                    load_project_async,
                                                     parse_project)
 from github_automation.core.project_item.pull_request import PullRequest
 from github_automation.management.configuration import Configuration
+from github_automation.management.github_client import RateLimitExceeded
 
 MOCK_FOLDER_PATH = os.path.join(os.getcwd(), "tests", "mock_data")
 
@@ -587,3 +593,267 @@ def test_move_items():
     issue.state = 'closed'
     project.move_item(MockClient(), issue, 'In progress', config)
     assert project.is_in_column("In progress", "1") is True
+
+
+def test_move_items_into_and_out_of_a_column_async(monkeypatch):
+    config = Configuration(os.path.join(MOCK_FOLDER_PATH, 'conf.ini'))
+    config.load_properties()
+    issues = {label: Issue(id=f"issue{number}", title=f"issue {number}", number=number, labels=[label],
+                           card_id_to_project={f"card{number}": {"project_number": config.project_number}},
+                           priority_list=DEFAULT_PRIORITY_LIST)
+              for number, label in [(1, "High"), (2, "Low"), (3, "Medium")]}
+    project = Project(name="test project", config=config, columns={
+        "Queue": ProjectColumn(id="queue", name="Queue", config=config,
+                               cards=[ItemCard(id="card1", item=issues["High"]),
+                                      ItemCard(id="card2", item=issues["Low"])]),
+        "In progress": ProjectColumn(id="in progress", name="In progress", config=config,
+                                     cards=[ItemCard(id="card3", item=issues["Medium"])])
+    })
+    # card1 leaves the Queue while card3, which would be placed right after it, enters the Queue
+    monkeypatch.setattr(project, 'get_items_to_move', lambda config, all_items: [
+        (issues["High"], "Queue", "card1", "In progress"),
+        (issues["Medium"], "In progress", "card3", "Queue")])
+    moves = []
+
+    class MockClient(object):
+        async def add_to_column(self, card_id, column_id):
+            await asyncio.sleep(0)
+            moves.append((card_id, column_id, None))
+
+        async def move_to_specific_place_in_column(self, card_id, column_id, after_card_id):
+            await asyncio.sleep(0)
+            moves.append((card_id, column_id, after_card_id))
+
+    asyncio.run(project.move_items_async(MockClient(), config, {}))
+    assert sorted(moves) == [("card1", "in progress", None), ("card3", "queue", None)]
+    assert [card.id for card in project.columns["Queue"].cards] == ["card3", "card2"]
+    assert [card.id for card in project.columns["In progress"].cards] == ["card1"]
+
+
+def get_column(name, card_numbers, end_cursor=None):
+    card_edges = [{'cursor': f'card{number}', 'node': {'id': f'card{number}', 'content': {
+        '__typename': 'Issue', 'id': f'issue{number}', 'number': number, 'title': f'issue {number}',
+        'labels': {'edges': [{'node': {'name': 'bug'}}]}}}} for number in card_numbers]
+    return {'name': name, 'id': name, 'cards': {'pageInfo': {'hasNextPage': end_cursor is not None,
+                                                             'endCursor': end_cursor},
+                                                'edges': card_edges}}
+
+
+class BoardClient(object):
+    """Serves a board of the Queue, Done and In progress columns, where the In progress column has two pages"""
+
+    def __init__(self):
+        self.calls = []
+
+    def get_board_items(self, **kwargs):
+        self.calls.append('board')
+        return {'repository': {'project': {'name': 'test', 'number': 1, 'columns': {'edges': [
+            {'cursor': 'queue cursor', 'node': get_column('Queue', [1])},
+            {'cursor': 'done cursor', 'node': get_column('Done', [2])},
+            {'cursor': 'in progress cursor', 'node': get_column('In progress', [3], end_cursor='card3')},
+        ]}}}}
+
+    def get_project_layout(self, **kwargs):
+        self.calls.append('layout')
+        return {'repository': {'project': {'name': 'test', 'number': 1, 'columns': {'edges': [
+            {'cursor': 'queue cursor', 'node': {'name': 'Queue'}},
+            {'cursor': 'done cursor', 'node': {'name': 'Done'}},
+            {'cursor': 'in progress cursor', 'node': {'name': 'In progress'}},
+        ]}}}}
+
+    def get_column_items(self, prev_column_id, start_cards_cursor=None, **kwargs):
+        self.calls.append((prev_column_id, start_cards_cursor))
+        if prev_column_id == 'queue cursor':
+            return {'repository': {'project': {'columns': {'nodes': [get_column('Done', [2])]}}}}
+
+        if start_cards_cursor is None:
+            return {'repository': {'project': {'columns': {'nodes': [
+                get_column('In progress', [3], end_cursor='card3')]}}}}
+
+        return {'repository': {'project': {'columns': {'nodes': [get_column('In progress', [4])]}}}}
+
+
+class AsyncBoardClient(BoardClient):
+    async def get_board_items(self, **kwargs):
+        return super().get_board_items(**kwargs)
+
+    async def get_project_layout(self, **kwargs):
+        return super().get_project_layout(**kwargs)
+
+    async def get_column_items(self, **kwargs):
+        return super().get_column_items(**kwargs)
+
+
+@pytest.mark.parametrize('client_class', [BoardClient, AsyncBoardClient])
+def test_load_project(client_class):
+    config = Configuration(os.path.join(MOCK_FOLDER_PATH, 'conf.ini'), quiet=True)
+    config.load_properties()
+    client = client_class()
+    if client_class is BoardClient:
+        project = load_project(client, config)
+    else:
+        project = asyncio.run(load_project_async(client, config))
+
+    assert project.name == 'test' and project.number == 1
+    assert list(project.columns) == ['Queue', 'In progress']  # the Done column is not configured
+    assert [card.item.title for card in project.columns['In progress'].cards] == ['issue 3', 'issue 4']
+    assert client.calls == ['board', ('done cursor', 'card3')]
+
+    # only the given columns are loaded, out of the project layout instead of the whole board
+    client = client_class()
+    if client_class is BoardClient:
+        project = load_project(client, config, column_names=['Done', 'In progress'])
+    else:
+        project = asyncio.run(load_project_async(client, config, column_names=['Done', 'In progress']))
+
+    assert project.name == 'test' and project.number == 1
+    assert list(project.columns) == ['Done', 'In progress']
+    assert [card.item.title for card in project.columns['In progress'].cards] == ['issue 3', 'issue 4']
+    assert client.calls == ['layout', ('queue cursor', None), ('done cursor', None), ('done cursor', 'card3')]
+
+
+def test_async_card_mutations_abort_when_rate_limit_is_exhausted():
+    config = Configuration(os.path.join(MOCK_FOLDER_PATH, 'conf.ini'))
+    config.load_properties()
+
+    class MockClient(object):
+        async def add_to_column(self, **kwargs):
+            raise RateLimitExceeded('exhausted')
+
+        async def delete_project_card(self, card_id):
+            raise RateLimitExceeded('exhausted')
+
+    column_object = ProjectColumn(id="id", name="Queue", cards=[], config=config)
+    issue = Issue(id="1", title="issue 1", number=1, labels=["High"], priority_list=DEFAULT_PRIORITY_LIST)
+    with pytest.raises(RateLimitExceeded):
+        asyncio.run(column_object.add_card_async("card", issue, MockClient()))
+
+    with pytest.raises(RateLimitExceeded):
+        asyncio.run(Project.remove_item_async(MockClient(), issue.title, "card", config, issue))
+
+
+def test_sort_column_moves_the_fewest_cards():
+    config = Configuration(os.path.join(MOCK_FOLDER_PATH, 'conf.ini'))
+    config.load_properties()
+    config.priority_list = DEFAULT_PRIORITY_LIST
+    moves = []
+
+    class MockClient(object):
+        def add_to_column(self, card_id, **kwargs):
+            moves.append((card_id, None))
+
+        def move_to_specific_place_in_column(self, card_id, after_card_id, **kwargs):
+            moves.append((card_id, after_card_id))
+
+    # the lowest priority card is at the top, the rest are already sorted
+    cards = [ItemCard(id="low", item=Issue(id="low", title="low", number=1, labels=["Low"],
+                                           priority_list=DEFAULT_PRIORITY_LIST))]
+    for number in range(2, 7):
+        cards.append(ItemCard(id=f"high{number}", item=Issue(id=f"high{number}", title=f"high {number}", number=number,
+                                                             labels=["High"], priority_list=DEFAULT_PRIORITY_LIST)))
+    column_object = ProjectColumn(id="id", name="Queue", cards=list(cards))
+    column_object.sort_cards(MockClient(), config)
+    assert [card.id for card in column_object.cards] == ["high2", "high3", "high4", "high5", "high6", "low"]
+    assert moves == [("low", "high6")]
+
+    # the moves sort the original order of the cards
+    moves.clear()
+    card_ids = ["high4", "low", "high2", "high6", "high3", "high5"]
+    column_object = ProjectColumn(id="id", name="Queue",
+                                  cards=[next(card for card in cards if card.id == card_id) for card_id in card_ids])
+    column_object.sort_cards(MockClient(), config)
+    for card_id, after_card_id in moves:
+        card_ids.remove(card_id)
+        card_ids.insert(card_ids.index(after_card_id) + 1 if after_card_id else 0, card_id)
+
+    assert card_ids == [card.id for card in column_object.cards]
+    assert len(moves) == 3  # 3 of the cards, e.g. high2, high3 and high5, are already in their sorted order
+
+
+def test_sort_big_column():
+    priorities = ["Critical", "High", "Medium", "Low"]
+    issues = [Issue(id=f"issue{number}", title=f"issue {number}", number=number,
+                    labels=[priorities[number % len(priorities)]], priority_list=DEFAULT_PRIORITY_LIST)
+              for number in range(5000)]
+    cards = [ItemCard(id=f"card{issue.number}", item=issue) for issue in issues]
+    random.Random(0).shuffle(cards)
+    column_object = ProjectColumn(id="id", name="Queue", cards=list(cards))
+
+    moves = column_object.get_sort_moves()
+    sorted_numbers = sorted(range(5000), key=lambda number: (number % len(priorities), number))
+    assert [card.item.number for card in column_object.cards] == sorted_numbers
+    assert {id(card) for card in column_object.cards} == {id(card) for card in cards}  # the cards are not copied
+
+    # only the cards out of a longest run of cards in their sorted order are moved
+    sorted_positions = {number: position for position, number in enumerate(sorted_numbers)}
+    positions = [sorted_positions[card.item.number] for card in cards]
+    assert len(moves) == len(cards) - len(get_longest_increasing_subsequence(positions))
+
+
+def test_column_card_indexes():
+    issues = [Issue(id=f"issue{number}", title=f"issue {number}", number=number, labels=[label],
+                    priority_list=DEFAULT_PRIORITY_LIST)
+              for number, label in [(1, "Low"), (2, "High"), (3, "Medium"), (4, "High")]]
+
+    # an unsorted column keeps its order, a card is placed between the first two cards it fits
+    column_object = ProjectColumn(id="id", name="Queue", cards=[ItemCard(id=f"card{issue.number}", item=issue)
+                                                                for issue in (issues[1], issues[0], issues[2])])
+    assert not column_object.is_sorted
+    assert column_object.insert_card("card4", issues[3]) == "card2"
+    assert [card.id for card in column_object.cards] == ["card2", "card4", "card1", "card3"]
+    assert column_object.get_card_id("issue4") == "card4"
+    assert set(column_object.get_all_item_ids()) == {"issue1", "issue2", "issue3", "issue4"}
+
+    column_object.remove_card("card1")
+    assert [card.id for card in column_object.cards] == ["card2", "card4", "card3"]
+    assert column_object.get_card_id("issue1") is None
+    assert "issue1" not in column_object.get_all_item_ids()
+
+    # a sorted column stays sorted
+    column_object.remove_card("card2")
+    column_object.get_sort_moves()
+    assert column_object.is_sorted
+    assert column_object.insert_card("card1", issues[0]) == "card3"
+    assert column_object.insert_card("card2", issues[1]) is None
+    assert [card.id for card in column_object.cards] == ["card2", "card4", "card3", "card1"]
+    column_object.remove_card("card3")
+    column_object.remove_card("unknown")
+    assert [card.id for card in column_object.cards] == ["card2", "card4", "card1"]
+    assert column_object.sort_keys == [card.item.sort_key for card in column_object.cards]
+    assert column_object.is_sorted
+
+
+def test_add_cards_to_big_column():
+    priorities = ["Critical", "High", "Medium", "Low"]
+    issues = [Issue(id=f"issue{number}", title=f"issue {number}", number=number,
+                    labels=[priorities[number % len(priorities)]], priority_list=DEFAULT_PRIORITY_LIST)
+              for number in range(10000)]
+    random.Random(0).shuffle(issues)
+    column_object = ProjectColumn(id="id", name="Queue", cards=[])
+
+    for issue in issues:
+        column_object.insert_card(f"card{issue.number}", issue)
+
+    for issue in issues[::2]:
+        column_object.remove_card(column_object.get_card_id(issue.id))
+
+    kept_issues = issues[1::2]
+    assert [card.item.sort_key for card in column_object.cards] == sorted(issue.sort_key for issue in kept_issues)
+    assert column_object.is_sorted
+
+    # the indexes hold exactly the cards of the column
+    assert column_object.sort_keys == [card.item.sort_key for card in column_object.cards]
+    assert column_object.cards_by_id == {card.id: card for card in column_object.cards}
+    assert column_object.cards_by_item_id == {card.item_id: card for card in column_object.cards}
+    assert set(column_object.get_all_item_ids()) == {issue.id for issue in kept_issues}
+
+
+def test_matching_columns_follow_changed_rules():
+    config = Configuration(os.path.join(MOCK_FOLDER_PATH, 'conf.ini'))
+    config.load_properties()
+    issue = Issue(id="1", number=1, title="Rules", labels=[], priority_list=config.priority_list)
+    assert Project.get_matching_columns([issue], config) == ['Queue']
+
+    config.column_to_rules['Queue'] = {'issue.title': 'Other'}
+    assert Project.get_matching_columns([issue], config) == ['']
+    assert Project.get_matching_column(issue, config) == ''
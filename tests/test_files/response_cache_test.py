@@ -0,0 +1,89 @@
+from __future__ import absolute_import
+
+import pytest
+from graphql import ExecutionResult
+from github_automation.management.github_client import GraphQLClient
+from github_automation.management.response_cache import ResponseCache
+
+
+def test_responses_expire(tmpdir):
+    now = [1000]
+    cache = ResponseCache(str(tmpdir.join('cache', 'responses.sqlite')), ttls={'issue': 10},
+                          clock=lambda: now[0])
+    cache.set('issue', {'issueNumber': 1}, {'repository': {'issue': {'number': 1}}})
+    cache.set('pull_request', {'prNumber': 1}, {'repository': {}})  # has no TTL
+
+    assert cache.get('issue', {'issueNumber': 1}) == {'repository': {'issue': {'number': 1}}}
+    assert cache.get('issue', {'issueNumber': 2}) is None
+    assert cache.get('pull_request', {'prNumber': 1}) is None
+
+    now[0] = 1010
+    assert cache.get('issue', {'issueNumber': 1}) is None
+
+
+def test_cache_is_kept_between_clients_and_invalidated_by_mutations(tmpdir, mocker):
+    cache_path = str(tmpdir.join('responses.sqlite'))
+    client = GraphQLClient(api_key='test', cache_path=cache_path)
+    layout = {'repository': {'project': {'columns': {'edges': []}}}}
+    mocker.patch.object(client.client.transport, 'execute', side_effect=[
+        ExecutionResult(data=layout),
+        ExecutionResult(data={'repository': {'project': {'columns': {'nodes': []}}}}),
+    ])
+    client.get_project_layout('owner', 'name', 1)
+    client.get_first_column_items('owner', 'name', 1)
+
+    next_run_client = GraphQLClient(api_key='test', cache_path=cache_path)
+    execute = mocker.patch.object(next_run_client.client.transport, 'execute',
+                                  return_value=ExecutionResult(data={}))
+    assert next_run_client.get_project_layout('owner', 'name', 1) == layout
+    next_run_client.get_first_column_items('owner', 'name', 1)
+    assert execute.call_count == 0
+
+    next_run_client.delete_project_card('card')
+    next_run_client.get_project_layout('owner', 'name', 1)
+    next_run_client.get_first_column_items('owner', 'name', 1)
+    assert execute.call_count == 2  # only the column items were fetched again
+
+
+def test_cache_is_kept_apart_by_host_and_token(tmpdir, mocker):
+    cache_path = str(tmpdir.join('responses.sqlite'))
+    layout = {'repository': {'project': {'columns': {'edges': []}}}}
+    client = GraphQLClient(api_key='test', cache_path=cache_path)
+    mocker.patch.object(client.client.transport, 'execute', return_value=ExecutionResult(data=layout))
+    client.get_project_layout('owner', 'name', 1)
+
+    enterprise_url = 'https://github.example.com/api'
+    for other_client in [GraphQLClient(api_key='other', cache_path=cache_path),
+                         GraphQLClient(api_key='test', cache_path=cache_path, base_url=enterprise_url)]:
+        execute = mocker.patch.object(other_client.client.transport, 'execute',
+                                      return_value=ExecutionResult(data={}))
+        assert other_client.get_project_layout('owner', 'name', 1) == {}
+        assert execute.call_count == 1
+
+    assert 'test' not in client.cache.scope  # only a hash of the token is kept
+
+
+def test_mutations_invalidate_the_responses_of_their_projects(tmpdir, mocker):
+    client = GraphQLClient(api_key='test', cache_path=str(tmpdir.join('responses.sqlite')))
+    mocker.patch.object(client.client.transport, 'execute', side_effect=[
+        ExecutionResult(data={'repository': {'project': {'id': 'project1', 'columns': {'nodes': []}}}}),
+        ExecutionResult(data={'repository': {'project': {'id': 'project2', 'columns': {'nodes': []}}}}),
+    ])
+    client.get_first_column_items('owner', 'name', 1)
+    client.get_first_column_items('owner', 'name', 2)
+
+    execute = mocker.patch.object(client.client.transport, 'execute', return_value=ExecutionResult(
+        data={'deleteProjectCard': {'deletedCardId': 'card', 'column': {'project': {'id': 'project1'}}}}))
+    client.delete_project_card('card')
+    assert client.cache.get('first_column_items', {'owner': 'owner', 'name': 'name', 'projectNumber': 1,
+                                                   'start_cards_cursor': ''}) is None
+    assert client.cache.get('first_column_items', {'owner': 'owner', 'name': 'name', 'projectNumber': 2,
+                                                   'start_cards_cursor': ''}) is not None
+
+    # the projects of a failed mutation are unknown, so the responses of all the projects are dropped
+    execute.side_effect = Exception('failed')
+    with pytest.raises(Exception):
+        client.delete_project_card('card')
+
+    assert client.cache.get('first_column_items', {'owner': 'owner', 'name': 'name', 'projectNumber': 2,
+                                                   'start_cards_cursor': ''}) is None
@@ -1,8 +1,16 @@
 from __future__ import absolute_import
 
+import os
+import sys
+
 import pytest
 from github_automation.common.constants import OR
-from github_automation.common.utils import is_matching_project_item
+from github_automation.common.utils import (LABEL_INTERNER, ColumnRuleTable, LabelFilter,
+                                            get_longest_increasing_subsequence, get_search_query,
+                                            is_matching_project_item)
+from github_automation.management.configuration import Configuration
+
+MOCK_FOLDER_PATH = os.path.join(os.getcwd(), "tests", "mock_data")
 
 
 @pytest.mark.parametrize('issue_labels, must_have_labels, cant_have_labels, filter_labels, result',
@@ -15,7 +23,130 @@ from github_automation.common.utils import is_matching_project_item
                              [['test', '1', '3'], ['12'], ['3', '4'], ['test1'], False],
                              [['test', '1', '3'], ['1'], ['3', '4'], ['test1'], False],
                              [['test', '1', '3'], ['12'], ['3', '4'], ['test'], False],
-                             [['test', '1', '3'], [f'some{OR}text'], ['3'], ['test'], False]
+                             [['test', '1', '3'], [f'some{OR}text'], ['3'], ['test'], False],
+                             [['test', '1', 'text'], [f'some{OR}text', '1'], ['3'], ['test'], True],
                          ])
 def test_is_matching_project_item(issue_labels, must_have_labels, cant_have_labels, filter_labels, result):
     assert is_matching_project_item(issue_labels, must_have_labels, cant_have_labels, filter_labels) is result
+    label_filter = LabelFilter(must_have_labels, cant_have_labels, filter_labels)
+    assert label_filter.is_matching(LABEL_INTERNER.get_mask(issue_labels)) is result
+    assert label_filter.match_masks([LABEL_INTERNER.get_mask(issue_labels)] * 2) == [result] * 2
+
+
+def test_get_search_query():
+    config = Configuration(os.path.join(MOCK_FOLDER_PATH, 'conf.ini'), quiet=True)
+    config.load_properties()
+    config.must_have_labels = ['test', f'docs{OR}Customer Issue']
+    config.filter_milestone = '1'
+
+    assert get_search_query(config, 'issue', 'Sprint 1') == \
+        'repo:ronykoz/test is:issue is:open label:"bug" label:"test" label:"docs","Customer Issue" ' \
+        '-label:"not test" milestone:"Sprint 1"'
+    assert get_search_query(config, 'pr') == 'repo:ronykoz/test is:pr is:open label:"bug" label:"test" ' \
+                                             'label:"docs","Customer Issue" -label:"not test"'
+
+    config.filter_milestone = '*'
+    assert get_search_query(config, 'issue').endswith(' -no:milestone')
+    config.filter_milestone = 'none'
+    assert get_search_query(config, 'issue').endswith(' no:milestone')
+
+
+class MockPullRequest(object):
+    assignees = ['ronykoz']
+    review_requested = True
+
+
+class MockIssue(object):
+    assignees = ['ronykoz', 'daud']
+    labels = []
+    milestone = 'Milestone 1'
+    pull_request = MockPullRequest()
+
+
+@pytest.mark.parametrize('rules, issue_result, pull_request_result',
+                         [
+                             [{'issue.assignees': ['ronykoz']}, True, None],
+                             [{'issue.assignees': ['ronykoz', 'other']}, False, None],
+                             [{'issue.assignees': [f'other{OR}daud']}, True, None],
+                             [{'issue.labels': False, 'issue.pull_request': True}, True, None],
+                             [{'issue.labels': True}, False, None],
+                             [{'issue.milestone': 'Milestone 1'}, True, None],
+                             [{'issue.milestone': 'Milestone'}, False, None],
+                             [{'issue.pull_request.review_requested': True,
+                               'issue.pull_request.assignees': [f'other{OR}ronykoz']}, True, None],
+                             [{'issue.not_existent': 'field'}, False, None],
+                             [{'pull_request.assignees': ['ronykoz']}, None, True],
+                         ])
+def test_column_rule_table(rules, issue_result, pull_request_result):
+    column_rule_table = ColumnRuleTable({'Column': rules})
+    for item_type, item, result in [('issue', MockIssue(), issue_result),
+                                    ('pull_request', MockPullRequest(), pull_request_result)]:
+        # a column without rules of the item type does not match it
+        assert list(column_rule_table.iter_matches(item, item_type, ['Column'])) == [('Column', bool(result))]
+
+
+def test_column_rule_table_checks_every_condition_once():
+    checked_fields = []
+
+    class CountingIssue(object):
+        def __getattr__(self, name):
+            checked_fields.append(name)
+            return {'assignees': ['ronykoz'], 'labels': [], 'pull_request': None}[name]
+
+    column_rule_table = ColumnRuleTable({
+        'Queue': {'issue.assignees': False},
+        'In progress': {'issue.assignees': True, 'issue.labels': ['Testing']},
+        'Review in progress': {'issue.assignees': True, 'issue.pull_request': True},
+        'Waiting for Docs': {'issue.assignees': True, 'issue.pull_request': True, 'pull_request.assignees': True},
+        'Done': {'issue.assignees': True, 'issue.labels': False},
+    })
+    matches = column_rule_table.iter_matches(CountingIssue(), 'issue',
+                                             ['Queue', 'In progress', 'Review in progress', 'Waiting for Docs',
+                                              'Done'])
+    assert list(matches) == [('Queue', False), ('In progress', False), ('Review in progress', False),
+                             ('Waiting for Docs', False), ('Done', True)]
+    # the 5 distinct conditions of the issues out of their 9 conditions
+    assert checked_fields == ['assignees', 'assignees', 'labels', 'pull_request', 'labels']
+
+
+@pytest.mark.parametrize('has_numpy', [True, False])
+def test_column_rule_table_matches_many_items(monkeypatch, has_numpy):
+    if not has_numpy:
+        monkeypatch.setitem(sys.modules, 'numpy', None)  # the items are matched one by one
+
+    class MockItem(object):
+        def __init__(self, assignees, labels, pull_request=None):
+            self.assignees = assignees
+            self.labels = labels
+            if pull_request is not None:
+                self.pull_request = pull_request
+
+    column_names = ['Queue', 'Waiting for Docs', 'Review in progress', 'In progress']
+    column_rule_table = ColumnRuleTable({
+        'Queue': {'issue.assignees': False, 'issue.labels': False},
+        'In progress': {'issue.assignees': True, 'issue.labels': ['Testing']},
+        'Review in progress': {'issue.assignees': True, 'issue.pull_request': True},
+        'Waiting for Docs': {'issue.assignees': True, 'issue.pull_request.review_requested': True,
+                             'issue.pull_request.assignees': [f'ronykoz{OR}not rony']},
+    })
+    items = [MockItem([], []), MockItem(['rony'], ['Testing']), MockItem(['rony'], []),
+             MockItem(['rony'], [], MockPullRequest()), MockItem(['rony'], ['Testing'], False), MockItem([], ['bug'])]
+    expected = ['Queue', 'In progress', '', 'Waiting for Docs', 'In progress', '']
+    assert [column_rule_table.get_first_match(item, 'issue', column_names) for item in items] == expected
+    assert column_rule_table.match_columns(items, 'issue', column_names) == expected
+    assert column_rule_table.match_columns(items, 'pull_request', column_names) == [''] * len(items)
+
+
+@pytest.mark.parametrize('values, length', [
+    [[], 0],
+    [[0, 1, 2, 3], 4],
+    [[3, 0, 1, 2], 3],
+    [[1, 2, 3, 0], 3],
+    [[3, 2, 1, 0], 1],
+    [[2, 0, 3, 1, 4], 3],
+])
+def test_get_longest_increasing_subsequence(values, length):
+    subsequence = get_longest_increasing_subsequence(values)
+    assert len(subsequence) == length
+    assert subsequence == sorted(subsequence)
+    assert all(values[first] < values[second] for first, second in zip(subsequence, subsequence[1:]))